@@ -5,6 +5,7 @@
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
 from .models import User
+from cart import guest
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
@@ -21,13 +22,15 @@ def register(request):
     if serializer.is_valid():
         user = serializer.save()
         refresh = RefreshToken.for_user(user)
-        return Response({
+        response = Response({
             'user': UserProfileSerializer(user).data,
             'tokens': {
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
             }
         }, status=status.HTTP_201_CREATED)
+        guest.merge(request, user, response)
+        return response
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -39,13 +42,15 @@ def login_view(request):
     if serializer.is_valid():
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
-        return Response({
+        response = Response({
             'user': UserProfileSerializer(user).data,
             'tokens': {
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
             }
         }, status=status.HTTP_200_OK)
+        guest.merge(request, user, response)
+        return response
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
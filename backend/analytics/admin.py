@@ -0,0 +1,36 @@
+from django.contrib import admin
+from .models import DailyCategorySales, DailyProductSales, DailySales
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only: rollups are maintained from orders and rebuilt with ``backfill_sales``"""
+    date_hierarchy = 'date'
+    ordering = ['-date']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(RollupAdmin):
+    list_display = ['date', 'revenue', 'units', 'orders', 'paid_revenue', 'paid_orders']
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(RollupAdmin):
+    list_display = ['date', 'category', 'revenue', 'units', 'orders', 'paid_revenue', 'paid_orders']
+    list_filter = ['category']
+    list_select_related = ['category']
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(RollupAdmin):
+    list_display = ['date', 'product', 'revenue', 'units', 'orders', 'paid_revenue', 'paid_orders']
+    list_select_related = ['product']
+    search_fields = ['product__title']
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analytics import rollups
+from orders.models import ArchivedOrder, Order
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD), the first order by default')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), today by default')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Orders read per query')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            firsts = [
+                model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+                for model in (Order, ArchivedOrder)
+            ]
+            firsts = [first for first in firsts if first is not None]
+            start = timezone.localdate(min(firsts)) if firsts else end
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        counted = rollups.rebuild(start, end, options['chunk_size'])
+        self.stdout.write(f'Counted {counted} orders from {start} to {end}')
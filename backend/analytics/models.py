@@ -0,0 +1,55 @@
+from django.db import models
+from products.models import Category, Product
+
+
+class SalesRollup(models.Model):
+    """Sales counters of one day; maintained by ``analytics.rollups``"""
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    paid_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_orders = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+        ordering = ['date']
+
+
+class DailySales(SalesRollup):
+    """Store-wide sales per day"""
+    
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily sales'
+        constraints = [models.UniqueConstraint(fields=['date'], name='daily_sales_date_unique')]
+    
+    def __str__(self):
+        return f"{self.date}: {self.revenue}"
+
+
+class DailyCategorySales(SalesRollup):
+    """Sales per category and day"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='daily_category_sales_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.category}: {self.revenue}"
+
+
+class DailyProductSales(SalesRollup):
+    """Sales per product and day"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.product}: {self.revenue}"
@@ -0,0 +1,201 @@
+"""
+Daily sales rollups.
+
+Revenue (item subtotal), units and orders are kept per day, per category
+and day, and per product and day, plus the paid share of revenue and
+orders. Orders count on the local day they were created. Rollups are
+maintained incrementally from the ``orders.signals`` lifecycle signals:
+placing an order adds it, paying it adds its paid counters, cancelling it
+subtracts it again. ``backfill_sales`` rebuilds them from the order history,
+archived orders included (archiving an order leaves the rollups as they are).
+
+Changes are applied as increments with
+``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x``, one statement
+per rollup table and batch, so concurrent writers never lose updates.
+Backends without ``ON CONFLICT`` fall back to an ``F()`` update per row.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .models import DailyCategorySales, DailyProductSales, DailySales
+
+METRICS = ['revenue', 'units', 'orders', 'paid_revenue', 'paid_orders']
+
+# Rollup model and the line attribute keying it (besides the date)
+LEVELS = [(DailySales, None), (DailyCategorySales, 'category_id'), (DailyProductSales, 'product_id')]
+
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+class Line:
+    """What one product of one order contributes to the rollups"""
+    __slots__ = ['date', 'order_id', 'product_id', 'category_id', 'units', 'revenue', 'paid']
+
+    def __init__(self, date, order_id, product_id, category_id, units, revenue, paid):
+        self.date = date
+        self.order_id = order_id
+        self.product_id = product_id
+        self.category_id = category_id
+        self.units = units
+        self.revenue = revenue
+        self.paid = paid
+
+
+def lines_for(order, items):
+    """Rollup lines of an order from its (prefetched) items"""
+    date = timezone.localdate(order.created_at)
+    paid = order.payment_status == 'paid'
+    return [
+        Line(date, order.pk, item.product_id, item.product.category_id, item.quantity, item.price * item.quantity, paid)
+        for item in items
+    ]
+
+
+def order_lines(order_ids, item_model=OrderItem):
+    """Rollup lines of the orders in ``order_ids`` with one query"""
+    rows = item_model.objects.filter(order_id__in=list(order_ids)).values(
+        'order_id', 'order__created_at', 'order__payment_status', 'product_id', 'product__category_id',
+    ).annotate(
+        units=Sum('quantity'),
+        amount=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    ).order_by()
+    return [
+        Line(
+            timezone.localdate(row['order__created_at']), row['order_id'], row['product_id'],
+            row['product__category_id'], row['units'], row['amount'], row['order__payment_status'] == 'paid',
+        )
+        for row in rows
+    ]
+
+
+def aggregate(lines, sign=1, paid_only=False):
+    """
+    Fold ``lines`` into ``{model: {key: {metric: delta}}}``, where ``key`` is
+    ``(date,)`` or ``(date, category_id/product_id)``. ``paid_only`` only
+    counts the paid metrics (an order being paid).
+    """
+    changes = {}
+    for model, attribute in LEVELS:
+        totals = defaultdict(lambda: {'revenue': Decimal(0), 'units': 0, 'paid_revenue': Decimal(0)})
+        orders, paid_orders = defaultdict(set), defaultdict(set)
+        for line in lines:
+            key = (line.date,) if attribute is None else (line.date, getattr(line, attribute))
+            bucket = totals[key]
+            if not paid_only:
+                bucket['revenue'] += line.revenue
+                bucket['units'] += line.units
+                orders[key].add(line.order_id)
+            if line.paid:
+                bucket['paid_revenue'] += line.revenue
+                paid_orders[key].add(line.order_id)
+        changes[model] = {
+            key: {
+                'revenue': sign * bucket['revenue'],
+                'units': sign * bucket['units'],
+                'orders': sign * len(orders[key]),
+                'paid_revenue': sign * bucket['paid_revenue'],
+                'paid_orders': sign * len(paid_orders[key]),
+            }
+            for key, bucket in totals.items()
+        }
+    return changes
+
+
+def record(lines, sign=1, paid_only=False):
+    """Apply ``lines`` to every rollup table in one transaction"""
+    if not lines:
+        return
+    changes = aggregate(lines, sign, paid_only)
+    with transaction.atomic():
+        for model, attribute in LEVELS:
+            apply_changes(model, attribute, changes[model])
+
+
+def apply_changes(model, attribute, changes):
+    key_columns = ['date'] + ([attribute] if attribute else [])
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(model, key_columns, changes)
+    else:
+        _update_or_create(model, key_columns, changes)
+
+
+def _upsert(model, key_columns, changes):
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = key_columns + METRICS
+    rows = [
+        [connection.ops.adapt_datefield_value(key[0]), *key[1:], *[delta[metric] for metric in METRICS]]
+        for key, delta in changes.items()
+    ]
+    batch_size = connection.ops.bulk_batch_size(columns, rows) or len(rows)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(batch))
+        sql = (
+            f'INSERT INTO {table} ({", ".join(qn(column) for column in columns)}) VALUES {placeholders} '
+            f'ON CONFLICT ({", ".join(qn(column) for column in key_columns)}) DO UPDATE SET '
+            + ', '.join(f'{qn(metric)} = {table}.{qn(metric)} + excluded.{qn(metric)}' for metric in METRICS)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in batch for value in row])
+
+
+def _update_or_create(model, key_columns, changes):
+    for key, delta in changes.items():
+        lookup = dict(zip(key_columns, key))
+        increments = {metric: F(metric) + value for metric, value in delta.items()}
+        if model.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **delta)
+        except IntegrityError:
+            # Another writer created the row first
+            model.objects.filter(**lookup).update(**increments)
+
+
+def day_bounds(start, end):
+    """Aware datetimes bounding the local days ``start`` through ``end``"""
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def rebuild(start, end, chunk_size=1000):
+    """
+    Recompute the rollups of the local days ``start`` through ``end`` from the
+    orders and archived orders, reading ``chunk_size`` orders at a time in id
+    order, and return the number of orders counted. Orders changing or being
+    archived while this runs may be miscounted, run it when checkouts are quiet.
+    """
+    since, until = day_bounds(start, end)
+    with transaction.atomic():
+        for model, attribute in LEVELS:
+            model.objects.filter(date__gte=start, date__lte=end).delete()
+        # Orders placed after this point are recorded by the signals
+        last_id = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    sources = [
+        (Order.objects.filter(pk__lte=last_id), OrderItem),
+        (ArchivedOrder.objects.all(), ArchivedOrderItem),
+    ]
+    counted = 0
+    for orders, item_model in sources:
+        orders = orders.filter(
+            created_at__gte=since, created_at__lt=until
+        ).exclude(status='cancelled').order_by('pk')
+        after = 0
+        while True:
+            order_ids = list(orders.filter(pk__gt=after).values_list('pk', flat=True)[:chunk_size])
+            if not order_ids:
+                break
+            record(order_lines(order_ids, item_model))
+            counted += len(order_ids)
+            after = order_ids[-1]
+    return counted
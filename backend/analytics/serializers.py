@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+from .models import DailySales
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+METRIC_FIELDS = ['revenue', 'units', 'orders', 'paid_revenue', 'paid_orders']
+
+
+class SalesRangeSerializer(serializers.Serializer):
+    """Date range (inclusive, local dates) and top-N query parameters"""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+    ordering = serializers.ChoiceField(choices=['revenue', 'units', 'orders'], required=False, default='revenue')
+
+    def validate(self, data):
+        data['end'] = data.get('end') or timezone.localdate()
+        data['start'] = data.get('start') or data['end'] - timedelta(days=DEFAULT_DAYS - 1)
+        if data['start'] > data['end']:
+            raise serializers.ValidationError('start must not be after end')
+        if (data['end'] - data['start']).days >= MAX_DAYS:
+            raise serializers.ValidationError(f'The range can span at most {MAX_DAYS} days')
+        return data
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    orders = serializers.IntegerField()
+    paid_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    paid_orders = serializers.IntegerField()
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date'] + METRIC_FIELDS
+
+
+class CategorySalesSerializer(SalesTotalsSerializer):
+    id = serializers.IntegerField(source='category_id')
+    name = serializers.CharField(source='category__name')
+
+
+class ProductSalesSerializer(SalesTotalsSerializer):
+    id = serializers.IntegerField(source='product_id')
+    title = serializers.CharField(source='product__title')
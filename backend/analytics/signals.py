@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.dispatch import receiver
+from orders.signals import order_paid, order_placed, orders_cancelled
+from .rollups import lines_for, order_lines, record
+
+# Rollups are applied after the order transaction commits, so checkouts do
+# not hold the lock on the rollup rows of the day
+
+
+@receiver(order_placed)
+def record_order(sender, order, items, **kwargs):
+    lines = lines_for(order, items)
+    transaction.on_commit(lambda: record(lines))
+
+
+@receiver(order_paid)
+def record_payment(sender, order, **kwargs):
+    # Cancelled orders are not in the rollups any more
+    if order.status == 'cancelled':
+        return
+    lines = lines_for(order, order.items.all())
+    transaction.on_commit(lambda: record(lines, paid_only=True))
+
+
+@receiver(orders_cancelled)
+def remove_orders(sender, order_ids, **kwargs):
+    order_ids = list(order_ids)
+    transaction.on_commit(lambda: record(order_lines(order_ids), sign=-1))
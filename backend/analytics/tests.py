@@ -0,0 +1,105 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from orders import payments
+from orders.gateways import ChargeResult
+from orders.models import PaymentOutbox
+from store_backend.testing import client_for, make_products, make_user, test_settings
+from .models import DailyCategorySales, DailyProductSales, DailySales
+from .rollups import Line, aggregate
+
+DAY = date(2024, 1, 1)
+
+SHIPPING = {
+    'shipping_address': 'Valiasr St.', 'shipping_city': 'Tehran', 'shipping_postal_code': '1234567890',
+    'payment_method': 'card',
+}
+
+
+def metrics(row):
+    return {metric: getattr(row, metric) for metric in ('revenue', 'units', 'orders', 'paid_revenue', 'paid_orders')}
+
+
+class AggregateTests(SimpleTestCase):
+    LINES = [
+        Line(DAY, 1, 10, 100, 2, Decimal('20.00'), False),
+        Line(DAY, 1, 11, 100, 1, Decimal('5.00'), False),
+        Line(DAY, 2, 10, 100, 1, Decimal('10.00'), True),
+    ]
+
+    def test_levels(self):
+        changes = aggregate(self.LINES)
+        self.assertEqual(changes[DailySales][(DAY,)], {
+            'revenue': Decimal('35.00'), 'units': 4, 'orders': 2, 'paid_revenue': Decimal('10.00'), 'paid_orders': 1,
+        })
+        self.assertEqual(changes[DailyCategorySales][(DAY, 100)]['orders'], 2)
+        self.assertEqual(changes[DailyProductSales][(DAY, 10)]['units'], 3)
+        self.assertEqual(changes[DailyProductSales][(DAY, 11)]['orders'], 1)
+
+    def test_sign_and_paid_only(self):
+        removed = aggregate(self.LINES, sign=-1)[DailySales][(DAY,)]
+        self.assertEqual(removed, {
+            'revenue': Decimal('-35.00'), 'units': -4, 'orders': -2, 'paid_revenue': Decimal('-10.00'),
+            'paid_orders': -1,
+        })
+        paid = aggregate(self.LINES, paid_only=True)[DailySales][(DAY,)]
+        self.assertEqual(paid, {
+            'revenue': Decimal(0), 'units': 0, 'orders': 0, 'paid_revenue': Decimal('10.00'), 'paid_orders': 1,
+        })
+
+
+@test_settings
+class RollupLifecycleTests(TransactionTestCase):
+    """Rollups follow orders being placed, paid and cancelled"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = client_for(self.user)
+        self.product = make_products(1, price='12.50')[0]
+
+    def place_order(self, quantity):
+        self.client.post('/api/cart/add/', {'product_id': self.product.id, 'quantity': quantity})
+        response = self.client.post('/api/orders/create/', SHIPPING)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['order']['id']
+
+    def pay(self, order_id):
+        response = self.client.post(f'/api/orders/{order_id}/payment/')
+        self.assertEqual(response.status_code, 202, response.content)
+        entry = PaymentOutbox.objects.select_related('attempt__order').get(attempt__order_id=order_id)
+        payments.complete(entry, ChargeResult(True, reference=f'charge-{order_id}'))
+
+    def cancel(self, order_id):
+        admin = client_for(make_user(f'admin-{order_id}', is_staff=True))
+        response = admin.put(f'/api/orders/{order_id}/status/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def totals(self):
+        return metrics(DailySales.objects.get())
+
+    def test_placed_paid_and_cancelled(self):
+        first = self.place_order(2)
+        self.place_order(1)
+        self.assertEqual(self.totals(), {
+            'revenue': Decimal('37.50'), 'units': 3, 'orders': 2, 'paid_revenue': Decimal(0), 'paid_orders': 0,
+        })
+        self.pay(first)
+        self.assertEqual(self.totals(), {
+            'revenue': Decimal('37.50'), 'units': 3, 'orders': 2, 'paid_revenue': Decimal('25.00'), 'paid_orders': 1,
+        })
+        # A cancelled order leaves the rollups, paid counters included
+        self.cancel(first)
+        self.assertEqual(self.totals(), {
+            'revenue': Decimal('12.50'), 'units': 1, 'orders': 1, 'paid_revenue': Decimal(0), 'paid_orders': 0,
+        })
+        product = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual((product.units, product.orders), (1, 1))
+
+        # Rebuilding from the order history gives the same totals
+        incremental = self.totals()
+        call_command('backfill_sales', stdout=StringIO())
+        self.assertEqual(self.totals(), incremental)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('sales/', views.sales, name='sales'),
+    path('categories/', views.top_categories, name='top-categories'),
+    path('products/', views.top_products, name='top-products'),
+]
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .models import DailyCategorySales, DailyProductSales, DailySales
+from .serializers import (
+    METRIC_FIELDS, CategorySalesSerializer, DailySalesSerializer, ProductSalesSerializer, SalesRangeSerializer,
+    SalesTotalsSerializer,
+)
+from store_backend.query_budget import query_budget
+
+
+def metric_sums():
+    return {metric: Sum(metric) for metric in METRIC_FIELDS}
+
+
+def top_sales(model, key, name, params):
+    """Top ``params['limit']`` rows of ``model`` summed over the range, by ``key``"""
+    return list(
+        model.objects.filter(date__gte=params['start'], date__lte=params['end'])
+        .values(key, name).annotate(**metric_sums())
+        .order_by(f"-{params['ordering']}", key)[:params['limit']]
+    )
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales(request):
+    """Daily sales over a date range (last 30 days by default), with totals"""
+    params = SalesRangeSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    start, end = params.validated_data['start'], params.validated_data['end']
+    
+    rows = {row.date: row for row in DailySales.objects.filter(date__gte=start, date__lte=end)}
+    # Days without orders have no row, report them as zeros
+    days = [
+        rows.get(start + timedelta(days=offset)) or DailySales(date=start + timedelta(days=offset))
+        for offset in range((end - start).days + 1)
+    ]
+    totals = {metric: sum(getattr(day, metric) for day in days) for metric in METRIC_FIELDS}
+    return Response({
+        'start': start,
+        'end': end,
+        'totals': SalesTotalsSerializer(totals).data,
+        'days': DailySalesSerializer(days, many=True).data,
+    })
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def top_categories(request):
+    """Best selling categories over a date range"""
+    params = SalesRangeSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = top_sales(DailyCategorySales, 'category_id', 'category__name', params.validated_data)
+    return Response(CategorySalesSerializer(rows, many=True).data)
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def top_products(request):
+    """Best selling products over a date range"""
+    params = SalesRangeSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = top_sales(DailyProductSales, 'product_id', 'product__title', params.validated_data)
+    return Response(ProductSalesSerializer(rows, many=True).data)
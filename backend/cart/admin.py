@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Cart, CartItem
+from .totals import recalculate
 
 
 class CartItemInline(admin.TabularInline):
@@ -11,7 +12,11 @@ class CartItemInline(admin.TabularInline):
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_items', 'total_price', 'created_at']
     inlines = [CartItemInline]
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['total_items', 'total_price', 'created_at', 'updated_at']
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recalculate(Cart.objects.filter(pk=form.instance.pk))
 
 
 @admin.register(CartItem)
@@ -19,3 +24,16 @@ class CartItemAdmin(admin.ModelAdmin):
     list_display = ['cart', 'product', 'quantity', 'total_price', 'created_at']
     list_filter = ['created_at']
     search_fields = ['product__title', 'cart__user__email']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalculate(Cart.objects.filter(pk__in={obj.cart_id, form.initial.get('cart')} - {None}))
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalculate(Cart.objects.filter(pk=obj.cart_id))
+    
+    def delete_queryset(self, request, queryset):
+        cart_ids = set(queryset.values_list('cart_id', flat=True))
+        super().delete_queryset(request, queryset)
+        recalculate(Cart.objects.filter(pk__in=cart_ids))
@@ -0,0 +1,122 @@
+"""
+Batch cart mutations.
+
+A batch is a list of ``add``/``update``/``remove`` operations addressed by
+product id. All referenced products are loaded with one query, the
+operations are applied in order to an in-memory copy of the cart and
+validated as a whole (nothing is written if any operation fails), and the
+resulting lines are written with bulk queries in one transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from products import inventory
+from products.models import Product
+from . import hot
+from .models import Cart, CartItem
+from .totals import recalculate
+
+
+class CartBatchError(Exception):
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+def apply_operations(quantities, operations, products):
+    """
+    Apply ``operations`` to ``{product_id: quantity}`` and return the changed
+    lines as ``{product_id: new_quantity}`` (``0`` for removed lines).
+    """
+    quantities = dict(quantities)
+    changed = set()
+    for index, operation in enumerate(operations):
+        op, product_id = operation['op'], operation['product_id']
+        if op == 'remove':
+            if quantities.pop(product_id, None) is None:
+                raise CartBatchError(index, 'Cart item not found')
+        else:
+            product = products.get(product_id)
+            if product is None or not product.is_active:
+                raise CartBatchError(index, 'Product not found')
+            if op == 'update' and product_id not in quantities:
+                raise CartBatchError(index, 'Cart item not found')
+            quantity = operation['quantity'] + (quantities.get(product_id, 0) if op == 'add' else 0)
+            if quantity > product.stock_quantity:
+                raise CartBatchError(index, 'Not enough stock')
+            quantities[product_id] = quantity
+        changed.add(product_id)
+    return {product_id: quantities.get(product_id, 0) for product_id in changed}
+
+
+def merge_quantities(quantities, incoming, products):
+    """
+    Add ``incoming`` lines (e.g. a guest cart) to ``quantities``, capping them
+    at the available stock and skipping unavailable products.
+    """
+    changes = {}
+    for product_id, quantity in incoming.items():
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            continue
+        current = quantities.get(product_id, 0)
+        merged = min(current + quantity, product.stock_quantity)
+        if merged > current:
+            changes[product_id] = merged
+    return changes
+
+
+def get_products(operations):
+    """Load the products of ``operations`` with their available-to-sell stock"""
+    product_ids = {operation['product_id'] for operation in operations if operation['op'] != 'remove'}
+    if not product_ids:
+        return {}
+    products = Product.objects.in_bulk(product_ids)
+    inventory.refresh_available(products.values())
+    return products
+
+
+def apply_batch(user, operations):
+    """Apply ``operations`` to the cart of ``user``; raises ``CartBatchError``"""
+    products = get_products(operations)
+    return write_changes(user, lambda quantities: apply_operations(quantities, operations, products))
+
+
+def write_changes(user, compute):
+    """
+    Write the lines returned by ``compute({product_id: quantity})`` to the
+    cart of ``user`` (the hot store or the database).
+    """
+    if hot.enabled():
+        return hot.update_lines(user.pk, compute)
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        existing = {item.product_id: item for item in CartItem.objects.select_for_update().filter(cart=cart)}
+        changes = compute({product_id: item.quantity for product_id, item in existing.items()})
+
+        now = timezone.now()
+        removed, to_update, to_create = [], [], []
+        for product_id, quantity in changes.items():
+            item = existing.get(product_id)
+            if item is None:
+                if quantity:
+                    to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            elif not quantity:
+                removed.append(item.pk)
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                # bulk_update() does not apply auto_now
+                item.updated_at = now
+                to_update.append(item)
+
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if removed or to_update or to_create:
+            recalculate(Cart.objects.filter(pk=cart.pk))
+    return changes
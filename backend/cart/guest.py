@@ -0,0 +1,80 @@
+"""
+Guest carts.
+
+Anonymous visitors keep their cart client-side in a signed, compressed
+cookie holding ``[[product_id, quantity], ...]``. Reading it costs one bulk
+product query and writing it costs nothing, so browsing never writes to the
+database. When the visitor logs in or registers, the guest cart is merged
+into their real cart in bulk and the cookie is dropped.
+
+Like hot carts, guest cart items are addressed by product id.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .batch import CartBatchError, apply_operations, merge_quantities, write_changes
+from .hot import build_items
+from products import inventory
+from products.models import Product
+
+SALT = 'cart.guest'
+
+
+def read(request):
+    """Return the guest cart of ``request`` as ``{product_id: quantity}``"""
+    value = request.COOKIES.get(settings.GUEST_CART_COOKIE)
+    if not value:
+        return {}
+    try:
+        lines = signing.loads(value, salt=SALT, max_age=settings.GUEST_CART_MAX_AGE)
+    except signing.BadSignature:
+        return {}
+    return {int(product_id): int(quantity) for product_id, quantity in lines if int(quantity) > 0}
+
+
+def write(response, quantities):
+    if not quantities:
+        response.delete_cookie(settings.GUEST_CART_COOKIE, samesite='Lax')
+        return
+    value = signing.dumps([[product_id, quantity] for product_id, quantity in quantities.items()],
+                          salt=SALT, compress=True)
+    response.set_cookie(
+        settings.GUEST_CART_COOKIE, value, max_age=settings.GUEST_CART_MAX_AGE,
+        httponly=True, samesite='Lax', secure=not settings.DEBUG,
+    )
+
+
+def apply(quantities, operations, products):
+    """Apply batch ``operations`` to a guest cart and return the new quantities"""
+    quantities = dict(quantities)
+    quantities.update(apply_operations(quantities, operations, products))
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if len(quantities) > settings.GUEST_CART_MAX_ITEMS:
+        raise CartBatchError(len(operations) - 1, 'Cart is full')
+    return quantities
+
+
+class GuestCart:
+    """Stand-in for ``Cart`` that ``CartSerializer`` can render"""
+    id = created_at = updated_at = None
+
+    def __init__(self, items):
+        self.items = items
+        self.total_items = sum(item.quantity for item in items)
+        self.total_price = sum(item.total_price for item in items)
+
+
+def get_cart(quantities):
+    """The priced guest cart, with one product query"""
+    return GuestCart(build_items(quantities))
+
+
+def merge(request, user, response):
+    """Merge the guest cart of ``request`` into ``user``'s cart and drop the cookie"""
+    quantities = read(request)
+    if not quantities:
+        return
+    products = Product.objects.in_bulk(list(quantities))
+    inventory.refresh_available(products.values())
+    write_changes(user, lambda current: merge_quantities(current, quantities, products))
+    write(response, {})
@@ -0,0 +1,301 @@
+"""
+Redis-backed hot cart store.
+
+With ``CART_STORAGE = 'redis'`` the live cart of a user is a Redis hash
+mapping product id to quantity, plus a hash of the time each product was
+added and a version counter used for ETags. Cart mutations never touch the
+database: the user id is added to a dirty set instead and ``flush_carts``
+writes dirty carts back to ``Cart``/``CartItem``. Checkout reads the hot
+cart directly, so orders always see the same cart the user sees.
+
+Cart items are addressed by product id in this mode, both in responses and
+in the item URLs.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart, CartItem
+from .totals import recalculate
+
+DIRTY_KEY = 'cart:dirty'
+
+# Increment a line unless the result would exceed the stock limit
+ADD_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local quantity = current + tonumber(ARGV[2])
+if quantity > tonumber(ARGV[3]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], quantity)
+return quantity
+"""
+
+# Set a quantity only if the product is still in the cart
+SET_QUANTITY_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+# Take ordered quantities out of the cart, dropping lines that reach zero
+SUBTRACT_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local left = redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1]))
+    if left <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        redis.call('HDEL', KEYS[2], ARGV[i])
+    end
+end
+return 1
+"""
+
+_client = None
+
+
+def enabled():
+    return getattr(settings, 'CART_STORAGE', 'db') == 'redis'
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.CART_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def items_key(user_id):
+    return f'cart:{user_id}:items'
+
+
+def added_key(user_id):
+    return f'cart:{user_id}:added'
+
+
+def version_key(user_id):
+    return f'cart:{user_id}:version'
+
+
+def _keys(user_id):
+    return [items_key(user_id), added_key(user_id), version_key(user_id)]
+
+
+def _touch(pipe, user_id):
+    """Queue the bookkeeping every mutation needs: version, dirty flag, expiry"""
+    pipe.incr(version_key(user_id))
+    pipe.sadd(DIRTY_KEY, user_id)
+    for key in _keys(user_id):
+        pipe.expire(key, settings.CART_HOT_TTL)
+
+
+def ensure_loaded(user_id):
+    """Seed the hot cart from the database the first time a user touches it"""
+    client = get_client()
+    if client.exists(version_key(user_id)):
+        return
+    rows = CartItem.objects.filter(cart__user_id=user_id).values_list('product_id', 'quantity', 'created_at')
+    pipe = client.pipeline()
+    for product_id, quantity, created_at in rows:
+        pipe.hsetnx(items_key(user_id), product_id, quantity)
+        pipe.hsetnx(added_key(user_id), product_id, created_at.timestamp())
+    pipe.set(version_key(user_id), 0, nx=True)
+    for key in _keys(user_id):
+        pipe.expire(key, settings.CART_HOT_TTL)
+    pipe.execute()
+
+
+def get_quantities(user_id):
+    """Return ``({product_id: quantity}, {product_id: added timestamp})``"""
+    ensure_loaded(user_id)
+    pipe = get_client().pipeline()
+    pipe.hgetall(items_key(user_id))
+    pipe.hgetall(added_key(user_id))
+    items, added = pipe.execute()
+    return (
+        {int(product_id): int(quantity) for product_id, quantity in items.items()},
+        {int(product_id): float(stamp) for product_id, stamp in added.items()},
+    )
+
+
+def get_version(user_id):
+    ensure_loaded(user_id)
+    return get_client().get(version_key(user_id))
+
+
+def build_items(quantities, cart=None, added=None):
+    """
+    Build unsaved ``CartItem`` objects, addressed by product id, for
+    ``{product_id: quantity}`` with one product query. Lines are ordered by
+    ``added`` timestamps when given, insertion order otherwise.
+    """
+    if not quantities:
+        return []
+    products = Product.objects.select_related('category').in_bulk(list(quantities))
+    order = list(quantities)
+    if added is not None:
+        order.sort(key=lambda pk: (added.get(pk, 0), pk))
+    items = []
+    for product_id in order:
+        product = products.get(product_id)
+        # Products deleted since they were added simply drop out of the cart
+        if product is None:
+            continue
+        created_at = None
+        if added is not None and product_id in added:
+            created_at = datetime.fromtimestamp(added[product_id], dt_timezone.utc)
+        items.append(CartItem(
+            id=product_id, cart=cart, product=product, quantity=quantities[product_id], created_at=created_at,
+        ))
+    return items
+
+
+def get_cart_items(user_id, cart=None):
+    """Build unsaved ``CartItem`` objects for the hot cart, oldest first"""
+    quantities, added = get_quantities(user_id)
+    return build_items(quantities, cart, added)
+
+
+def add(user_id, product_id, quantity, limit):
+    """
+    Add ``quantity`` of a product and return the new line quantity, or
+    ``None`` when it would exceed ``limit`` (the product's stock).
+    """
+    ensure_loaded(user_id)
+    client = get_client()
+    new_quantity = client.eval(ADD_SCRIPT, 1, items_key(user_id), product_id, quantity, limit)
+    if new_quantity < 0:
+        return None
+    pipe = client.pipeline()
+    pipe.hsetnx(added_key(user_id), product_id, timezone.now().timestamp())
+    _touch(pipe, user_id)
+    pipe.execute()
+    return new_quantity
+
+
+def set_quantity(user_id, product_id, quantity):
+    """Set the quantity of a line; returns False when the product is not in the cart"""
+    ensure_loaded(user_id)
+    client = get_client()
+    if not client.eval(SET_QUANTITY_SCRIPT, 1, items_key(user_id), product_id, quantity):
+        return False
+    pipe = client.pipeline()
+    _touch(pipe, user_id)
+    pipe.execute()
+    return True
+
+
+def remove(user_id, product_id):
+    """Remove a line; returns False when the product is not in the cart"""
+    ensure_loaded(user_id)
+    pipe = get_client().pipeline()
+    pipe.hdel(items_key(user_id), product_id)
+    pipe.hdel(added_key(user_id), product_id)
+    _touch(pipe, user_id)
+    return bool(pipe.execute()[0])
+
+
+def update_lines(user_id, apply):
+    """
+    Atomically replace lines of the hot cart.
+
+    ``apply(quantities)`` receives the current ``{product_id: quantity}`` and
+    returns the lines to write (quantity ``0`` removes a line). It is retried
+    when the cart changes concurrently, so it must not have side effects.
+    """
+    ensure_loaded(user_id)
+    with get_client().pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(items_key(user_id))
+                current = {
+                    int(product_id): int(quantity)
+                    for product_id, quantity in pipe.hgetall(items_key(user_id)).items()
+                }
+                changes = apply(current)
+                now = timezone.now().timestamp()
+                pipe.multi()
+                for product_id, quantity in changes.items():
+                    if quantity:
+                        pipe.hset(items_key(user_id), product_id, quantity)
+                        pipe.hsetnx(added_key(user_id), product_id, now)
+                    else:
+                        pipe.hdel(items_key(user_id), product_id)
+                        pipe.hdel(added_key(user_id), product_id)
+                _touch(pipe, user_id)
+                pipe.execute()
+                return changes
+            except redis.WatchError:
+                continue
+
+
+def clear(user_id):
+    ensure_loaded(user_id)
+    pipe = get_client().pipeline()
+    pipe.delete(items_key(user_id), added_key(user_id))
+    _touch(pipe, user_id)
+    pipe.execute()
+
+
+def subtract(user_id, quantities):
+    """Take ordered ``{product_id: quantity}`` out of the cart after checkout"""
+    if not quantities:
+        return
+    client = get_client()
+    args = [value for item in quantities.items() for value in item]
+    client.eval(SUBTRACT_SCRIPT, 2, items_key(user_id), added_key(user_id), *args)
+    pipe = client.pipeline()
+    _touch(pipe, user_id)
+    pipe.execute()
+
+
+def persist(user_id):
+    """Write the hot cart of ``user_id`` back to ``Cart``/``CartItem``"""
+    quantities, added = get_quantities(user_id)
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user_id=user_id)
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+        stale = [item.pk for product_id, item in existing.items() if product_id not in quantities]
+        if stale:
+            CartItem.objects.filter(pk__in=stale).delete()
+
+        new_ids = [product_id for product_id in quantities if product_id not in existing]
+        if new_ids:
+            new_ids = list(Product.objects.filter(pk__in=new_ids).values_list('pk', flat=True))
+        now = timezone.now()
+        to_create = [
+            CartItem(cart=cart, product_id=product_id, quantity=quantities[product_id]) for product_id in new_ids
+        ]
+        to_update = []
+        for product_id, item in existing.items():
+            if product_id in quantities and item.quantity != quantities[product_id]:
+                item.quantity = quantities[product_id]
+                # bulk_update() does not apply auto_now
+                item.updated_at = now
+                to_update.append(item)
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if stale or to_create or to_update:
+            recalculate(Cart.objects.filter(pk=cart.pk))
+    return len(quantities)
+
+
+def flush_dirty(limit=500):
+    """Persist up to ``limit`` dirty carts and return how many were written"""
+    client = get_client()
+    user_ids = client.spop(DIRTY_KEY, limit) or []
+    for index, user_id in enumerate(user_ids):
+        try:
+            persist(int(user_id))
+        except Exception:
+            # Keep the failed cart and everything after it for the next run
+            client.sadd(DIRTY_KEY, *user_ids[index:])
+            raise
+    return len(user_ids)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cart import hot
+
+
+class Command(BaseCommand):
+    help = 'Write dirty hot carts from Redis back to the cart tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running and flush every INTERVAL seconds instead of flushing once',
+        )
+
+    def handle(self, *args, **options):
+        if not hot.enabled():
+            raise CommandError('CART_STORAGE is not "redis", there is nothing to flush')
+
+        while True:
+            total = 0
+            while True:
+                flushed = hot.flush_dirty(options['batch_size'])
+                total += flushed
+                if flushed < options['batch_size']:
+                    break
+            if total or options['verbosity'] > 1:
+                self.stdout.write(f'Flushed {total} carts')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -7,19 +7,14 @@
 class Cart(models.Model):
     """Shopping cart model"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Maintained by cart.totals on every cart mutation
+    total_items = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Cart for {self.user.email}"
-    
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.items.all())
-    
-    @property
-    def total_price(self):
-        return sum(item.total_price for item in self.items.all())
 
 
 class CartItem(models.Model):
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
-from products.serializers import ProductListSerializer
+from products.serializers import ProductCardSerializer, ProductListSerializer, wants_card
+from store_backend.fastpath import register_property
+from store_backend.serializers import SparseFieldsMixin
 
+register_property(CartItem, 'total_price', ['product__price', 'quantity'])
 
-class CartItemSerializer(serializers.ModelSerializer):
+
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
     total_price = serializers.ReadOnlyField()
     
@@ -11,8 +15,14 @@ class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity', 'total_price', 'created_at']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'product' in fields and wants_card(self.context):
+            fields['product'] = ProductCardSerializer(read_only=True)
+        return fields
+
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_items = serializers.ReadOnlyField()
     total_price = serializers.ReadOnlyField()
@@ -29,3 +39,20 @@ class AddToCartSerializer(serializers.Serializer):
 
 class UpdateCartItemSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    OPERATIONS = ['add', 'update', 'remove']
+    
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate(self, attrs):
+        if attrs['op'] != 'remove' and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,24 @@
+from django.db.models.signals import pre_delete, post_delete
+from django.dispatch import receiver
+from products.models import Product
+from products.signals import prices_changed
+from .models import Cart
+from .totals import recalculate, recalculate_for_products
+
+
+@receiver(prices_changed)
+def recalculate_cart_totals(sender, product_ids, **kwargs):
+    recalculate_for_products(product_ids)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts(sender, instance, **kwargs):
+    """Cart items are deleted along with the product, note whose totals change"""
+    instance._cart_ids = list(Cart.objects.filter(items__product=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def recalculate_after_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, '_cart_ids', None)
+    if cart_ids:
+        recalculate(Cart.objects.filter(pk__in=cart_ids))
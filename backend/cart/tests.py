@@ -0,0 +1,211 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.test import TransactionTestCase
+
+from store_backend.testing import (
+    QueryCountMixin, client_for, make_products, make_user, run_concurrently, test_settings,
+)
+from . import totals
+from .models import Cart, CartItem
+
+# Cart sizes (lines) every endpoint is measured at
+SIZES = (1, 10)
+
+
+def stored_and_actual_totals(user):
+    cart = Cart.objects.get(user=user)
+    actual = CartItem.objects.filter(cart=cart).aggregate(
+        items=Sum('quantity'), price=Sum(F('quantity') * F('product__price'))
+    )
+    return (cart.total_items, cart.total_price), (actual['items'] or 0, actual['price'] or Decimal('0'))
+
+
+@test_settings
+class CartTotalsConcurrencyTests(TransactionTestCase):
+    """Stored cart totals stay equal to the sum of the lines under concurrent writes"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.products = make_products(2, price='2.50')
+        for product in self.products:
+            response = client_for(self.user).post('/api/cart/add/', {'product_id': product.id, 'quantity': 1})
+            self.assertEqual(response.status_code, 201)
+        self.items = {item.product_id: item.pk for item in CartItem.objects.all()}
+
+    def test_concurrent_updates_and_removes_keep_totals(self):
+        first, second = (self.items[product.id] for product in self.products)
+
+        def update(item_id, quantity):
+            return lambda: client_for(self.user).put(
+                f'/api/cart/items/{item_id}/update/', {'quantity': quantity}
+            ).status_code
+
+        def remove(item_id):
+            return lambda: client_for(self.user).delete(f'/api/cart/items/{item_id}/remove/').status_code
+
+        statuses = run_concurrently([
+            update(first, 2), update(first, 5), update(first, 3), remove(first),
+            update(second, 4), update(second, 2), remove(second), update(second, 6),
+        ])
+
+        self.assertTrue(set(statuses) <= {200, 404})
+        stored, actual = stored_and_actual_totals(self.user)
+        self.assertEqual(stored, actual)
+
+
+@test_settings
+class AddToCartConcurrencyTests(TransactionTestCase):
+    """Concurrent adds of one product through the API lose no update and never oversell"""
+    threads = 8
+    adds = 5
+
+    def setUp(self):
+        self.user = make_user()
+
+    def add_concurrently(self, product):
+        """Run ``threads`` workers each adding one unit ``adds`` times; returns the accepted adds"""
+        def worker():
+            client = client_for(self.user)
+            accepted = 0
+            for _ in range(self.adds):
+                response = client.post('/api/cart/add/', {'product_id': product.id, 'quantity': 1})
+                self.assertIn(response.status_code, (201, 400), response.content)
+                accepted += response.status_code == 201
+            return accepted
+
+        return sum(run_concurrently([worker] * self.threads))
+
+    def assertCart(self, product, quantity):
+        item = CartItem.objects.get(cart__user=self.user)
+        self.assertEqual((item.product_id, item.quantity), (product.id, quantity))
+        stored, actual = stored_and_actual_totals(self.user)
+        self.assertEqual(stored, actual)
+        self.assertEqual(stored, (quantity, product.price * quantity))
+
+    def test_no_lost_updates(self):
+        product = make_products(1, price='1.25', stock=1000)[0]
+        accepted = self.add_concurrently(product)
+        self.assertEqual(accepted, self.threads * self.adds)
+        self.assertCart(product, accepted)
+
+    def test_stock_is_respected(self):
+        stock = self.threads * self.adds // 2
+        product = make_products(1, price='1.25', stock=stock)[0]
+        accepted = self.add_concurrently(product)
+        self.assertEqual(accepted, stock)
+        self.assertCart(product, stock)
+
+
+@test_settings
+class GuestCartTests(TransactionTestCase):
+    """Guest carts live in a signed cookie and are merged into the user's cart on login"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.phone, self.laptop = make_products(2, stock=4)
+        self.guest = client_for()
+
+    def add(self, client, product, quantity):
+        response = client.post('/api/cart/add/', {'product_id': product.id, 'quantity': quantity})
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_guest_cart_is_kept_in_the_cookie(self):
+        self.add(self.guest, self.phone, 2)
+        self.assertIn(settings.GUEST_CART_COOKIE, self.guest.cookies)
+        self.assertEqual(self.guest.get('/api/cart/').json()['total_items'], 2)
+        self.assertFalse(Cart.objects.exists())
+        # A tampered cookie is an empty cart
+        self.guest.cookies[settings.GUEST_CART_COOKIE] = self.guest.cookies[settings.GUEST_CART_COOKIE].value + 'x'
+        self.assertEqual(self.guest.get('/api/cart/').json()['total_items'], 0)
+
+    def test_login_merges_the_guest_cart(self):
+        self.add(client_for(self.user), self.laptop, 2)
+        self.add(self.guest, self.phone, 2)
+        self.add(self.guest, self.laptop, 3)
+
+        response = self.guest.post('/api/auth/login/', {'email': self.user.email, 'password': 'secret'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.cookies[settings.GUEST_CART_COOKIE].value, '')
+        quantities = dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+        # Merged quantities are capped at the stock
+        self.assertEqual(quantities, {self.phone.id: 2, self.laptop.id: 4})
+        stored, actual = stored_and_actual_totals(self.user)
+        self.assertEqual(stored, actual)
+
+
+@test_settings
+class CartConditionalGetTests(TransactionTestCase):
+    """The cart answers 304 until it changes"""
+
+    def setUp(self):
+        self.client = client_for(make_user())
+        self.products = make_products(2)
+
+    def test_etag_changes_with_the_cart(self):
+        self.client.post('/api/cart/add/', {'product_id': self.products[0].id, 'quantity': 1})
+        etag = self.client.get('/api/cart/')['ETag']
+        self.assertEqual(self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post('/api/cart/add/', {'product_id': self.products[1].id, 'quantity': 1})
+        response = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['items']), 2)
+
+
+@test_settings
+class CartQueryBudgetTests(QueryCountMixin, TransactionTestCase):
+    """Cart endpoints issue as many queries for a long cart as for a short one"""
+    sizes = SIZES
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = client_for(self.user)
+        self.products = make_products(max(SIZES) + 1)
+
+    def fill_cart(self, size):
+        """Give the user a cart of ``size`` lines, one unit each, and return it"""
+        cart, created = Cart.objects.get_or_create(user=self.user)
+        cart.items.all().delete()
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for product in self.products[:size])
+        totals.recalculate(Cart.objects.filter(pk=cart.pk))
+        return cart
+
+    def measure_on_cart(self, queries, prepare):
+        """``measure`` the request ``prepare(cart)`` returns on a cart of every size"""
+        return self.measure(queries, lambda size: prepare(self.fill_cart(size)))
+
+    def test_cart_detail(self):
+        response = self.measure_on_cart(4, lambda cart: lambda: self.client.get('/api/cart/'))
+        self.assertEqual(len(response.json()['items']), max(SIZES))
+
+    def test_add_to_cart(self):
+        data = {'product_id': self.products[-1].id, 'quantity': 1}
+        self.measure_on_cart(7, lambda cart: lambda: self.client.post('/api/cart/add/', data))
+
+    def test_update_cart_item(self):
+        def prepare(cart):
+            path = f'/api/cart/items/{cart.items.first().pk}/update/'
+            return lambda: self.client.put(path, {'quantity': 3})
+        self.measure_on_cart(7, prepare)
+
+    def test_remove_from_cart(self):
+        def prepare(cart):
+            path = f'/api/cart/items/{cart.items.first().pk}/remove/'
+            return lambda: self.client.delete(path)
+        self.measure_on_cart(7, prepare)
+
+    def test_clear_cart(self):
+        self.measure_on_cart(6, lambda cart: lambda: self.client.delete('/api/cart/clear/'))
+
+    def test_batch(self):
+        # As many operations as the cart has lines, plus one add
+        def prepare(cart):
+            operations = [
+                {'op': 'update', 'product_id': item.product_id, 'quantity': 2} for item in cart.items.all()
+            ]
+            operations.append({'op': 'add', 'product_id': self.products[-1].id, 'quantity': 1})
+            return lambda: self.client.post('/api/cart/batch/', {'operations': operations}, format='json')
+
+        response = self.measure_on_cart(11, prepare)
+        self.assertEqual(response.json()['total_items'], max(SIZES) * 2 + 1)
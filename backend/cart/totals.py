@@ -0,0 +1,52 @@
+"""
+Denormalized cart totals.
+
+``Cart.total_items`` and ``Cart.total_price`` are stored columns. Single
+line mutations adjust them with an ``F()`` update in the same transaction as
+the item change; changes that can touch many lines at once (price updates,
+product deletions, hot cart write-behind, admin edits) recompute them in SQL.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+
+def apply_delta(cart_id, quantity, amount):
+    """Add ``quantity`` items worth ``amount`` to the stored totals"""
+    Cart.objects.filter(pk=cart_id).update(
+        total_items=F('total_items') + quantity,
+        total_price=F('total_price') + amount,
+        updated_at=timezone.now(),
+    )
+
+
+def reset(cart_id):
+    Cart.objects.filter(pk=cart_id).update(total_items=0, total_price=Decimal('0'), updated_at=timezone.now())
+
+
+def totals_subqueries(cart_item_model=CartItem):
+    """``(total_items, total_price)`` expressions for the cart in ``OuterRef('pk')``"""
+    items = cart_item_model.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    price = DecimalField(max_digits=12, decimal_places=2)
+    total_items = items.annotate(total=Sum('quantity')).values('total')
+    total_price = items.annotate(
+        total=Sum(F('quantity') * F('product__price'), output_field=price)
+    ).values('total')
+    return (
+        Coalesce(Subquery(total_items), 0),
+        Coalesce(Subquery(total_price, output_field=price), Value(Decimal('0')), output_field=price),
+    )
+
+
+def recalculate(carts):
+    """Recompute the totals of every cart in the ``carts`` queryset with one UPDATE"""
+    total_items, total_price = totals_subqueries()
+    return carts.update(total_items=total_items, total_price=total_price, updated_at=timezone.now())
+
+
+def recalculate_for_products(product_ids):
+    return recalculate(Cart.objects.filter(pk__in=CartItem.objects.filter(product_id__in=product_ids).values('cart')))
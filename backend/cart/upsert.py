@@ -0,0 +1,91 @@
+"""
+Atomic cart line upsert.
+
+Adding to a cart is a single ``INSERT ... ON CONFLICT (cart_id, product_id)
+DO UPDATE`` that increments the existing quantity in the database, so
+concurrent adds to the same cart never lose updates. The stock guard is
+part of the same statement: a new line is only inserted, and an existing one
+only incremented, while the resulting quantity fits ``stock_quantity`` of an
+active product (or an explicit ``limit``, for sharded products whose row
+only mirrors their stock). Backends without ``ON CONFLICT ... RETURNING`` fall back to
+an ``F()`` update followed by an insert.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product
+from .models import CartItem
+
+UPSERT_SQL = """
+INSERT INTO {item} (cart_id, product_id, quantity, created_at, updated_at)
+SELECT %s, {product}.id, %s, %s, %s FROM {product}
+WHERE {product}.id = %s AND {product}.is_active AND {stock} >= %s
+ON CONFLICT (cart_id, product_id) DO UPDATE
+SET quantity = {item}.quantity + excluded.quantity, updated_at = excluded.updated_at
+WHERE {item}.quantity + excluded.quantity <= {limit}
+RETURNING id, quantity
+"""
+
+PRODUCT_STOCK = '(SELECT stock_quantity FROM {product} WHERE {product}.id = excluded.product_id)'
+
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+def add_item(cart_id, product_id, quantity, limit=None):
+    """
+    Add ``quantity`` of a product to a cart.
+
+    Returns ``(item_id, new_quantity)``, or ``None`` when the product is
+    inactive, missing or does not have enough stock (``limit`` when given)
+    for the new quantity.
+    """
+    if connection.vendor in UPSERT_VENDORS:
+        return _upsert(cart_id, product_id, quantity, limit)
+    return _update_or_insert(cart_id, product_id, quantity, limit)
+
+
+def _upsert(cart_id, product_id, quantity, limit=None):
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    product = connection.ops.quote_name(Product._meta.db_table)
+    params = [cart_id, quantity, now, now, product_id, quantity]
+    if limit is None:
+        stock, limit_sql = f'{product}.stock_quantity', PRODUCT_STOCK.format(product=product)
+    else:
+        stock = limit_sql = '%s'
+        params = [cart_id, quantity, now, now, product_id, limit, quantity, limit]
+    sql = UPSERT_SQL.format(
+        item=connection.ops.quote_name(CartItem._meta.db_table), product=product, stock=stock, limit=limit_sql,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def _update_or_insert(cart_id, product_id, quantity, limit=None):
+    stock = F('product__stock_quantity') if limit is None else limit
+    lines = CartItem.objects.filter(
+        cart_id=cart_id, product_id=product_id, product__is_active=True,
+        quantity__lte=stock - quantity,
+    )
+    with transaction.atomic():
+        if lines.update(quantity=F('quantity') + quantity, updated_at=timezone.now()):
+            return CartItem.objects.filter(cart_id=cart_id, product_id=product_id).values_list('id', 'quantity').get()
+        if CartItem.objects.filter(cart_id=cart_id, product_id=product_id).exists():
+            return None
+        if limit is not None and limit < quantity:
+            return None
+        products = Product.objects.filter(pk=product_id, is_active=True)
+        if limit is None:
+            products = products.filter(stock_quantity__gte=quantity)
+        if not products.exists():
+            return None
+        try:
+            with transaction.atomic():
+                item = CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            # Another request inserted the line first, increment it instead
+            if not lines.update(quantity=F('quantity') + quantity, updated_at=timezone.now()):
+                return None
+            return CartItem.objects.filter(cart_id=cart_id, product_id=product_id).values_list('id', 'quantity').get()
+    return item.pk, item.quantity
@@ -7,4 +7,5 @@
     path('items/<int:item_id>/update/', views.update_cart_item, name='update-cart-item'),
     path('items/<int:item_id>/remove/', views.remove_from_cart, name='remove-from-cart'),
     path('clear/', views.clear_cart, name='clear-cart'),
+    path('batch/', views.cart_batch, name='cart-batch'),
 ]
@@ -1,24 +1,87 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from . import guest, hot, totals
+from .upsert import add_item
 from .models import Cart, CartItem
-from .serializers import CartSerializer, AddToCartSerializer, UpdateCartItemSerializer
+from .batch import CartBatchError, apply_batch, get_products
+from .serializers import CartSerializer, AddToCartSerializer, UpdateCartItemSerializer, CartBatchSerializer
+from products import inventory
 from products.models import Product
+from products.cache import CATALOG_VERSION_KEY, get_versions
+from store_backend.conditional import ConditionalGetMixin
+from store_backend.query_budget import query_budget
 
 
-class CartView(generics.RetrieveAPIView):
-    """Get user's cart"""
+def get_cart(request, guest_quantities=None):
+    """Load the cart of the requesting user or guest with its items, products and categories"""
+    user = request.user
+    if not user.is_authenticated:
+        return guest.get_cart(guest.read(request) if guest_quantities is None else guest_quantities)
+    cart, created = Cart.objects.get_or_create(user=user)
+    if hot.enabled():
+        items = hot.get_cart_items(user.pk, cart)
+        cart._prefetched_objects_cache = {'items': items}
+        cart.total_items = sum(item.quantity for item in items)
+        cart.total_price = sum(item.total_price for item in items)
+        return cart
+    items = CartItem.objects.select_related('product__category')
+    prefetch_related_objects([cart], Prefetch('items', queryset=items))
+    return cart
+
+
+def lock_cart_item(user, item_id):
+    """
+    Lock a line of ``user``'s cart and return it with its product, or ``None``.
+    Call inside a transaction: the quantity read is then current until commit,
+    so the delta applied to the stored totals is too.
+    """
+    # Write first, so SQLite makes the transaction a writer; rows are locked
+    # item before cart, like add_to_cart does
+    items = CartItem.objects.filter(id=item_id, cart__user=user)
+    if not items.update(quantity=F('quantity')):
+        return None
+    return items.select_related('product').select_for_update(of=('self',)).first()
+
+
+def guest_error(e):
+    """Map a ``CartBatchError`` raised for a single guest cart operation to a response"""
+    if e.message == 'Cart item not found':
+        return Response({'error': e.message}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CartView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """Get user's (or guest's) cart"""
     serializer_class = CartSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
+    query_budget = 6
+    
+    def get_etag_parts(self):
+        if not self.request.user.is_authenticated:
+            # The signed cookie is the whole cart
+            return [self.request.COOKIES.get(settings.GUEST_CART_COOKIE), *get_versions(CATALOG_VERSION_KEY)]
+        if hot.enabled():
+            return [self.request.user.pk, hot.get_version(self.request.user.pk), *get_versions(CATALOG_VERSION_KEY)]
+        # Every cart mutation updates the stored totals and updated_at
+        state = Cart.objects.filter(user=self.request.user).values_list(
+            'pk', 'updated_at', 'total_items', 'total_price'
+        ).first()
+        # Items embed live product data, so catalog changes count as well
+        return [self.request.user.pk, state, *get_versions(CATALOG_VERSION_KEY)]
     
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+        return get_cart(self.request)
 
 
+@query_budget(9)
 @api_view(['POST'])
+@permission_classes([AllowAny])
 def add_to_cart(request):
     """Add item to cart"""
     serializer = AddToCartSerializer(data=request.data)
@@ -31,22 +94,43 @@ def add_to_cart(request):
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        # Exact available-to-sell stock for sharded products
+        inventory.refresh_available([product])
         if not product.is_in_stock:
             return Response({'error': 'Product is out of stock'}, status=status.HTTP_400_BAD_REQUEST)
         
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        quantities = None
+        if not request.user.is_authenticated:
+            try:
+                quantities = guest.apply(guest.read(request), [
+                    {'op': 'add', 'product_id': product.id, 'quantity': quantity}
+                ], {product.id: product})
+            except CartBatchError as e:
+                if e.message != 'Not enough stock':
+                    return guest_error(e)
+            line = None if quantities is None else (product.id, quantities[product.id])
+        elif hot.enabled():
+            # Hot cart items are addressed by product id
+            new_quantity = hot.add(request.user.pk, product.id, quantity, product.stock_quantity)
+            line = None if new_quantity is None else (product.id, new_quantity)
+        else:
+            # Outside the transaction, which has to start with a write on SQLite
+            cart, created = Cart.objects.get_or_create(user=request.user)
+            with transaction.atomic():
+                # Insert or increment in one statement, guarded by the stock
+                line = add_item(cart.pk, product.id, quantity, product.stock_quantity if product.stock_shards else None)
+                if line is not None:
+                    totals.apply_delta(cart.pk, quantity, product.price * quantity)
         
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
+        if line is None:
+            return Response({
+                'error': 'Not enough stock',
+                'stock_quantity': product.stock_quantity
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        cart_item = CartItem(id=line[0], product=product, quantity=line[1])
         
-        return Response({
+        response = Response({
             'message': 'Item added to cart successfully',
             'cart_item': {
                 'id': cart_item.id,
@@ -55,26 +139,60 @@ def add_to_cart(request):
                 'total_price': cart_item.total_price
             }
         }, status=status.HTTP_201_CREATED)
+        if quantities is not None:
+            guest.write(response, quantities)
+        return response
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(6)
 @api_view(['PUT'])
+@permission_classes([AllowAny])
 def update_cart_item(request, item_id):
     """Update cart item quantity"""
     serializer = UpdateCartItemSerializer(data=request.data)
     if serializer.is_valid():
         quantity = serializer.validated_data['quantity']
         
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart__user=request.user)
-        except CartItem.DoesNotExist:
-            return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        cart_item.quantity = quantity
-        cart_item.save()
+        quantities = None
+        if not request.user.is_authenticated:
+            # Guest cart items are addressed by product id
+            product = Product.objects.filter(id=item_id).first()
+            if product is not None:
+                inventory.refresh_available([product])
+            try:
+                quantities = guest.apply(guest.read(request), [
+                    {'op': 'update', 'product_id': item_id, 'quantity': quantity}
+                ], {item_id: product} if product else {})
+            except CartBatchError as e:
+                return guest_error(e)
+            cart_item = CartItem(id=item_id, product=product, quantity=quantity)
+        elif hot.enabled():
+            # Hot cart items are addressed by product id; check the stock before writing to Redis
+            product = Product.objects.filter(id=item_id).first()
+            if product is None:
+                return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+            inventory.refresh_available([product])
+            if quantity > product.stock_quantity:
+                return Response({
+                    'error': 'Not enough stock',
+                    'stock_quantity': product.stock_quantity
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if not hot.set_quantity(request.user.pk, item_id, quantity):
+                return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+            cart_item = CartItem(id=item_id, product=product, quantity=quantity)
+        else:
+            with transaction.atomic():
+                cart_item = lock_cart_item(request.user, item_id)
+                if cart_item is None:
+                    return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+                change = quantity - cart_item.quantity
+                cart_item.quantity = quantity
+                cart_item.save(update_fields=['quantity', 'updated_at'])
+                totals.apply_delta(cart_item.cart_id, change, cart_item.product.price * change)
         
-        return Response({
+        response = Response({
             'message': 'Cart item updated successfully',
             'cart_item': {
                 'id': cart_item.id,
@@ -83,24 +201,79 @@ def update_cart_item(request, item_id):
                 'total_price': cart_item.total_price
             }
         })
+        if quantities is not None:
+            guest.write(response, quantities)
+        return response
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(6)
 @api_view(['DELETE'])
+@permission_classes([AllowAny])
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
-    try:
-        cart_item = CartItem.objects.get(id=item_id, cart__user=request.user)
-        cart_item.delete()
+    if not request.user.is_authenticated:
+        try:
+            quantities = guest.apply(guest.read(request), [{'op': 'remove', 'product_id': item_id}], {})
+        except CartBatchError as e:
+            return guest_error(e)
+        response = Response({'message': 'Item removed from cart successfully'})
+        guest.write(response, quantities)
+        return response
+    if hot.enabled():
+        if not hot.remove(request.user.pk, item_id):
+            return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'message': 'Item removed from cart successfully'})
-    except CartItem.DoesNotExist:
-        return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+    with transaction.atomic():
+        cart_item = lock_cart_item(request.user, item_id)
+        if cart_item is None:
+            return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+        CartItem.objects.filter(pk=cart_item.pk).delete()
+        totals.apply_delta(cart_item.cart_id, -cart_item.quantity, -cart_item.total_price)
+    return Response({'message': 'Item removed from cart successfully'})
 
 
+@query_budget(5)
 @api_view(['DELETE'])
+@permission_classes([AllowAny])
 def clear_cart(request):
     """Clear all items from cart"""
+    if not request.user.is_authenticated:
+        response = Response({'message': 'Cart cleared successfully'})
+        guest.write(response, {})
+        return response
+    if hot.enabled():
+        hot.clear(request.user.pk)
+        return Response({'message': 'Cart cleared successfully'})
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart.items.all().delete()
+    with transaction.atomic():
+        cart.items.all().delete()
+        totals.reset(cart.pk)
     return Response({'message': 'Cart cleared successfully'})
+
+
+@query_budget(12)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def cart_batch(request):
+    """Apply several add/update/remove operations at once and return the cart"""
+    serializer = CartBatchSerializer(data=request.data)
+    if serializer.is_valid():
+        operations = serializer.validated_data['operations']
+        quantities = None
+        try:
+            if request.user.is_authenticated:
+                apply_batch(request.user, operations)
+            else:
+                quantities = guest.apply(guest.read(request), operations, get_products(operations))
+        except CartBatchError as e:
+            return Response({'error': e.message, 'operation': e.index}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cart = get_cart(request, quantities)
+        response = Response(CartSerializer(cart, context={'request': request}).data)
+        if quantities is not None:
+            guest.write(response, quantities)
+        return response
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
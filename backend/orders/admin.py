@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatusEvent, PaymentAttempt
+from .transitions import transition
 
 
 class OrderItemInline(admin.TabularInline):
@@ -8,6 +9,38 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['total_price']
 
 
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'actor', 'note', 'created_at']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class PaymentAttemptInline(admin.TabularInline):
+    model = PaymentAttempt
+    extra = 0
+    can_delete = False
+    readonly_fields = ['amount', 'payment_method', 'status', 'reference', 'error', 'created_at', 'completed_at']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+def status_action(status):
+    """Admin action moving the selected orders to ``status`` through the state machine"""
+    def action(modeladmin, request, queryset):
+        results = transition(list(queryset.values_list('pk', flat=True)), status, actor=request.user)
+        counts = {}
+        for result in results:
+            counts[result['result']] = counts.get(result['result'], 0) + 1
+        modeladmin.message_user(request, ', '.join(f'{count} {result}' for result, count in sorted(counts.items())))
+    action.__name__ = f'mark_{status}'
+    return admin.action(description=f'Mark selected orders as {status}')(action)
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
@@ -16,8 +49,10 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_number', 'user__email', 'user__first_name', 'user__last_name']
-    inlines = [OrderItemInline]
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    inlines = [OrderItemInline, OrderStatusEventInline, PaymentAttemptInline]
+    # Status changes go through the actions, which check and log them
+    readonly_fields = ['order_number', 'status', 'created_at', 'updated_at']
+    actions = [status_action(status) for status, label in Order.STATUS_CHOICES if status != 'pending']
     
     fieldsets = (
         ('Order Information', {
@@ -41,3 +76,47 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['order__order_number', 'product__title']
     readonly_fields = ['total_price']
+
+
+@admin.register(OrderStatusEvent)
+class OrderStatusEventAdmin(admin.ModelAdmin):
+    """Read-only status history"""
+    list_display = ['order', 'from_status', 'to_status', 'actor', 'created_at']
+    list_filter = ['to_status', 'created_at']
+    list_select_related = ['order', 'actor']
+    search_fields = ['order__order_number']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'quantity', 'price', 'created_at']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only archived orders (see ``orders.archive``)"""
+    list_display = ['order_number', 'user', 'status', 'payment_status', 'total_amount', 'created_at', 'archived_at']
+    list_filter = ['status', 'payment_status', 'created_at']
+    list_select_related = ['user']
+    search_fields = ['order_number', 'user__email']
+    inlines = [ArchivedOrderItemInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
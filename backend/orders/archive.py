@@ -0,0 +1,105 @@
+"""
+Hot/cold split of the orders tables.
+
+Orders in a final status (delivered or cancelled) created more than
+``ORDER_RETENTION_DAYS`` ago are moved by ``archive_orders`` from
+``Order``/``OrderItem`` to ``ArchivedOrder``/``ArchivedOrderItem``, so the
+hot tables (and every list, lookup and admin query on them) only hold recent
+and open orders. Ids, order numbers and timestamps are kept; the status
+history is stored on the archived order, payment attempts are dropped (the
+order keeps its ``payment_id``). Orders are moved in batches, each
+copied and deleted in one transaction with a fixed number of queries.
+
+Archived orders are read through ``archived_orders``: the order detail and
+search endpoints fall back to it when the hot tables miss, ``export_orders
+--archived`` exports them and ``backfill_sales`` counts them. Archiving does
+not change the sales rollups.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatusEvent
+from .transitions import TRANSITIONS
+
+# Statuses an order never leaves
+FINAL_STATUSES = sorted(status for status, targets in TRANSITIONS.items() if not targets)
+DEFAULT_BATCH_SIZE = 500
+
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+ITEM_FIELDS = [field.attname for field in OrderItem._meta.concrete_fields]
+EVENT_FIELDS = ['order_id', 'from_status', 'to_status', 'actor_id', 'note', 'created_at']
+
+
+def archived_orders(user=None):
+    """Archived orders, of ``user`` only when given"""
+    orders = ArchivedOrder.objects.all()
+    return orders if user is None else orders.filter(user=user)
+
+
+def archived_items_prefetch():
+    """Load archived order items with their products and categories in one query"""
+    return Prefetch('items', queryset=ArchivedOrderItem.objects.select_related('product__category'))
+
+
+def archivable(before):
+    """
+    Hot orders that may be archived: in a final status, created before
+    ``before`` and with no payment still being processed (its attempt would
+    be dropped with the order before the outcome is recorded)
+    """
+    return Order.objects.filter(status__in=FINAL_STATUSES, created_at__lt=before).exclude(
+        payment_attempts__status='pending'
+    )
+
+
+def retention_cutoff(days=None):
+    days = settings.ORDER_RETENTION_DAYS if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def status_history(order_ids):
+    """``{order_id: [event, ...]}`` with the status events of the orders, oldest first"""
+    history = {order_id: [] for order_id in order_ids}
+    events = OrderStatusEvent.objects.filter(order_id__in=order_ids).order_by('created_at', 'pk')
+    for event in events.values(*EVENT_FIELDS):
+        order_id = event.pop('order_id')
+        event['created_at'] = event['created_at'].isoformat()
+        history[order_id].append(event)
+    return history
+
+
+def archive_batch(order_ids):
+    """Move the archivable orders among ``order_ids`` to the archive; returns how many moved"""
+    with transaction.atomic():
+        # Lock the orders first (on SQLite this also makes the transaction a writer)
+        orders = Order.objects.filter(pk__in=order_ids, status__in=FINAL_STATUSES)
+        if not orders.update(status=F('status')):
+            return 0
+        rows = list(orders.values(*ORDER_FIELDS))
+        order_ids = [row['id'] for row in rows]
+        history = status_history(order_ids)
+        items = OrderItem.objects.filter(order_id__in=order_ids).values(*ITEM_FIELDS)
+
+        ArchivedOrder.objects.bulk_create(
+            ArchivedOrder(**row, status_history=history[row['id']]) for row in rows
+        )
+        ArchivedOrderItem.objects.bulk_create(ArchivedOrderItem(**item) for item in items)
+        # Items, status events and payment attempts go with their orders
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(order_ids)
+
+
+def archive(before, batch_size=DEFAULT_BATCH_SIZE):
+    """Archive every order ``archivable`` before ``before``, in id order; returns how many moved"""
+    candidates = archivable(before).order_by('pk')
+    archived, after = 0, 0
+    while True:
+        order_ids = list(candidates.filter(pk__gt=after).values_list('pk', flat=True)[:batch_size])
+        if not order_ids:
+            return archived
+        archived += archive_batch(order_ids)
+        after = order_ids[-1]
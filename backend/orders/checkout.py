@@ -0,0 +1,174 @@
+"""
+Checkout.
+
+An order is placed in one transaction with a fixed number of queries,
+whatever the size of the cart:
+
+1. the cart lines are locked (an ``UPDATE``, which on SQLite also makes the
+   transaction a writer) and read, so a concurrent update of a line waits
+   for the order instead of being lost, and a second checkout of the same
+   cart finds it empty;
+2. the user's stock holds on the cart products are consumed and the rest is
+   taken from the sellable stock by ``products.inventory.settle``; the
+   unsharded product rows are locked in a single ``select_for_update``
+   ordered by id, so concurrent checkouts always lock in the same order and
+   cannot deadlock (backends without row locks, i.e. SQLite, serialize
+   writers instead and skip this step), and sharded products only lock the
+   counter row they decrement;
+3. stock is decremented with one ``UPDATE`` of ``F()`` expressions for the
+   unsharded lines, guarded per row by ``stock_quantity >= quantity``, plus
+   one per sharded line; if any line does not fit the whole transaction is
+   rolled back;
+4. the products are read back under the lock and the order and its items
+   are written with ``create`` and ``bulk_create``;
+5. the ordered cart lines are removed.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from cart import hot
+from cart.models import Cart, CartItem
+from cart.totals import recalculate
+from products import inventory
+from products.cache import CATALOG_VERSION_KEY, bump_versions, category_version_key, product_version_key
+from products.inventory import OutOfStock
+from products.models import Product
+from .models import Order, OrderItem
+from .signals import order_placed
+
+SHIPPING_COST = Decimal('10.00')  # Fixed shipping cost
+TAX_RATE = Decimal('0.09')  # 9% tax
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, products=None):
+        super().__init__(message)
+        self.message = message
+        self.products = products or []
+
+
+def get_cart_lines(user, lock=False):
+    """
+    Return the cart of ``user`` as ``{product_id: quantity}`` plus the
+    ``CartItem`` ids to delete after checkout (``None`` for hot carts).
+
+    With ``lock`` the lines are touched first, inside the caller's
+    transaction: this locks them until it ends (lines before the cart, like
+    the cart views) and, on SQLite, makes the transaction a writer, so
+    concurrent checkouts wait for each other instead of failing to upgrade
+    their read locks.
+    """
+    if hot.enabled():
+        quantities, added = hot.get_quantities(user.pk)
+        return quantities, None
+    items = CartItem.objects.filter(cart__user=user)
+    if lock:
+        items.update(quantity=F('quantity'))
+    rows = items.values_list('pk', 'product_id', 'quantity')
+    quantities, line_ids = {}, []
+    for pk, product_id, quantity in rows:
+        quantities[product_id] = quantity
+        line_ids.append(pk)
+    return quantities, line_ids
+
+
+def unavailable_products(quantities):
+    """Describe the lines of ``quantities`` that cannot be fulfilled right now"""
+    products = Product.objects.in_bulk(list(quantities))
+    inventory.refresh_available(products.values())
+    unavailable = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        available = product.stock_quantity if product is not None and product.is_active else 0
+        if available < quantity:
+            unavailable.append({
+                'id': product_id,
+                'title': product.title if product is not None else None,
+                'requested': quantity,
+                'available': available,
+            })
+    return unavailable
+
+
+def start_checkout(user):
+    """
+    Hold the stock for the cart of ``user`` for ``STOCK_HOLD_TTL`` seconds.
+    Returns ``(quantities, expires_at)``; raises ``CheckoutError`` without
+    holding anything when the cart is empty or a product is unavailable.
+    """
+    quantities, line_ids = get_cart_lines(user)
+    if not quantities:
+        raise CheckoutError('Cart is empty')
+    try:
+        expires_at = inventory.hold(user, quantities)
+    except OutOfStock:
+        raise CheckoutError('Not enough stock', unavailable_products(quantities))
+    # Held stock is no longer available to others
+    inventory.stock_changed(quantities)
+    return quantities, expires_at
+
+
+def place_order(user, data):
+    """
+    Turn the cart of ``user`` into an order using the shipping and payment
+    fields in ``data``. Raises ``CheckoutError`` without changing anything
+    when the cart is empty or a product is unavailable.
+    """
+    try:
+        order = _place_order(user, data)
+    except OutOfStock as e:
+        # Described after the rollback, from the stock as it was
+        raise CheckoutError('Not enough stock', unavailable_products(e.args[0]))
+    return order
+
+
+def _place_order(user, data):
+    with transaction.atomic():
+        quantities, line_ids = get_cart_lines(user, lock=True)
+        if not quantities:
+            raise CheckoutError('Cart is empty')
+        try:
+            inventory.settle(user, quantities)
+        except OutOfStock:
+            raise OutOfStock(quantities)
+        products = Product.objects.in_bulk(list(quantities))
+
+        subtotal = sum(products[product_id].price * quantity for product_id, quantity in quantities.items())
+        tax_amount = subtotal * TAX_RATE
+        order = Order.objects.create(
+            user=user,
+            shipping_address=data['shipping_address'],
+            shipping_city=data['shipping_city'],
+            shipping_postal_code=data['shipping_postal_code'],
+            shipping_phone=data.get('shipping_phone', ''),
+            payment_method=data['payment_method'],
+            notes=data.get('notes', ''),
+            subtotal=subtotal,
+            shipping_cost=SHIPPING_COST,
+            tax_amount=tax_amount,
+            total_amount=subtotal + SHIPPING_COST + tax_amount,
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[product_id], quantity=quantity,
+                      price=products[product_id].price)
+            for product_id, quantity in quantities.items()
+        ])
+        order_placed.send(sender=Order, order=order, items=items)
+
+        if line_ids is None:
+            # Only the ordered quantities, items added meanwhile stay in the hot cart
+            transaction.on_commit(lambda: hot.subtract(user.pk, quantities))
+            CartItem.objects.filter(cart__user=user, product_id__in=list(quantities)).delete()
+        else:
+            CartItem.objects.filter(pk__in=line_ids).delete()
+        recalculate(Cart.objects.filter(user=user))
+
+        # Stock is part of the cached product responses
+        bump_versions(
+            CATALOG_VERSION_KEY,
+            *[product_version_key(product_id) for product_id in quantities],
+            *{category_version_key(product.category_id) for product in products.values()},
+        )
+    return order
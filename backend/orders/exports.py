@@ -0,0 +1,64 @@
+"""
+Order export for accounting: one CSV row per order item (order columns
+repeated, an order without items gets one row), or one JSON Lines record
+per order with its items nested. Each chunk of orders costs two queries,
+the orders with their customers and the items with their products.
+``ArchivedOrderExporter`` exports the archived orders the same way.
+"""
+from store_backend.exports import Exporter
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ORDER_FIELDS = [
+    'id', 'order_number', 'status', 'payment_status', 'payment_method', 'payment_id',
+    'shipping_city', 'shipping_postal_code', 'subtotal', 'shipping_cost', 'tax_amount', 'total_amount',
+    'created_at', 'updated_at',
+]
+ITEM_FIELDS = ['product_id', 'product__title', 'quantity', 'price']
+
+
+class OrderExporter(Exporter):
+    columns = [
+        'order_id', *ORDER_FIELDS[1:], 'customer_id', 'customer_email',
+        'product_id', 'product_title', 'quantity', 'price', 'line_total',
+    ]
+    filename = 'orders'
+    model = Order
+    item_model = OrderItem
+
+    def get_queryset(self):
+        return self.model.objects.values(*ORDER_FIELDS, 'user_id', 'user__email')
+
+    def add_related(self, orders):
+        items = {order['id']: [] for order in orders}
+        rows = self.item_model.objects.filter(order_id__in=list(items)).order_by('order_id', 'pk').values_list(
+            'order_id', *ITEM_FIELDS
+        )
+        for order_id, product_id, title, quantity, price in rows:
+            items[order_id].append([product_id, title, quantity, price, price * quantity])
+        for order in orders:
+            order['items'] = items[order['id']]
+
+    def order_values(self, order):
+        return [order[field] for field in ORDER_FIELDS] + [order['user_id'], order['user__email']]
+
+    def csv_rows(self, order):
+        values = self.order_values(order)
+        if not order['items']:
+            yield values + [''] * 5
+        for item in order['items']:
+            yield values + item
+
+    def document(self, order):
+        document = {field: order[field] for field in ORDER_FIELDS}
+        document['customer'] = {'id': order['user_id'], 'email': order['user__email']}
+        document['items'] = [
+            dict(zip(['product_id', 'product_title', 'quantity', 'price', 'line_total'], item))
+            for item in order['items']
+        ]
+        return document
+
+
+class ArchivedOrderExporter(OrderExporter):
+    filename = 'archived-orders'
+    model = ArchivedOrder
+    item_model = ArchivedOrderItem
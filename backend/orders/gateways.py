@@ -0,0 +1,77 @@
+"""
+Payment gateway adapters.
+
+``PAYMENT_GATEWAY`` names the adapter class and ``PAYMENT_GATEWAY_OPTIONS``
+its keyword arguments. An adapter implements ``charge``, which is called
+from the payment workers (``process_payments``), outside any transaction and
+possibly from several threads at once. The attempt id is the idempotency key
+of the charge: a gateway seeing it again must not charge twice.
+
+``StubGateway`` charges in process with a configurable latency, decline
+rate and error rate, for development and offline throughput tests.
+"""
+import random
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or failed; the charge is retried"""
+
+
+class ChargeResult:
+    """Outcome of a charge the gateway answered"""
+    __slots__ = ['succeeded', 'reference', 'message']
+
+    def __init__(self, succeeded, reference=None, message=''):
+        self.succeeded = succeeded
+        self.reference = reference
+        self.message = message
+
+
+class Gateway:
+    def charge(self, attempt):
+        """
+        Charge ``attempt.amount`` for ``attempt.order`` and return a
+        ``ChargeResult``, or raise ``GatewayError`` when the outcome is unknown.
+        """
+        raise NotImplementedError
+
+
+class StubGateway(Gateway):
+    """Gateway answering after ``latency`` seconds, declining or failing at the given rates"""
+
+    def __init__(self, latency=0, decline_rate=0, error_rate=0, seed=None):
+        self.latency = latency
+        self.decline_rate = decline_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Outcomes by attempt id, so repeated charges are not charged twice
+        self.results = {}
+
+    def charge(self, attempt):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if attempt.pk in self.results:
+                return self.results[attempt.pk]
+            roll = self.random.random()
+            if roll < self.error_rate:
+                raise GatewayError('Gateway timed out')
+            if roll < self.error_rate + self.decline_rate:
+                result = ChargeResult(False, message='Card declined')
+            else:
+                result = ChargeResult(True, reference=f"PAY_{attempt.order.order_number}_{attempt.pk}")
+            self.results[attempt.pk] = result
+            return result
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    """The configured gateway adapter (one instance per process)"""
+    return import_string(settings.PAYMENT_GATEWAY)(**settings.PAYMENT_GATEWAY_OPTIONS)
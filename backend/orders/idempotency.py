@@ -0,0 +1,190 @@
+"""
+``Idempotency-Key`` support for the unsafe order endpoints.
+
+Clients send an ``Idempotency-Key`` header with requests they may retry.
+The first request with a key claims an ``IdempotencyKey`` row (unique per
+user and key) and runs the view in a transaction that also stores the
+response on that row, so an order and the response describing it are
+committed together or not at all. A request reusing the key:
+
+* gets the stored response replayed (body, status and the headers a
+  retrying client follows, like ``Location`` and ``Retry-After``), marked
+  ``Idempotent-Replayed: true``, without touching the order tables;
+* waits up to ``IDEMPOTENCY_WAIT`` seconds while the first request is still
+  running, then gets ``409 Conflict``;
+* gets ``422`` when its method, path or body differ from the first one.
+
+Server errors are not stored: the claim is dropped and a retry runs the view
+again. A claim left unfinished for ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds
+belongs to a worker that died (rolling its transaction back) and is taken
+over. Responses are replayed for ``IDEMPOTENCY_KEY_TTL`` seconds, after which
+the key can be reused; ``clear_idempotency_keys`` deletes expired rows.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Response headers stored with the response and replayed
+REPLAYED_HEADERS = ('Location', 'Retry-After', 'ETag', 'Last-Modified')
+# Seconds between checks on an unfinished duplicate, doubling up to the maximum
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1
+
+
+def request_hash(request):
+    """Fingerprint of the method, path and body of ``request``"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def claim(user, key, fingerprint):
+    """
+    Try to make the current request the owner of ``key``. Returns
+    ``(record, True)`` on success, otherwise ``(record, False)`` with the
+    record of the owner, or ``(None, False)`` when it changed meanwhile.
+    """
+    now = timezone.now()
+    values = {
+        'request_hash': fingerprint,
+        'response_status': None,
+        'response_body': None,
+        'response_headers': {},
+        'locked_at': now,
+        'expires_at': now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    }
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, **values), True
+        except IntegrityError:
+            # A concurrent duplicate claimed it first
+            return None, False
+
+    takeover = None
+    if record.expires_at <= now:
+        takeover = IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at)
+    elif (record.response_status is None and record.request_hash == fingerprint
+          and record.locked_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)):
+        takeover = IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, response_status=None)
+    if takeover is None:
+        return record, False
+    # Compare and set: only one of several retries takes over
+    if not takeover.update(**values):
+        return None, False
+    for field, value in values.items():
+        setattr(record, field, value)
+    return record, True
+
+
+def acquire(user, key, fingerprint):
+    """Claim ``key``, or return the response a duplicate request gets"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    interval = POLL_INTERVAL
+    while True:
+        record, claimed = claim(user, key, fingerprint)
+        if claimed:
+            return record
+        if record is not None:
+            if record.request_hash != fingerprint:
+                return Response(
+                    {'error': f'{HEADER} was already used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.response_status is not None:
+                return replay(record)
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'error': f'A request with this {HEADER} is still being processed'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def execute(record, view, request, *args, **kwargs):
+    """Run ``view`` and store its response on ``record`` in one transaction"""
+    try:
+        with transaction.atomic():
+            # Lock the claim first (on SQLite this also makes the transaction a writer);
+            # nothing is updated when another request took it over
+            owned = IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).update(
+                locked_at=record.locked_at
+            )
+            if not owned:
+                return Response(
+                    {'error': f'A request with this {HEADER} is still being processed'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+            else:
+                # Encoded like the JSON renderer does, so replays are identical
+                body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                headers = {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    response_status=response.status_code, response_body=body, response_headers=headers
+                )
+    except Exception:
+        release(record)
+        raise
+    if response.status_code >= 500:
+        release(record)
+    return response
+
+
+def release(record):
+    """Drop an unfinished claim so a retry runs the view again"""
+    IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, response_status=None).delete()
+
+
+def idempotent(view):
+    """Honour ``Idempotency-Key`` on a function view; goes below ``@api_view``"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters long'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        record = acquire(request.user, key, request_hash(request))
+        if isinstance(record, Response):
+            return record
+        return execute(record, view, request, *args, **kwargs)
+    return wrapper
+
+
+def clear_expired():
+    """Delete expired keys and return how many were deleted"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,54 @@
+"""
+Order number lookup.
+
+Order numbers are stored upper case (``ORD-`` plus hex digits), so a search
+term is normalized the same way and resolved with one query over the
+``(user, order_number)`` index:
+
+* an exact order number, with or without the ``ORD-`` prefix;
+* a prefix of an order number, as a range scan (``LIKE`` is case
+  insensitive on SQLite and locale dependent on PostgreSQL, neither of which
+  can use a plain index);
+* a numeric order id, including the legacy ``ORD-<id>`` form.
+
+When several orders match, exact numbers win over ids, ids over prefixes,
+and the newest order wins among prefixes.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Order
+
+PREFIX = 'ORD-'
+
+
+def normalize(term):
+    return ''.join(term.split()).upper()
+
+
+def prefix_range(prefix):
+    """``Q`` matching order numbers starting with ``prefix`` through an index range scan"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(order_number__gte=prefix, order_number__lt=upper, order_number__startswith=prefix)
+
+
+def find_order(term, queryset=None):
+    """Return the order best matching ``term`` in ``queryset`` (all orders by default), or ``None``"""
+    queryset = Order.objects.all() if queryset is None else queryset
+    term = normalize(term)
+    if not term:
+        return None
+
+    numbers = [term] if term.startswith(PREFIX) else [term, PREFIX + term]
+    matches = Q()
+    for number in numbers:
+        matches |= prefix_range(number)
+    rank = [When(order_number__in=numbers, then=Value(0))]
+
+    order_id = term[len(PREFIX):] if term.startswith(PREFIX) else term
+    if order_id.isdigit() and len(order_id) < 19:
+        matches |= Q(pk=int(order_id))
+        rank.append(When(pk=int(order_id), then=Value(1)))
+
+    return queryset.filter(matches).annotate(
+        match_rank=Case(*rank, default=Value(2), output_field=IntegerField())
+    ).order_by('match_rank', '-created_at').first()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.archive import DEFAULT_BATCH_SIZE, archivable, archive, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move delivered and cancelled orders past the retention age to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention age in days (ORDER_RETENTION_DAYS by default)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Orders moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be moved')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        before = timezone.localtime(retention_cutoff(options['days']))
+        if options['dry_run']:
+            self.stdout.write(f'{archivable(before).count()} orders created before {before:%Y-%m-%d %H:%M} would be archived')
+            return
+        archived = archive(before, options['batch_size'])
+        self.stdout.write(f'Archived {archived} orders created before {before:%Y-%m-%d %H:%M}')
@@ -0,0 +1,115 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.models import User
+from cart.models import Cart, CartItem
+from cart.totals import recalculate
+from orders.checkout import CheckoutError, place_order
+from orders.models import OrderItem
+from products import inventory
+from products.models import Category, Product
+
+SHIPPING = {
+    'shipping_address': '-', 'shipping_city': '-', 'shipping_postal_code': '-', 'payment_method': 'benchmark',
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent checkout throughput on one hot product and check that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--checkouts', type=int, default=200, help='Number of customers checking out')
+        parser.add_argument('--lines', type=int, default=1, help='Cart lines per customer, the first is the hot product')
+        parser.add_argument('--stock', type=int, help='Stock of the hot product (default: one per checkout)')
+        parser.add_argument('--shards', type=int, default=0, help='Split the stock of the hot product over N counters')
+
+    def handle(self, *args, **options):
+        checkouts, lines = options['checkouts'], max(options['lines'], 1)
+        stock = checkouts if options['stock'] is None else options['stock']
+        # Writes from several connections cannot share a transaction, clean up by hand
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f'benchmark-{suffix}', slug=f'benchmark-{suffix}')
+        ok = False
+        try:
+            users = self.create_fixtures(category, suffix, checkouts, lines, stock)
+            hot_product = Product.objects.filter(category=category).order_by('pk').first()
+            if options['shards']:
+                inventory.reshard(hot_product, options['shards'])
+
+            chunks = [users[index::options['threads']] for index in range(options['threads'])]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as executor:
+                results = [result for chunk in executor.map(self.worker, chunks) for result in chunk]
+            elapsed = time.perf_counter() - started
+
+            placed = [duration for outcome, duration in results if outcome == 'placed']
+            rejected = sum(1 for outcome, duration in results if outcome == 'rejected')
+            failed = [outcome for outcome, duration in results if outcome not in ('placed', 'rejected')]
+            hot_product.refresh_from_db()
+            inventory.refresh_available([hot_product])
+            sold = sum(OrderItem.objects.filter(product=hot_product).values_list('quantity', flat=True))
+
+            self.stdout.write(
+                f'{checkouts} checkouts of {lines} lines on {options["threads"]} threads in {elapsed:.2f}s: '
+                f'{len(placed) / elapsed:.1f} orders/s, {len(placed)} placed, {rejected} out of stock, '
+                f'{len(failed)} failed' + (f', {options["shards"]} stock shards' if options['shards'] else '')
+            )
+            if placed:
+                placed.sort()
+                self.stdout.write(
+                    f'latency p50 {statistics.median(placed) * 1000:.1f}ms, '
+                    f'p95 {placed[int(len(placed) * 0.95) - 1] * 1000:.1f}ms'
+                )
+            for error in sorted(set(failed)):
+                self.stderr.write(error)
+            ok = sold == len(placed) == min(checkouts, stock) and hot_product.stock_quantity == stock - sold
+            self.stdout.write(f'stock {stock}, sold {sold}, left {hot_product.stock_quantity}: {"ok" if ok else "FAILED"}')
+        finally:
+            User.objects.filter(username__startswith=f'benchmark-{suffix}-').delete()
+            Product.objects.filter(category=category).delete()
+            category.delete()
+        if not ok:
+            raise CommandError('Stock and orders do not match')
+
+    def create_fixtures(self, category, suffix, checkouts, lines, stock):
+        products = Product.objects.bulk_create([
+            Product(
+                title=f'benchmark {suffix} {index}', description='-', price=Decimal('99.90'), category=category,
+                stock_quantity=stock if index == 0 else checkouts,
+            )
+            for index in range(lines)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'benchmark-{suffix}-{index}', email=f'benchmark-{suffix}-{index}@example.com')
+            for index in range(checkouts)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=1) for cart in carts for product in products
+        ])
+        recalculate(Cart.objects.filter(pk__in=[cart.pk for cart in carts]))
+        return users
+
+    def worker(self, users):
+        results = []
+        try:
+            for user in users:
+                started = time.perf_counter()
+                try:
+                    place_order(user, SHIPPING)
+                    outcome = 'placed'
+                except CheckoutError:
+                    outcome = 'rejected'
+                except Exception as e:
+                    outcome = f'{type(e).__name__}: {e}'
+                results.append((outcome, time.perf_counter() - started))
+        finally:
+            connection.close()
+        return results
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import clear_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records of the order endpoints'
+
+    def handle(self, *args, **options):
+        deleted = clear_expired()
+        if deleted or options['verbosity'] > 1:
+            self.stdout.write(f'Deleted {deleted} expired idempotency keys')
@@ -0,0 +1,16 @@
+from orders.exports import ArchivedOrderExporter, OrderExporter
+from store_backend.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Stream orders with their items as CSV or JSON Lines'
+    exporter_class = OrderExporter
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--archived', action='store_true', help='Export the archived orders instead')
+
+    def get_exporter(self, options):
+        if options['archived']:
+            self.exporter_class = ArchivedOrderExporter
+        return super().get_exporter(options)
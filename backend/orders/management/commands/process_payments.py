@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.payments import DEFAULT_BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = 'Charge queued payment attempts through the payment gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Outbox rows leased at a time')
+        parser.add_argument('--concurrency', type=int, default=8, help='Gateway calls made in parallel')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running and poll the outbox every INTERVAL seconds instead of draining it once',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--batch-size and --concurrency must be positive')
+
+        while True:
+            completed = retried = 0
+            while True:
+                batch_completed, batch_retried = drain(options['batch_size'], options['concurrency'])
+                completed += batch_completed
+                retried += batch_retried
+                if batch_completed + batch_retried < options['batch_size']:
+                    break
+            if completed or retried or options['verbosity'] > 1:
+                self.stdout.write(f'Completed {completed} payments, {retried} to retry')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_payment_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentattempt',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('refund_required', 'Refund required')], default='pending', max_length=20),
+        ),
+    ]
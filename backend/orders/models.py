@@ -46,6 +46,12 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order number lookups within a user's orders (orders.lookup)
+            models.Index(fields=['user', 'order_number'], name='order_user_number_idx'),
+            # Incremental exports (store_backend.exports)
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number}"
@@ -54,6 +60,8 @@ def save(self, *args, **kwargs):
         if not self.order_number:
             import uuid
             self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        # Lookups normalize search terms to upper case
+        self.order_number = self.order_number.upper()
         super().save(*args, **kwargs)
 
 
@@ -71,3 +79,148 @@ def __str__(self):
     @property
     def total_price(self):
         return self.price * self.quantity
+
+
+class OrderStatusEvent(models.Model):
+    """Append-only log of order status changes"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    note = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+    
+    def __str__(self):
+        return f"{self.order.order_number}: {self.from_status} -> {self.to_status}"
+
+
+class PaymentAttempt(models.Model):
+    """One charge of an order through the payment gateway (see ``orders.payments``)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        # Charged, but the order was cancelled meanwhile
+        ('refund_required', 'Refund required'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_attempts')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Gateway transaction id of a successful charge
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        constraints = [
+            # An order is charged by one attempt at a time
+            models.UniqueConstraint(
+                fields=['order'], condition=models.Q(status='pending'), name='payment_attempt_one_pending'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id}: {self.amount} ({self.status})"
+
+
+class PaymentOutbox(models.Model):
+    """Gateway call still to be made for a pending ``PaymentAttempt``, written in the same transaction"""
+    attempt = models.OneToOneField(PaymentAttempt, on_delete=models.CASCADE, related_name='outbox')
+    # Not picked up before this time (retries back off)
+    available_at = models.DateTimeField(db_index=True)
+    # A worker owns the row until its lease expires
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    tries = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Payment attempt {self.attempt_id}"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of an unsafe order request sent with an ``Idempotency-Key`` (see ``orders.idempotency``)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Empty while the first request is being processed
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    # The headers of ``REPLAYED_HEADERS`` the response had
+    response_headers = models.JSONField(default=dict, blank=True)
+    locked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+
+class ArchivedOrder(models.Model):
+    """Order moved out of the hot ``Order`` table by ``archive_orders`` (see ``orders.archive``)"""
+    # Ids, order numbers and timestamps are kept as they were
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    order_number = models.CharField(max_length=20, unique=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    payment_method = models.CharField(max_length=50, blank=True, null=True)
+    payment_id = models.CharField(max_length=100, blank=True, null=True)
+    
+    shipping_address = models.TextField()
+    shipping_city = models.CharField(max_length=100)
+    shipping_postal_code = models.CharField(max_length=20)
+    shipping_phone = models.CharField(max_length=15, blank=True, null=True)
+    
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    notes = models.TextField(blank=True, null=True)
+    # The order's OrderStatusEvent rows, oldest first
+    status_history = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'order_number'], name='archived_order_user_number_idx'),
+            models.Index(fields=['created_at'], name='archived_order_created_at_idx'),
+            models.Index(fields=['updated_at'], name='archived_order_updated_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Order {self.order_number} (archived)"
+
+
+class ArchivedOrderItem(models.Model):
+    """Item of an ``ArchivedOrder``"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.title}"
+    
+    @property
+    def total_price(self):
+        return self.price * self.quantity
@@ -0,0 +1,184 @@
+"""
+Asynchronous payments through a transactional outbox.
+
+``request_payment`` records a pending ``PaymentAttempt`` and its
+``PaymentOutbox`` row in one transaction, and the payment endpoint answers
+``202 Accepted`` without waiting for the gateway. Workers
+(``process_payments``) ``drain`` the outbox: they lease a batch of due rows
+with one ``UPDATE``, call the gateway for each of them from a thread pool,
+with no transaction open while waiting, and ``complete`` every attempt in
+its own transaction, which updates the order, logs its status change, sends
+``order_paid`` and ``payment_completed`` and deletes the outbox row. Orders
+with a payment still pending are not archived.
+
+Gateway errors are retried with exponential backoff, up to
+``PAYMENT_MAX_TRIES`` calls, after which the attempt fails. Rows of a worker
+that died are leased again once its lease expires; the gateway then sees the
+same attempt id and does not charge twice. A charge that succeeds for an
+order cancelled meanwhile leaves the order unpaid and its attempt
+``refund_required``. Clients poll
+``GET /api/orders/<id>/payment/status/`` (or subscribe to
+``payment_completed`` server side) to learn the outcome.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+
+from .gateways import ChargeResult, get_gateway
+from .models import Order, OrderItem, OrderStatusEvent, PaymentAttempt, PaymentOutbox
+from .signals import order_paid, payment_completed
+from .transitions import can_transition
+
+DEFAULT_BATCH_SIZE = 100
+
+
+class PaymentError(Exception):
+    pass
+
+
+def request_payment(order):
+    """
+    Record a pending payment attempt for ``order`` and queue it for the
+    workers. Returns ``(attempt, created)``; an attempt still pending is
+    returned as is instead of charging twice.
+    """
+    with transaction.atomic():
+        # Lock the order first (on SQLite this also makes the transaction a writer)
+        Order.objects.filter(pk=order.pk).update(payment_status=F('payment_status'))
+        order_status, payment_status = Order.objects.filter(pk=order.pk).values_list(
+            'status', 'payment_status'
+        ).get()
+        if payment_status == 'paid':
+            raise PaymentError('Order already paid')
+        if order_status == 'cancelled':
+            raise PaymentError('Order is cancelled')
+        pending = PaymentAttempt.objects.filter(order=order, status='pending').first()
+        if pending is not None:
+            return pending, False
+        attempt = PaymentAttempt.objects.create(
+            order=order, amount=order.total_amount, payment_method=order.payment_method
+        )
+        PaymentOutbox.objects.create(attempt=attempt, available_at=timezone.now())
+    return attempt, True
+
+
+def lease(batch_size):
+    """Lease up to ``batch_size`` due outbox rows to this worker and return them with their attempts and orders"""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    free = Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+    due = PaymentOutbox.objects.filter(free, available_at__lte=now).order_by('available_at', 'pk')
+    # The condition is checked again on update, so concurrent workers never lease the same row
+    leased = PaymentOutbox.objects.filter(free, pk__in=due.values('pk')[:batch_size]).update(
+        locked_by=token, locked_until=now + timedelta(seconds=settings.PAYMENT_LEASE_SECONDS)
+    )
+    if not leased:
+        return []
+    return list(PaymentOutbox.objects.filter(locked_by=token).select_related('attempt__order').order_by('pk'))
+
+
+def charge(entry):
+    """Call the gateway for an outbox row; returns a ``ChargeResult`` or the exception raised"""
+    try:
+        return get_gateway().charge(entry.attempt)
+    except Exception as e:
+        return e
+
+
+def charge_in_thread(entry):
+    """``charge`` from a pool thread, closing the thread's database connections (the pool is discarded)"""
+    try:
+        return charge(entry)
+    finally:
+        connections.close_all()
+
+
+def complete(entry, result):
+    """Record the outcome of a charge; returns ``False`` when the attempt was already completed"""
+    attempt = entry.attempt
+    with transaction.atomic():
+        # Lock the order first (on SQLite this also makes the transaction a writer),
+        # then read its status: it may have been cancelled while the gateway was called
+        Order.objects.filter(pk=attempt.order_id).update(payment_status=F('payment_status'))
+        order = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).filter(pk=attempt.order_id).first()
+        if order is None:
+            # Deleted meanwhile; its attempt usually went with it, then there is nothing to record
+            outcome = 'refund_required' if result.succeeded else 'failed'
+            error = 'Order no longer exists'
+        elif not result.succeeded:
+            outcome, error = 'failed', result.message
+        elif order.status == 'cancelled':
+            # Charged for an order that no longer exists: the money goes back
+            outcome, error = 'refund_required', 'Order was cancelled while the payment was being processed'
+        else:
+            outcome, error = 'succeeded', result.message
+        completed = PaymentAttempt.objects.filter(pk=attempt.pk, status='pending').update(
+            status=outcome, reference=result.reference, error=error, completed_at=timezone.now(),
+        )
+        PaymentOutbox.objects.filter(pk=entry.pk).delete()
+        if not completed:
+            return False
+        attempt.refresh_from_db()
+        if order is None:
+            return True
+
+        if outcome == 'succeeded':
+            order.payment_id = result.reference
+            order.payment_status = 'paid'
+            previous_status = order.status
+            if can_transition(previous_status, 'processing'):
+                order.status = 'processing'
+            order.save()
+            if order.status != previous_status:
+                OrderStatusEvent.objects.create(
+                    order=order, from_status=previous_status, to_status=order.status, actor_id=order.user_id,
+                    note='Payment received',
+                )
+            order_paid.send(sender=Order, order=order)
+        elif outcome == 'failed':
+            order.payment_status = 'failed'
+            order.save(update_fields=['payment_status', 'updated_at'])
+        payment_completed.send(sender=PaymentAttempt, attempt=attempt, order=order)
+    return True
+
+
+def retry(entry, error):
+    """Put an outbox row back with a backoff after a gateway error, or fail its attempt after the last try"""
+    tries = entry.tries + 1
+    if tries >= settings.PAYMENT_MAX_TRIES:
+        complete(entry, ChargeResult(False, message=f'Gateway unavailable: {error}'))
+        return
+    delay = settings.PAYMENT_RETRY_DELAY * 2 ** (tries - 1)
+    PaymentOutbox.objects.filter(pk=entry.pk, locked_by=entry.locked_by).update(
+        tries=tries, last_error=str(error), available_at=timezone.now() + timedelta(seconds=delay),
+        locked_by='', locked_until=None,
+    )
+
+
+def drain(batch_size=DEFAULT_BATCH_SIZE, concurrency=1):
+    """
+    Process one batch of due outbox rows, calling the gateway from up to
+    ``concurrency`` threads. Returns ``(completed, retried)``.
+    """
+    entries = lease(batch_size)
+    if concurrency > 1 and len(entries) > 1:
+        with ThreadPoolExecutor(min(concurrency, len(entries))) as pool:
+            results = list(pool.map(charge_in_thread, entries))
+    else:
+        results = [charge(entry) for entry in entries]
+
+    completed = retried = 0
+    for entry, result in zip(entries, results):
+        if isinstance(result, Exception):
+            retry(entry, result)
+            retried += 1
+        elif complete(entry, result):
+            completed += 1
+    return completed, retried
@@ -1,9 +1,14 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
-from products.serializers import ProductListSerializer
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, PaymentAttempt
+from products.serializers import ProductCardSerializer, ProductListSerializer, wants_card
+from store_backend.exports import ExportParamsSerializer
+from store_backend.fastpath import register_property
+from store_backend.serializers import SparseFieldsMixin
 
+register_property(OrderItem, 'total_price', ['price', 'quantity'])
 
-class OrderItemSerializer(serializers.ModelSerializer):
+
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
     total_price = serializers.ReadOnlyField()
     
@@ -11,8 +16,14 @@ class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price', 'total_price']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'product' in fields and wants_card(self.context):
+            fields['product'] = ProductCardSerializer(read_only=True)
+        return fields
+
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     
     class Meta:
@@ -26,6 +37,41 @@ class Meta:
         read_only_fields = ['id', 'order_number', 'created_at', 'updated_at']
 
 
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Same representation as ``OrderSerializer``, for orders read from the archive"""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
+class OrderSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Order list row; ``item_count`` and ``thumbnail`` come from ``summary_annotations()``"""
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail = serializers.CharField(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'status', 'payment_status',
+            'subtotal', 'shipping_cost', 'tax_amount', 'total_amount',
+            'item_count', 'thumbnail', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class PaymentAttemptSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentAttempt
+        fields = ['id', 'status', 'amount', 'payment_method', 'reference', 'error', 'created_at', 'completed_at']
+        read_only_fields = fields
+
+
 class CreateOrderSerializer(serializers.Serializer):
     shipping_address = serializers.CharField()
     shipping_city = serializers.CharField()
@@ -38,3 +84,15 @@ class CreateOrderSerializer(serializers.Serializer):
 class UpdateOrderStatusSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
     notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=5000
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    note = serializers.CharField(required=False, allow_blank=True)
+
+
+class OrderExportParamsSerializer(ExportParamsSerializer):
+    archived = serializers.BooleanField(required=False, default=False)
@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+# Sent with ``order`` and its ``items`` (with products) when an order is placed
+order_placed = Signal()
+
+# Sent with ``order`` (items prefetched) when an order is paid
+order_paid = Signal()
+
+# Sent with ``order_ids`` when orders are moved to ``cancelled``
+orders_cancelled = Signal()
+
+# Sent with ``attempt`` and its ``order`` when a payment attempt succeeds or fails
+payment_completed = Signal()
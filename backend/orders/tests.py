@@ -0,0 +1,428 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from cart import totals
+from cart.models import Cart, CartItem
+from products import inventory
+from store_backend.testing import (
+    QueryCountMixin, client_for, make_products, make_user, read_stream, run_concurrently, test_settings,
+)
+from . import archive, checkout, payments
+from .gateways import ChargeResult, get_gateway
+from .models import ArchivedOrder, IdempotencyKey, Order, OrderItem, OrderStatusEvent, PaymentAttempt, PaymentOutbox
+from .transitions import transition
+
+# Numbers of orders (for lists) or of lines (for single orders) every endpoint is measured at
+SIZES = (2, 25)
+
+SHIPPING = {
+    'shipping_address': 'Valiasr St.', 'shipping_city': 'Tehran', 'shipping_postal_code': '1234567890',
+    'payment_method': 'card',
+}
+
+
+def make_order(user, products, status='pending'):
+    """An order of one unit of each of ``products``"""
+    subtotal = sum((product.price for product in products), Decimal('0'))
+    order = Order.objects.create(
+        user=user, status=status, subtotal=subtotal, total_amount=subtotal, payment_method='card',
+        shipping_address='-', shipping_city='-', shipping_postal_code='-',
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, quantity=1, price=product.price) for product in products
+    )
+    return order
+
+
+@test_settings
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """A cart changed while it is checked out is either ordered as changed or keeps the change"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.product = make_products(1)[0]
+        client_for(self.user).post('/api/cart/add/', {'product_id': self.product.id, 'quantity': 1})
+        self.item = CartItem.objects.get(cart__user=self.user)
+
+    def test_cart_changed_during_checkout(self):
+        statuses = []
+
+        def update():
+            statuses.append(
+                client_for(self.user).put(f'/api/cart/items/{self.item.pk}/update/', {'quantity': 5}).status_code
+            )
+
+        updater = threading.Thread(target=update)
+        get_cart_lines = checkout.get_cart_lines
+
+        def read_then_update(*args, **kwargs):
+            # The update runs right after checkout read the cart; it has to wait for the order
+            lines = get_cart_lines(*args, **kwargs)
+            updater.start()
+            updater.join(0.5)
+            return lines
+
+        with mock.patch.object(checkout, 'get_cart_lines', read_then_update):
+            response = client_for(self.user).post('/api/orders/create/', SHIPPING)
+        updater.join()
+
+        self.assertEqual(response.status_code, 201, response.content)
+        ordered = OrderItem.objects.get().quantity
+        in_cart = CartItem.objects.filter(pk=self.item.pk).values_list('quantity', flat=True).first()
+        if statuses == [200]:
+            self.assertIn(5, (ordered, in_cart))
+        else:
+            self.assertEqual((statuses, ordered, in_cart), ([404], 1, None))
+
+    def test_concurrent_checkouts_place_one_order(self):
+        statuses = run_concurrently([
+            lambda: client_for(self.user).post('/api/orders/create/', SHIPPING).status_code for _ in range(4)
+        ])
+        self.assertEqual(sorted(statuses), [201, 400, 400, 400])
+        self.assertEqual(Order.objects.count(), 1)
+
+
+@test_settings
+class OrderLookupTests(TransactionTestCase):
+    """Order search by number, number prefix or id"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.products = make_products(1)
+        self.first = self.order('ORD-AB12CD34')
+        self.second = self.order('ORD-AB12CD35')
+
+    def order(self, number, user=None):
+        order = make_order(user or self.user, self.products)
+        Order.objects.filter(pk=order.pk).update(order_number=number)
+        return order
+
+    def search(self, term, user=None):
+        response = client_for(user or self.user).get('/api/orders/search/', {'order_number': term})
+        return response.json().get('id') if response.status_code == 200 else response.status_code
+
+    def test_exact_number_in_any_form(self):
+        for term in ('ORD-AB12CD34', 'AB12CD34', 'ord-ab12cd34', ' ord-ab12 cd34 '):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), self.first.pk)
+
+    def test_prefix_finds_the_newest_order(self):
+        self.assertEqual(self.search('AB12CD3'), self.second.pk)
+        self.assertEqual(self.search('ORD-AB'), self.second.pk)
+        self.assertEqual(self.search('AB13'), 404)
+
+    def test_id_beats_number_prefix(self):
+        numbered = self.order(f'ORD-{self.first.pk}FFF')
+        self.assertEqual(self.search(str(self.first.pk)), self.first.pk)
+        self.assertEqual(self.search(f'ORD-{self.first.pk}'), self.first.pk)
+        self.assertEqual(self.search(f'{self.first.pk}F'), numbered.pk)
+
+    def test_customers_only_find_their_orders(self):
+        other = make_user('other')
+        self.assertEqual(self.search('AB12CD34', other), 404)
+        self.assertEqual(self.search(str(self.first.pk), other), 404)
+        self.assertEqual(self.search('AB12CD34', make_user('support', is_staff=True)), self.first.pk)
+        self.assertEqual(self.search(''), 400)
+
+
+@test_settings
+class StatusTransitionTests(TransactionTestCase):
+    """Orders only move along the status state machine, and every move is logged"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.admin = client_for(make_user('admin', is_staff=True))
+        self.products = make_products(1)
+
+    def test_illegal_transition_is_rejected(self):
+        order = make_order(self.user, self.products, status='delivered')
+        response = self.admin.put(f'/api/orders/{order.pk}/status/', {'status': 'pending'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Cannot change status from delivered to pending')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+        self.assertFalse(OrderStatusEvent.objects.exists())
+
+    def test_skipping_a_status_is_rejected(self):
+        order = make_order(self.user, self.products)
+        self.assertEqual(self.admin.put(f'/api/orders/{order.pk}/status/', {'status': 'shipped'}).status_code, 400)
+        self.assertEqual(self.admin.put(f'/api/orders/{order.pk}/status/', {'status': 'processing'}).status_code, 200)
+        self.assertEqual(self.admin.put(f'/api/orders/{order.pk}/status/', {'status': 'shipped'}).status_code, 200)
+
+    def test_bulk_results_per_order(self):
+        pending = make_order(self.user, self.products)
+        cancelled = make_order(self.user, self.products, status='cancelled')
+        shipped = make_order(self.user, self.products, status='shipped')
+        response = self.admin.post('/api/orders/status/bulk/', {
+            'order_ids': [pending.pk, cancelled.pk, shipped.pk, 999999], 'status': 'cancelled', 'note': 'Out of stock',
+        }, format='json')
+        results = {result['id']: result['result'] for result in response.json()['results']}
+        self.assertEqual(results, {
+            pending.pk: 'updated', cancelled.pk: 'unchanged', shipped.pk: 'invalid', 999999: 'not_found',
+        })
+        self.assertEqual(response.json()['updated'], 1)
+        event = OrderStatusEvent.objects.get()
+        self.assertEqual(
+            (event.order_id, event.from_status, event.to_status, event.note),
+            (pending.pk, 'pending', 'cancelled', 'Out of stock'),
+        )
+        self.assertTrue(event.actor.is_staff)
+        self.assertEqual(Order.objects.get(pk=shipped.pk).status, 'shipped')
+
+    def test_customers_cannot_change_status(self):
+        order = make_order(self.user, self.products)
+        response = client_for(self.user).put(f'/api/orders/{order.pk}/status/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 403)
+
+
+@test_settings
+class OrderConditionalGetTests(TransactionTestCase):
+    """Order details answer 304 until the order changes"""
+
+    def test_etag_changes_with_the_order(self):
+        user = make_user()
+        order = make_order(user, make_products(1))
+        path = f'/api/orders/{order.pk}/'
+        etag = client_for(user).get(path)['ETag']
+        self.assertEqual(client_for(user).get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client_for(make_user('admin', is_staff=True)).put(f'{path}status/', {'status': 'processing'})
+        response = client_for(user).get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'processing'))
+
+
+@test_settings
+class IdempotencyTests(TransactionTestCase):
+    """Requests retried with an ``Idempotency-Key`` run once"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = client_for(self.user)
+        self.order = make_order(self.user, make_products(1))
+        self.path = f'/api/orders/{self.order.pk}/payment/'
+
+    def pay(self, key='key-1', **data):
+        return self.client.post(self.path, data, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_response_and_headers(self):
+        first = self.pay()
+        retry = self.pay()
+        self.assertEqual(first.status_code, 202)
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual((retry.status_code, retry.json()), (202, first.json()))
+        self.assertEqual((retry['Location'], retry['Retry-After']), (first['Location'], first['Retry-After']))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(PaymentAttempt.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_retry_while_first_request_runs_conflicts(self):
+        first = self.pay()
+        # As if the first request had not finished yet
+        IdempotencyKey.objects.update(response_status=None, response_body=None, locked_at=timezone.now())
+        self.assertEqual(self.pay().status_code, 409)
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(PaymentAttempt.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.assertEqual(self.pay().status_code, 202)
+        self.assertEqual(self.pay(note='other').status_code, 422)
+        self.assertEqual(self.pay(key='key-2').status_code, 202)
+
+
+@test_settings
+class PaymentCompletionTests(TransactionTestCase):
+    """A charge completing after its order was cancelled does not pay the order"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.order = make_order(self.user, make_products(2))
+        self.attempt, created = payments.request_payment(self.order)
+        self.entry = PaymentOutbox.objects.select_related('attempt__order').get(attempt=self.attempt)
+
+    def test_succeeded_charge_pays_order(self):
+        self.assertTrue(payments.complete(self.entry, ChargeResult(True, reference='charge-1')))
+        self.order.refresh_from_db()
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('processing', 'paid'))
+        self.assertEqual(self.attempt.status, 'succeeded')
+
+    def test_charge_of_cancelled_order_requires_refund(self):
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')
+        paid = []
+        payments.order_paid.connect(lambda order, **kwargs: paid.append(order), weak=False, dispatch_uid='test')
+        try:
+            self.assertTrue(payments.complete(self.entry, ChargeResult(True, reference='charge-1')))
+        finally:
+            payments.order_paid.disconnect(dispatch_uid='test')
+        self.order.refresh_from_db()
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('cancelled', 'pending'))
+        self.assertEqual((self.attempt.status, self.attempt.reference), ('refund_required', 'charge-1'))
+        self.assertEqual(paid, [])
+        self.assertFalse(PaymentOutbox.objects.exists())
+
+    @override_settings(PAYMENT_GATEWAY_OPTIONS={'latency': 0})
+    def test_drain_from_several_threads(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+        for _ in range(3):
+            payments.request_payment(make_order(self.user, make_products(1)))
+        self.assertEqual(payments.drain(concurrency=4), (4, 0))
+        self.assertEqual(Order.objects.filter(payment_status='paid').count(), 4)
+
+    def test_charge_of_deleted_order_is_dropped(self):
+        Order.objects.filter(pk=self.order.pk).delete()
+        self.assertFalse(payments.complete(self.entry, ChargeResult(True, reference='charge-1')))
+
+    def test_order_with_pending_payment_is_not_archived(self):
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')
+        self.assertFalse(archive.archivable(timezone.now()).exists())
+        payments.complete(self.entry, ChargeResult(False, message='Declined'))
+        self.assertTrue(archive.archivable(timezone.now()).exists())
+
+
+@test_settings
+class ArchiveTests(TransactionTestCase):
+    """Old finished orders move to the archive and are still served from there"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.client = client_for(self.user)
+        self.products = make_products(2)
+        self.old = make_order(self.user, self.products, status='shipped')
+        transition([self.old.pk], 'delivered', note='Handed over')
+        self.recent = make_order(self.user, self.products, status='delivered')
+        self.open = make_order(self.user, self.products, status='shipped')
+        Order.objects.filter(pk__in=[self.old.pk, self.open.pk]).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+
+    def test_archive_moves_only_old_finished_orders(self):
+        self.assertEqual(archive.archive(archive.retention_cutoff(days=365), batch_size=1), 1)
+        self.assertEqual(list(ArchivedOrder.objects.values_list('pk', flat=True)), [self.old.pk])
+        self.assertCountEqual(Order.objects.values_list('pk', flat=True), [self.recent.pk, self.open.pk])
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old.pk).exists())
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(archived.order_number, self.old.order_number)
+        self.assertEqual([event['to_status'] for event in archived.status_history], ['delivered'])
+
+    def test_detail_and_search_fall_back_to_archive(self):
+        archive.archive(archive.retention_cutoff(days=365))
+        response = self.client.get(f'/api/orders/{self.old.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['order_number'], self.old.order_number)
+        self.assertCountEqual(
+            [item['product']['id'] for item in response.json()['items']], [product.pk for product in self.products]
+        )
+
+        response = self.client.get('/api/orders/search/', {'order_number': self.old.order_number})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.old.pk)
+        self.assertEqual(len(response.json()['items']), 2)
+
+        # Archived orders of other users stay hidden
+        other = client_for(make_user('other'))
+        self.assertEqual(other.get(f'/api/orders/{self.old.pk}/').status_code, 404)
+
+
+@test_settings
+class OrderQueryBudgetTests(QueryCountMixin, TransactionTestCase):
+    """Order endpoints issue as many queries for many orders, or orders with many lines, as for few"""
+    sizes = SIZES
+
+    def setUp(self):
+        self.user = make_user()
+        self.admin = make_user('admin', is_staff=True)
+        self.client = client_for(self.user)
+        self.products = make_products(max(SIZES), stock=1000)
+
+    def orders_of(self, count, lines=2):
+        """Make the user have ``count`` orders of ``lines`` lines"""
+        for _ in range(count - Order.objects.filter(user=self.user).count()):
+            make_order(self.user, self.products[:lines])
+
+    def fill_cart(self, size):
+        cart, created = Cart.objects.get_or_create(user=self.user)
+        cart.items.all().delete()
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for product in self.products[:size])
+        totals.recalculate(Cart.objects.filter(pk=cart.pk))
+
+    def test_order_list(self):
+        def prepare(size):
+            self.orders_of(size)
+            return lambda: self.client.get('/api/orders/')
+        response = self.measure(2, prepare)
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_full_order_list(self):
+        def prepare(size):
+            self.orders_of(size)
+            return lambda: self.client.get('/api/orders/', {'view': 'full'})
+        response = self.measure(3, prepare)
+        self.assertEqual(len(response.json()['results'][0]['items']), 2)
+
+    def test_order_detail(self):
+        def prepare(size):
+            order = make_order(self.user, self.products[:size])
+            return lambda: self.client.get(f'/api/orders/{order.pk}/')
+        response = self.measure(4, prepare)
+        self.assertEqual(len(response.json()['items']), max(SIZES))
+
+    def test_search_order(self):
+        def prepare(size):
+            order = make_order(self.user, self.products[:size])
+            return lambda: self.client.get('/api/orders/search/', {'order_number': order.order_number})
+        self.measure(3, prepare)
+
+    def test_create_order(self):
+        def prepare(size):
+            self.fill_cart(size)
+            return lambda: self.client.post('/api/orders/create/', SHIPPING)
+        response = self.measure(19, prepare)
+        self.assertEqual(len(response.json()['order']['items']), max(SIZES))
+
+    def test_checkout(self):
+        def prepare(size):
+            # Start from no holds, like a first checkout
+            inventory.release_holds(self.user)
+            self.fill_cart(size)
+            return lambda: self.client.post('/api/orders/checkout/')
+        self.measure(9, prepare)
+
+    def test_process_payment(self):
+        def prepare(size):
+            order = make_order(self.user, self.products[:size])
+            return lambda: self.client.post(f'/api/orders/{order.pk}/payment/')
+        response = self.measure(10, prepare)
+        self.assertEqual(response.status_code, 202)
+
+    def test_payment_status(self):
+        def prepare(size):
+            order = make_order(self.user, self.products[:size])
+            return lambda: self.client.get(f'/api/orders/{order.pk}/payment/status/')
+        self.measure(3, prepare)
+
+    def test_update_order_status(self):
+        def prepare(size):
+            order = make_order(self.user, self.products[:size])
+            return lambda: client_for(self.admin).put(f'/api/orders/{order.pk}/status/', {'status': 'processing'})
+        self.measure(9, prepare)
+
+    def test_bulk_update_order_status(self):
+        def prepare(size):
+            order_ids = [make_order(self.user, self.products[:2]).pk for _ in range(size)]
+            return lambda: client_for(self.admin).post(
+                '/api/orders/status/bulk/', {'order_ids': order_ids, 'status': 'cancelled'}, format='json'
+            )
+        response = self.measure(13, prepare)
+        self.assertEqual(response.json()['updated'], max(SIZES))
+
+    def test_export(self):
+        def prepare(size):
+            self.orders_of(size)
+            return lambda: read_stream(client_for(self.admin).get('/api/orders/export/'))
+        self.measure(3, prepare, lambda response, size: self.assertEqual(len(response.lines), size * 2 + 1))
@@ -0,0 +1,90 @@
+"""
+Order status state machine.
+
+``TRANSITIONS`` lists the statuses an order may move to from each status.
+``transition`` moves any number of orders to one status: orders are
+processed in chunks, each in one transaction that locks the rows, reads
+their current status, applies a single guarded
+``UPDATE ... WHERE id IN (...) AND status IN (allowed sources)`` and writes
+one ``OrderStatusEvent`` per moved order with ``bulk_create``. Cancelled
+orders are announced with ``orders.signals.orders_cancelled``.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order, OrderStatusEvent
+from .signals import orders_cancelled
+
+TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+CHUNK_SIZE = 1000
+
+
+def allowed_sources(status):
+    """Statuses an order can be in to move to ``status``"""
+    return sorted(source for source, targets in TRANSITIONS.items() if status in targets)
+
+
+def can_transition(source, target):
+    return target in TRANSITIONS.get(source, ())
+
+
+def transition(order_ids, status, actor=None, note=''):
+    """
+    Move the orders in ``order_ids`` to ``status``.
+
+    Returns one result per distinct id, in input order: ``{'id', 'result',
+    'from', 'to'}`` where ``result`` is ``updated``, ``unchanged`` (already in
+    ``status``), ``invalid`` (transition not allowed, with an ``error``) or
+    ``not_found``.
+    """
+    if status not in TRANSITIONS:
+        raise ValueError(f'Unknown order status "{status}"')
+    order_ids = list(dict.fromkeys(order_ids))
+    current = {}
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        current.update(_transition_chunk(order_ids[start:start + CHUNK_SIZE], status, actor, note))
+
+    results = []
+    for order_id in order_ids:
+        source = current.get(order_id)
+        if source is None:
+            results.append({'id': order_id, 'result': 'not_found', 'from': None, 'to': status})
+        elif source == status:
+            results.append({'id': order_id, 'result': 'unchanged', 'from': source, 'to': status})
+        elif can_transition(source, status):
+            results.append({'id': order_id, 'result': 'updated', 'from': source, 'to': status})
+        else:
+            results.append({
+                'id': order_id, 'result': 'invalid', 'from': source, 'to': status,
+                'error': f'Cannot change status from {source} to {status}',
+            })
+    return results
+
+
+def _transition_chunk(order_ids, status, actor, note):
+    """Transition one chunk and return ``{order_id: status before}``"""
+    sources = allowed_sources(status)
+    with transaction.atomic():
+        orders = Order.objects.filter(pk__in=order_ids)
+        # Touch the rows first: locks them, and on SQLite makes this transaction a writer
+        orders.update(status=F('status'))
+        current = dict(orders.order_by().values_list('pk', 'status'))
+        movable = [order_id for order_id, source in current.items() if source in sources]
+        if movable:
+            Order.objects.filter(pk__in=movable, status__in=sources).update(status=status, updated_at=timezone.now())
+            OrderStatusEvent.objects.bulk_create([
+                OrderStatusEvent(order_id=order_id, from_status=current[order_id], to_status=status,
+                                 actor=actor, note=note)
+                for order_id in movable
+            ])
+            if status == 'cancelled':
+                orders_cancelled.send(sender=Order, order_ids=movable)
+    return current
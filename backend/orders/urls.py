@@ -4,8 +4,12 @@
 urlpatterns = [
     path('', views.OrderListView.as_view(), name='order-list'),
     path('create/', views.create_order, name='create-order'),
+    path('checkout/', views.checkout, name='checkout'),
     path('search/', views.search_order, name='search-order'),
+    path('export/', views.export_orders, name='export-orders'),
+    path('status/bulk/', views.bulk_update_order_status, name='bulk-update-order-status'),
     path('<int:order_id>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('<int:order_id>/payment/', views.process_payment, name='process-payment'),
+    path('<int:order_id>/payment/status/', views.payment_status, name='payment-status'),
     path('<int:order_id>/status/', views.update_order_status, name='update-order-status'),
 ]
@@ -1,81 +1,121 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from decimal import Decimal
-from .models import Order, OrderItem
-from .serializers import OrderSerializer, CreateOrderSerializer, UpdateOrderStatusSerializer
-from cart.models import Cart, CartItem
+from django.urls import reverse
+from django.db.models import OuterRef, Prefetch, Subquery, Sum, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from .archive import archived_items_prefetch, archived_orders
+from .checkout import CheckoutError, place_order, start_checkout
+from .exports import ArchivedOrderExporter, OrderExporter
+from .idempotency import idempotent
+from .lookup import find_order
+from .models import Order, OrderItem, PaymentAttempt
+from .payments import PaymentError, request_payment
+from .serializers import (
+    ArchivedOrderSerializer, OrderSerializer, OrderSummarySerializer, CreateOrderSerializer,
+    UpdateOrderStatusSerializer, OrderExportParamsSerializer, PaymentAttemptSerializer,
+    BulkOrderStatusSerializer,
+)
+from .transitions import transition
+from products import inventory
+from products.cache import CATALOG_VERSION_KEY, get_versions
+from store_backend.conditional import ConditionalGetMixin
+from store_backend.fastpath import FastListMixin
+from store_backend.pagination import KeysetPagination
+from store_backend.query_budget import query_budget
 
+# Seconds clients are told to wait before polling a pending payment again
+PAYMENT_POLL_INTERVAL = 1
 
-class OrderListView(generics.ListAPIView):
-    """List user's orders"""
-    serializer_class = OrderSerializer
+
+def order_items_prefetch():
+    """Load order items with their products and categories in one query"""
+    return Prefetch('items', queryset=OrderItem.objects.select_related('product__category'))
+
+
+def summary_annotations():
+    """Item count and first product image of each order, as correlated subqueries"""
+    items = OrderItem.objects.filter(order=OuterRef('pk'))
+    quantity = items.values('order').annotate(total=Sum('quantity')).values('total')
+    return {
+        'item_count': Coalesce(Subquery(quantity), 0),
+        'thumbnail': Subquery(items.order_by('pk').values('product__image')[:1]),
+    }
+
+
+class OrderListView(FastListMixin, generics.ListAPIView):
+    """List user's orders as summaries (``?view=full`` embeds the items)"""
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    query_budget = 4
+    
+    def wants_full(self):
+        return self.request.query_params.get('view') == 'full'
+    
+    def get_serializer_class(self):
+        return OrderSerializer if self.wants_full() else OrderSummarySerializer
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        orders = Order.objects.filter(user=self.request.user)
+        if self.wants_full():
+            return orders.prefetch_related(order_items_prefetch())
+        return orders.annotate(**summary_annotations())
 
 
-class OrderDetailView(generics.RetrieveAPIView):
-    """Retrieve a single order"""
+class OrderDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """Retrieve a single order, from the archive when it was moved there"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
     lookup_url_kwarg = 'order_id'
+    # Archived orders take two more queries
+    query_budget = 6
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).prefetch_related(order_items_prefetch())
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = get_object_or_404(
+                archived_orders(request.user).prefetch_related(archived_items_prefetch()), id=kwargs['order_id']
+            )
+            return Response(ArchivedOrderSerializer(order, context=self.get_serializer_context()).data)
+    
+    def get_etag_parts(self):
+        updated_at = None
+        # Archiving keeps updated_at, so the ETag survives it
+        for orders in (Order.objects.filter(user=self.request.user), archived_orders(self.request.user)):
+            updated_at = orders.filter(id=self.kwargs['order_id']).values_list('updated_at', flat=True).first()
+            if updated_at is not None:
+                break
+        if updated_at is None:
+            return None
+        # Items embed live product data, so catalog changes count as well
+        return [self.kwargs['order_id'], updated_at.isoformat(), *get_versions(CATALOG_VERSION_KEY)]
 
 
+# Constant for unsharded products; each sharded product adds one or two queries
+@query_budget(24)
 @api_view(['POST'])
+@idempotent
 def create_order(request):
     """Create a new order from cart"""
     serializer = CreateOrderSerializer(data=request.data)
     if serializer.is_valid():
         try:
-            cart = Cart.objects.get(user=request.user)
-        except Cart.DoesNotExist:
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not cart.items.exists():
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate totals
-        subtotal = sum(item.total_price for item in cart.items.all())
-        shipping_cost = Decimal('10.00')  # Fixed shipping cost
-        tax_amount = subtotal * Decimal('0.09')  # 9% tax
-        total_amount = subtotal + shipping_cost + tax_amount
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            shipping_address=serializer.validated_data['shipping_address'],
-            shipping_city=serializer.validated_data['shipping_city'],
-            shipping_postal_code=serializer.validated_data['shipping_postal_code'],
-            shipping_phone=serializer.validated_data.get('shipping_phone', ''),
-            payment_method=serializer.validated_data['payment_method'],
-            notes=serializer.validated_data.get('notes', ''),
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            tax_amount=tax_amount,
-            total_amount=total_amount
-        )
-        
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-        
-        # Clear cart
-        cart.items.all().delete()
+            order = place_order(request.user, serializer.validated_data)
+        except CheckoutError as e:
+            error = {'error': e.message}
+            if e.products:
+                error['products'] = e.products
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
         
+        prefetch_related_objects([order], order_items_prefetch())
         return Response({
             'message': 'Order created successfully',
             'order': OrderSerializer(order).data
@@ -84,47 +124,90 @@ def create_order(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(14)
+@api_view(['POST', 'DELETE'])
+def checkout(request):
+    """Hold the stock of the cart while the user checks out, or release the hold"""
+    if request.method == 'DELETE':
+        inventory.release_holds(request.user)
+        return Response({'message': 'Stock hold released'})
+    
+    try:
+        quantities, expires_at = start_checkout(request.user)
+    except CheckoutError as e:
+        error = {'error': e.message}
+        if e.products:
+            error['products'] = e.products
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'message': 'Stock held for checkout',
+        'expires_at': expires_at,
+        'items': [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()],
+    })
+
+
+@query_budget(16)
 @api_view(['POST'])
+@idempotent
 def process_payment(request, order_id):
-    """Process payment for an order (mock implementation)"""
+    """Queue the payment of an order; the gateway is called by the ``process_payments`` workers"""
     try:
-        order = Order.objects.get(id=order_id, user=request.user)
+        order = Order.objects.prefetch_related(order_items_prefetch()).get(id=order_id, user=request.user)
     except Order.DoesNotExist:
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    if order.payment_status == 'paid':
-        return Response({'error': 'Order already paid'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Mock payment processing
-    # In a real implementation, you would integrate with payment gateways like ZarinPal or Stripe
-    payment_id = f"PAY_{order.order_number}_{order.id}"
+    try:
+        attempt, created = request_payment(order)
+    except PaymentError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    order.payment_id = payment_id
-    order.payment_status = 'paid'
-    order.status = 'processing'
-    order.save()
+    response = Response({
+        'message': 'Payment is being processed' if created else 'Payment is already being processed',
+        'payment': PaymentAttemptSerializer(attempt).data,
+        'order': OrderSerializer(order).data,
+    }, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('payment-status', kwargs={'order_id': order.id})
+    response['Retry-After'] = PAYMENT_POLL_INTERVAL
+    return response
+
+
+@query_budget(3)
+@api_view(['GET'])
+def payment_status(request, order_id):
+    """Payment status of an order with its latest payment attempt, for clients polling after paying"""
+    order = Order.objects.filter(id=order_id, user=request.user).values('payment_status', 'payment_id').first()
+    if order is None:
+        return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    return Response({
-        'message': 'Payment processed successfully',
-        'payment_id': payment_id,
-        'order': OrderSerializer(order).data
+    attempt = PaymentAttempt.objects.filter(order_id=order_id).first()
+    response = Response({
+        **order,
+        'payment': PaymentAttemptSerializer(attempt).data if attempt is not None else None,
     })
+    if attempt is not None and attempt.status == 'pending':
+        response['Retry-After'] = PAYMENT_POLL_INTERVAL
+    return response
 
 
+@query_budget(14)
 @api_view(['PUT'])
+@permission_classes([IsAdminUser])
 def update_order_status(request, order_id):
     """Update order status (admin only)"""
     serializer = UpdateOrderStatusSerializer(data=request.data)
     if serializer.is_valid():
-        try:
-            order = Order.objects.get(id=order_id)
-        except Order.DoesNotExist:
+        notes = serializer.validated_data.get('notes')
+        result = transition([order_id], serializer.validated_data['status'], actor=request.user, note=notes or '')[0]
+        if result['result'] == 'not_found':
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+        if result['result'] == 'invalid':
+            return Response({'error': result['error']}, status=status.HTTP_400_BAD_REQUEST)
         
-        order.status = serializer.validated_data['status']
-        if 'notes' in serializer.validated_data:
-            order.notes = serializer.validated_data['notes']
-        order.save()
+        order = Order.objects.prefetch_related(order_items_prefetch()).get(id=order_id)
+        if notes is not None:
+            order.notes = notes
+            order.save(update_fields=['notes', 'updated_at'])
         
         return Response({
             'message': 'Order status updated successfully',
@@ -134,44 +217,59 @@ def update_order_status(request, order_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Four queries per 1000 orders, plus one event INSERT per ~160 orders on SQLite
+@query_budget(81)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_update_order_status(request):
+    """Move many orders to one status (admin only), with a result per order"""
+    serializer = BulkOrderStatusSerializer(data=request.data)
+    if serializer.is_valid():
+        results = transition(
+            serializer.validated_data['order_ids'], serializer.validated_data['status'],
+            actor=request.user, note=serializer.validated_data.get('note', ''),
+        )
+        return Response({
+            'updated': sum(1 for result in results if result['result'] == 'updated'),
+            'results': results,
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@query_budget(4)
 @api_view(['GET'])
 def search_order(request):
-    """Search for an order by order number"""
+    """Search for an order by order number, order number prefix or id, archived orders included"""
     order_number = request.GET.get('order_number', '').strip()
     
     if not order_number:
         return Response({'error': 'Order number is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        # Try to find order by order_number field first
-        order = Order.objects.get(order_number=order_number, user=request.user)
-    except Order.DoesNotExist:
-        try:
-            # Try to find by ID if order_number is numeric
-            if order_number.isdigit():
-                order = Order.objects.get(id=int(order_number), user=request.user)
-            else:
-                # Try to extract ID from ORD-XXXXX format
-                if order_number.upper().startswith('ORD-'):
-                    order_id = order_number.upper().replace('ORD-', '')
-                    if order_id.isdigit():
-                        order = Order.objects.get(id=int(order_id), user=request.user)
-                    else:
-                        # Try to find by partial match in order_number
-                        order = Order.objects.filter(
-                            Q(order_number__icontains=order_number) | 
-                            Q(order_number__icontains=order_id)
-                        ).filter(user=request.user).first()
-                else:
-                    # Try partial match
-                    order = Order.objects.filter(
-                        Q(order_number__icontains=order_number) |
-                        Q(id__icontains=order_number)
-                    ).filter(user=request.user).first()
-        except (Order.DoesNotExist, ValueError):
-            return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Staff (support) can look up any order, customers only their own
+    orders = Order.objects.all() if request.user.is_staff else Order.objects.filter(user=request.user)
+    order = find_order(order_number, orders)
+    if order is not None:
+        prefetch_related_objects([order], order_items_prefetch())
+        return Response(OrderSerializer(order).data)
     
-    if not order:
+    # Old orders are moved to the archive (orders.archive)
+    order = find_order(order_number, archived_orders(None if request.user.is_staff else request.user))
+    if order is None:
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    return Response(OrderSerializer(order).data)
+    prefetch_related_objects([order], archived_items_prefetch())
+    return Response(ArchivedOrderSerializer(order).data)
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_orders(request):
+    """Stream orders with their items as CSV or JSON Lines (``archived`` for archived orders, admin only)"""
+    params = OrderExportParamsSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    options = dict(params.validated_data)
+    exporter_class = ArchivedOrderExporter if options.pop('archived') else OrderExporter
+    return exporter_class(**options).response()
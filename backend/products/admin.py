@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Product, Category
+from . import inventory
+from .models import Product, Category, CatalogImport, StockHold
 
 
 @admin.register(Category)
@@ -16,3 +17,54 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description']
     list_editable = ['price', 'stock_quantity', 'is_active']
     ordering = ['-created_at']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Sharded stock lives in StockShard rows, stock_quantity only mirrors it
+        changed = set(form.changed_data)
+        if obj.stock_shards or 'stock_shards' in changed:
+            if changed & {'stock_quantity', 'stock_shards'}:
+                stock = obj.stock_quantity if 'stock_quantity' in changed else None
+                inventory.reshard(obj, obj.stock_shards, stock)
+
+
+@admin.register(StockHold)
+class StockHoldAdmin(admin.ModelAdmin):
+    """Stock held for checkouts; ``manage.py sweep_stock_holds`` returns expired holds"""
+    list_display = ['product', 'user', 'quantity', 'expires_at', 'created_at']
+    list_select_related = ['product', 'user']
+    search_fields = ['product__title', 'user__email']
+    readonly_fields = ['user', 'product', 'quantity', 'expires_at', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def delete_model(self, request, obj):
+        inventory.release(StockHold.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        inventory.release(queryset)
+
+
+@admin.register(CatalogImport)
+class CatalogImportAdmin(admin.ModelAdmin):
+    """Upload catalog files; ``manage.py import_catalog --queued`` processes them"""
+    list_display = ['file', 'status', 'rows', 'created', 'updated', 'unchanged', 'rows_per_second', 'created_at']
+    list_filter = ['status']
+    readonly_fields = [
+        'status', 'offset', 'rows', 'created', 'updated', 'unchanged', 'rows_per_second', 'error',
+        'attempts', 'created_at', 'updated_at',
+    ]
+    actions = ['queue_imports', 'restart_imports']
+    
+    @admin.action(description='Queue selected imports (resume from checkpoint)')
+    def queue_imports(self, request, queryset):
+        count = queryset.exclude(status='completed').update(status='pending', attempts=0)
+        self.message_user(request, f'{count} imports queued')
+    
+    @admin.action(description='Restart selected imports from the beginning')
+    def restart_imports(self, request, queryset):
+        count = queryset.update(
+            status='pending', offset=0, rows=0, created=0, updated=0, unchanged=0, error='', attempts=0
+        )
+        self.message_user(request, f'{count} imports queued')
@@ -0,0 +1,143 @@
+"""
+Versioned response cache for the product catalog.
+
+Cache entries are never deleted directly. Every key embeds one or more
+version counters (catalog, category, product); invalidation bumps the
+counters so stale entries simply stop being addressed and expire on their
+own. This keeps eviction targeted without touching the rest of the cache
+database (sessions, throttles, ...).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+KEY_PREFIX = 'catalog'
+
+CATALOG_VERSION_KEY = f'{KEY_PREFIX}:v:catalog'
+CATEGORIES_VERSION_KEY = f'{KEY_PREFIX}:v:categories'
+
+
+def category_version_key(category_id):
+    return f'{KEY_PREFIX}:v:category:{category_id}'
+
+
+def product_version_key(product_id):
+    return f'{KEY_PREFIX}:v:product:{product_id}'
+
+
+def _new_version():
+    # Millisecond timestamps keep versions monotonic even if a counter is
+    # evicted and has to be recreated.
+    return int(time.time() * 1000)
+
+
+def get_versions(*keys):
+    """Fetch version counters in one round trip, initializing missing ones"""
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys):
+    """Invalidate every entry tagged with any of the given version keys"""
+    # Deferred until commit so readers cannot re-cache pre-commit data
+    transaction.on_commit(lambda: _bump_versions(set(keys)))
+
+
+def _bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def invalidate_product(product_id, category_ids=()):
+    keys = [product_version_key(product_id), CATALOG_VERSION_KEY]
+    keys += [category_version_key(category_id) for category_id in category_ids if category_id]
+    bump_versions(*keys)
+
+
+def invalidate_category(category_id):
+    bump_versions(category_version_key(category_id), CATEGORIES_VERSION_KEY, CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    bump_versions(CATALOG_VERSION_KEY, CATEGORIES_VERSION_KEY)
+
+
+def normalize_params(query_params, ignore=()):
+    """Return a canonical, order-independent representation of query params"""
+    items = []
+    for name in sorted(query_params.keys()):
+        if name in ignore:
+            continue
+        values = sorted(value.strip() for value in query_params.getlist(name) if value.strip())
+        for value in values:
+            items.append(f'{name}={value}')
+    return '&'.join(items)
+
+
+def build_key(kind, versions, request, extra='', ignore=()):
+    params = normalize_params(request.query_params, ignore)
+    digest = hashlib.md5(f'{request.get_host()}|{params}|{extra}'.encode()).hexdigest()
+    version_part = '.'.join(str(version) for version in versions)
+    return f'{KEY_PREFIX}:{kind}:{version_part}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Cache the serialized body of ``list``/``retrieve`` for a catalog view.
+
+    Views describe which version counters their responses depend on via
+    ``get_cache_version_keys``; any bump of those counters makes the cached
+    entry unreachable.
+    """
+    cache_kind = None
+    # Query params that do not affect the response body
+    cache_ignored_params = ()
+
+    def get_cache_timeout(self):
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    def get_cache_version_keys(self):
+        return [CATALOG_VERSION_KEY]
+
+    def get_cache_extra(self):
+        return ''
+
+    def get_cache_key(self):
+        # Memoized per request: conditional GET and the cache share the key
+        if getattr(self, '_cache_key', None) is None:
+            versions = get_versions(*self.get_cache_version_keys())
+            self._cache_key = build_key(
+                self.cache_kind, versions, self.request, self.get_cache_extra(), self.cache_ignored_params
+            )
+        return self._cache_key
+
+    def get_etag_parts(self):
+        # The key already embeds every version the response depends on
+        return [self.get_cache_key()]
+
+    def cached_response(self, render, request, *args, **kwargs):
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = render(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,35 @@
+"""
+Catalog feed: one row per product, with the columns ``import_catalog``
+reads plus ``id`` and ``updated_at``, so a feed can be imported back.
+One query per chunk. Stock is the ``stock_quantity`` column (the mirror
+refreshed by the sweep for sharded products); stock changes from orders do
+not touch ``updated_at`` and are not picked up by incremental exports.
+"""
+from store_backend.exports import Exporter
+from .models import Product
+
+COLUMNS = [
+    'id', 'title', 'description', 'price', 'category', 'category_slug',
+    'image', 'rating', 'rating_count', 'stock_quantity', 'is_active', 'updated_at',
+]
+# Export column to ``.values()`` field
+SOURCES = {'category': 'category__name', 'category_slug': 'category__slug'}
+
+
+class ProductExporter(Exporter):
+    columns = COLUMNS
+    filename = 'products'
+
+    def __init__(self, *args, include_inactive=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.include_inactive = include_inactive
+
+    def get_queryset(self):
+        queryset = Product.objects.values_list(*[SOURCES.get(column, column) for column in COLUMNS])
+        return queryset if self.include_inactive else queryset.filter(is_active=True)
+
+    def csv_rows(self, product):
+        yield product
+
+    def document(self, product):
+        return dict(zip(COLUMNS, product))
@@ -0,0 +1,85 @@
+"""
+Facet aggregates for product search results.
+
+All facets are computed over the already filtered queryset with a fixed
+number of queries regardless of catalog size: one grouped query for the
+category counts, one for the price range and one conditional aggregate for
+the price histogram, rating buckets and stock counts. Prices are returned
+as strings with two decimals, like ``DecimalField`` serializes them.
+"""
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import Product
+
+DEFAULT_PRICE_BUCKETS = 10
+MAX_PRICE_BUCKETS = 50
+
+RATING_BUCKETS = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+
+PRICE_QUANTUM = Decimal(1).scaleb(-Product._meta.get_field('price').decimal_places)
+
+
+def format_price(value):
+    """Serialize a price like the product serializers do (``"1800000.00"``)"""
+    return None if value is None else str(value.quantize(PRICE_QUANTUM))
+
+
+def price_edges(low, high, buckets):
+    """Split ``[low, high]`` into ``buckets`` equal, whole-number ranges"""
+    low = low.to_integral_value(rounding=ROUND_FLOOR)
+    high = high.to_integral_value(rounding=ROUND_CEILING)
+    width = max((high - low) / buckets, Decimal(1)).to_integral_value(rounding=ROUND_CEILING)
+    edges = [low + width * step for step in range(buckets + 1)]
+    # Drop trailing buckets that start above the highest price
+    while len(edges) > 2 and edges[-2] > high:
+        edges.pop()
+    return edges
+
+
+def compute_facets(queryset, price_buckets=DEFAULT_PRICE_BUCKETS):
+    queryset = queryset.order_by()
+
+    categories = [
+        {'id': row['category_id'], 'name': row['category__name'], 'slug': row['category__slug'],
+         'count': row['count']}
+        for row in queryset.values('category_id', 'category__name', 'category__slug')
+        .annotate(count=Count('id')).order_by('-count', 'category__name')
+    ]
+
+    price_range = queryset.aggregate(min=Min('price'), max=Max('price'))
+
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=Q(stock_quantity__gt=0)),
+    }
+    for low, high in RATING_BUCKETS:
+        upper = Q(rating__lte=high) if high == RATING_BUCKETS[-1][1] else Q(rating__lt=high)
+        aggregates[f'rating_{low}'] = Count('id', filter=Q(rating__gte=low) & upper)
+
+    edges = []
+    if price_range['min'] is not None:
+        edges = price_edges(price_range['min'], price_range['max'], price_buckets)
+        for index, (low, high) in enumerate(zip(edges, edges[1:])):
+            upper = Q(price__lte=high) if index == len(edges) - 2 else Q(price__lt=high)
+            aggregates[f'price_{index}'] = Count('id', filter=Q(price__gte=low) & upper)
+    counts = queryset.aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'in_stock': counts['in_stock'],
+        'out_of_stock': counts['total'] - counts['in_stock'],
+        'categories': categories,
+        'price': {
+            'min': format_price(price_range['min']),
+            'max': format_price(price_range['max']),
+            'histogram': [
+                {'min': format_price(low), 'max': format_price(high), 'count': counts[f'price_{index}']}
+                for index, (low, high) in enumerate(zip(edges, edges[1:]))
+            ],
+        },
+        'rating': [
+            {'min': low, 'max': high, 'count': counts[f'rating_{low}']} for low, high in RATING_BUCKETS
+        ],
+    }
@@ -0,0 +1,176 @@
+"""
+Streaming catalog import from CSV or JSON Lines files.
+
+Files are read incrementally from a byte offset, so memory stays constant
+regardless of file size and an interrupted import can resume from the last
+committed batch. Each batch is written by ``upsert_products`` in its own
+transaction; the checkpoint (byte offset plus running counts) is reported
+after every commit.
+"""
+import codecs
+import csv
+import json
+import time
+
+from .cache import invalidate_catalog
+from .models import Category
+from .upsert import DEFAULT_BATCH_SIZE, category_slug, upsert_products
+
+FORMATS = ('csv', 'jsonl')
+
+COLUMNS = [
+    'title', 'description', 'price', 'category', 'image', 'rating', 'rating_count', 'stock_quantity', 'is_active',
+]
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def detect_format(name):
+    lowered = name.lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if lowered.endswith('.json'):
+        # A JSON document (usually one top-level array) cannot be streamed line by line
+        raise CatalogImportError(f'"{name}" is a JSON document, only JSON Lines (one product per line) is supported')
+    raise CatalogImportError(f'Cannot detect the format of "{name}", pass it explicitly')
+
+
+def _lines(stream, offset, position):
+    """Yield decoded lines from ``offset``, recording the end of each in ``position``"""
+    stream.seek(offset)
+    position[0] = offset
+    decoder = codecs.getincrementaldecoder('utf-8-sig' if offset == 0 else 'utf-8')()
+    for raw in iter(stream.readline, b''):
+        position[0] += len(raw)
+        yield decoder.decode(raw)
+
+
+def iter_records(stream, file_format, offset=0):
+    """
+    Yield ``(row, next_offset)`` pairs from a binary stream.
+
+    ``next_offset`` is the byte offset right after the row, i.e. where a
+    resumed import has to start to skip it.
+    """
+    position = [offset]
+    if file_format == 'csv':
+        stream.seek(0)
+        header_line = stream.readline()
+        fieldnames = next(csv.reader([header_line.decode('utf-8-sig')]))
+        start = max(offset, len(header_line))
+        reader = csv.reader(_lines(stream, start, position))
+        for values in reader:
+            if not any(values):
+                continue
+            yield dict(zip(fieldnames, values)), position[0]
+    elif file_format == 'jsonl':
+        for line in _lines(stream, offset, position):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), position[0]
+            except ValueError as e:
+                raise CatalogImportError(f'Invalid JSON before byte {position[0]}: {e}')
+    else:
+        raise CatalogImportError(f'Unsupported format "{file_format}"')
+
+
+def clean_row(row):
+    """Coerce a raw CSV/JSON record into an ``upsert_products`` row"""
+    title = (row.get('title') or '').strip()
+    if not title:
+        raise CatalogImportError(f'Row without a title: {row!r}')
+    cleaned = {column: row.get(column) for column in COLUMNS if row.get(column) not in (None, '')}
+    cleaned['title'] = title
+    category = row.get('category_slug') or row.get('category') or 'uncategorized'
+    cleaned['category_name'] = row.get('category') or category
+    cleaned['category'] = category_slug(category)
+    is_active = row.get('is_active', True)
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() in TRUE_VALUES
+    cleaned['is_active'] = bool(is_active)
+    return cleaned
+
+
+class SlugMap(dict):
+    """In-memory ``{slug: category_id}`` map, creating unknown categories in bulk"""
+
+    def __init__(self):
+        super().__init__(Category.objects.values_list('slug', 'id'))
+
+    def resolve(self, rows):
+        missing = {}
+        for row in rows:
+            if row['category'] not in self:
+                missing.setdefault(row['category'], row['category_name'])
+        if not missing:
+            return
+        Category.objects.bulk_create(
+            [Category(name=name, slug=slug) for slug, name in missing.items()],
+            ignore_conflicts=True,
+        )
+        # bulk_create() sends no signals, the category list is cached too
+        invalidate_catalog()
+        self.update(Category.objects.filter(slug__in=list(missing)).values_list('slug', 'id'))
+        # A category with the same name may already exist under another slug
+        by_name = {name: slug for slug, name in missing.items() if slug not in self}
+        for name, category_id in Category.objects.filter(name__in=list(by_name)).values_list('name', 'id'):
+            self[by_name[name]] = category_id
+        unresolved = set(missing) - set(self)
+        if unresolved:
+            raise CatalogImportError(f'Could not create categories: {", ".join(sorted(unresolved))}')
+
+
+class CatalogImporter:
+    """
+    Import a catalog file in batches.
+
+    ``on_checkpoint(offset, counts)`` is called after every committed batch;
+    persisting it and passing ``offset``/``counts`` back in resumes the run.
+    """
+
+    def __init__(self, stream, file_format, batch_size=DEFAULT_BATCH_SIZE, offset=0, counts=None,
+                 on_checkpoint=None):
+        self.stream = stream
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.offset = offset
+        self.counts = dict({'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0}, **(counts or {}))
+        self.on_checkpoint = on_checkpoint
+        self.rows_per_second = 0.0
+
+    def run(self):
+        slug_map = SlugMap()
+        self.started = time.monotonic()
+        self.imported = 0
+        batch = []
+        for record, next_offset in iter_records(self.stream, self.file_format, self.offset):
+            batch.append(clean_row(record))
+            if len(batch) >= self.batch_size:
+                self._commit(batch, next_offset, slug_map)
+                batch = []
+        if batch:
+            self._commit(batch, self.stream.tell(), slug_map)
+        return self.counts
+
+    def _commit(self, batch, next_offset, slug_map):
+        slug_map.resolve(batch)
+        result = upsert_products(batch, batch_size=self.batch_size, category_map=slug_map)
+        for key, value in result.items():
+            self.counts[key] += value
+        self.counts['rows'] += len(batch)
+        self.offset = next_offset
+
+        self.imported += len(batch)
+        elapsed = time.monotonic() - self.started
+        self.rows_per_second = self.imported / elapsed if elapsed else 0.0
+
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(self.offset, dict(self.counts))
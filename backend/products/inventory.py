@@ -0,0 +1,269 @@
+"""
+Inventory: available-to-sell stock, checkout holds and sharded counters.
+
+The sellable stock of a product lives in ``Product.stock_quantity``, or, for
+hot products with ``stock_shards > 0``, in that many ``StockShard`` rows.
+Concurrent decrements of a sharded product pick a random shard and only
+lock that row, instead of all queueing on the product row. For sharded
+products ``stock_quantity`` is a mirror of the shard total, refreshed by
+``sweep`` and by ``refresh_available`` wherever an exact value is needed.
+
+A ``StockHold`` moves stock out of the sellable counters into a row owned by
+a user for ``STOCK_HOLD_TTL`` seconds. Checkout consumes the holds of the
+ordered products; expired holds are returned to stock by ``sweep`` (run by
+the ``sweep_stock_holds`` command).
+
+Transactions here start with a write: on SQLite a transaction that reads
+first cannot upgrade its lock while another writer is active. Rows are
+always locked holds first, then unsharded products in id order, so
+checkouts and sweeps cannot deadlock on backends with row locks.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import CATALOG_VERSION_KEY, bump_versions, category_version_key, product_version_key
+from .models import Product, StockHold, StockShard
+
+# Random shards tried for a decrement before draining several under lock
+SHARD_PROBES = 2
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def _counter_update(quantities, sign):
+    """``stock_quantity`` update applying ``sign * quantity`` per product"""
+    return Case(
+        *[When(pk=product_id, then=F('stock_quantity') + sign * quantity) for product_id, quantity in quantities.items()],
+        default=F('stock_quantity'),
+        output_field=IntegerField(),
+    )
+
+
+def lock_products(product_ids):
+    """Lock the unsharded product rows in id order (SQLite has no row locks, writers are serialized)"""
+    if connection.features.has_select_for_update:
+        list(
+            Product.objects.select_for_update().filter(pk__in=list(product_ids), stock_shards=0)
+            .order_by('pk').values_list('pk')
+        )
+
+
+def take(quantities):
+    """
+    Take ``{product_id: quantity}`` out of the sellable stock; raises
+    ``OutOfStock`` if any line does not fit. Must run inside a transaction,
+    which the caller rolls back on ``OutOfStock``.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    lock_products(quantities)
+    in_stock = Q()
+    for product_id, quantity in quantities.items():
+        in_stock |= Q(pk=product_id, stock_quantity__gte=quantity)
+    updated = Product.objects.filter(in_stock, is_active=True, stock_shards=0).update(
+        stock_quantity=_counter_update(quantities, -1)
+    )
+    if updated == len(quantities):
+        return
+    # The rest is either sharded or unavailable
+    sharded = Product.objects.filter(
+        pk__in=list(quantities), is_active=True, stock_shards__gt=0
+    ).order_by().values_list('pk', 'stock_shards')
+    sharded = dict(sharded)
+    if updated + len(sharded) != len(quantities):
+        raise OutOfStock
+    for product_id, shards in sharded.items():
+        if not _take_sharded(product_id, shards, quantities[product_id]):
+            raise OutOfStock
+
+
+def _take_sharded(product_id, shards, quantity):
+    start = random.randrange(shards)
+    for offset in range(min(shards, SHARD_PROBES)):
+        taken = StockShard.objects.filter(
+            product_id=product_id, index=(start + offset) % shards, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity)
+        if taken:
+            return True
+    # No single shard is big enough, drain several under lock
+    rows = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('index'))
+    if sum(row.quantity for row in rows) < quantity:
+        return False
+    remaining = quantity
+    for row in rows:
+        part = min(row.quantity, remaining)
+        row.quantity -= part
+        remaining -= part
+    StockShard.objects.bulk_update(rows, ['quantity'])
+    return True
+
+
+def give_back(quantities):
+    """Return ``{product_id: quantity}`` to the sellable stock"""
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    lock_products(quantities)
+    updated = Product.objects.filter(pk__in=list(quantities), stock_shards=0).update(
+        stock_quantity=_counter_update(quantities, 1)
+    )
+    if updated == len(quantities):
+        return
+    sharded = Product.objects.filter(pk__in=list(quantities), stock_shards__gt=0).order_by().values_list('pk', 'stock_shards')
+    for product_id, shards in sharded:
+        StockShard.objects.filter(product_id=product_id, index=random.randrange(shards)).update(
+            quantity=F('quantity') + quantities[product_id]
+        )
+
+
+def stock_changed(product_ids):
+    """Invalidate cached responses showing the stock of ``product_ids``"""
+    category_ids = Product.objects.filter(pk__in=list(product_ids)).values_list('category_id', flat=True).order_by().distinct()
+    bump_versions(
+        CATALOG_VERSION_KEY,
+        *[product_version_key(product_id) for product_id in product_ids],
+        *[category_version_key(category_id) for category_id in category_ids],
+    )
+
+
+def refresh_available(products):
+    """
+    Set ``stock_quantity`` of the sharded ones among ``products`` to their
+    exact shard total (one query, none if no product is sharded).
+    """
+    sharded = {product.pk: product for product in products if product.stock_shards}
+    if not sharded:
+        return
+    totals = dict(
+        StockShard.objects.filter(product_id__in=list(sharded))
+        .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    for product_id, product in sharded.items():
+        product.stock_quantity = totals.get(product_id, 0)
+
+
+def claim_holds(user, product_ids):
+    """
+    Delete the holds of ``user`` on ``product_ids`` (expired or not, as long
+    as they were not swept) and return the held ``{product_id: quantity}``.
+    """
+    holds = StockHold.objects.filter(user=user, product_id__in=list(product_ids))
+    # Touch the rows first: locks them, and on SQLite makes this transaction a writer
+    holds.update(expires_at=F('expires_at'))
+    held = dict(holds.values_list('product_id', 'quantity'))
+    if held:
+        holds.delete()
+    return held
+
+
+def settle(user, quantities):
+    """
+    Take ``{product_id: quantity}`` out of stock for ``user``, counting their
+    holds first and returning held stock that is no longer needed.
+    """
+    held = claim_holds(user, quantities)
+    take({product_id: quantity - held.get(product_id, 0) for product_id, quantity in quantities.items()})
+    give_back({product_id: quantity - quantities.get(product_id, 0) for product_id, quantity in held.items()})
+
+
+def hold(user, quantities, ttl=None):
+    """
+    Hold ``{product_id: quantity}`` for ``user`` for ``ttl`` seconds
+    (``STOCK_HOLD_TTL`` by default), replacing their holds on those products.
+    Returns the expiry time; raises ``OutOfStock`` without holding anything.
+    """
+    ttl = settings.STOCK_HOLD_TTL if ttl is None else ttl
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    with transaction.atomic():
+        settle(user, quantities)
+        StockHold.objects.bulk_create([
+            StockHold(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    return expires_at
+
+
+def release(holds):
+    """Return the ``holds`` queryset to stock"""
+    with transaction.atomic():
+        holds.update(expires_at=F('expires_at'))
+        released = _release(holds)
+    if released:
+        stock_changed(released)
+    return released
+
+
+def release_holds(user):
+    """Return all holds of ``user`` to stock"""
+    return release(StockHold.objects.filter(user=user))
+
+
+def _release(holds):
+    released = {}
+    for product_id, quantity in holds.values_list('product_id', 'quantity'):
+        released[product_id] = released.get(product_id, 0) + quantity
+    if released:
+        holds.delete()
+        give_back(released)
+    return released
+
+
+def sweep():
+    """
+    Return expired holds to stock and refresh the ``stock_quantity`` mirror
+    of sharded products. Returns ``(released holds quantity, products)``.
+    """
+    with transaction.atomic():
+        expired = StockHold.objects.filter(expires_at__lte=timezone.now())
+        expired.update(expires_at=F('expires_at'))
+        released = _release(expired)
+        changed = set(released) | set(sync_mirrors())
+    if changed:
+        stock_changed(changed)
+    return sum(released.values()), len(released)
+
+
+def sync_mirrors():
+    """Copy the shard totals into stale ``stock_quantity`` mirrors and return their product ids"""
+    total = StockShard.objects.filter(product=OuterRef('pk')).values('product').annotate(total=Sum('quantity'))
+    shard_total = Coalesce(Subquery(total.values('total')), 0)
+    stale = list(
+        Product.objects.filter(stock_shards__gt=0).annotate(shard_total=shard_total)
+        .exclude(stock_quantity=F('shard_total')).values_list('pk', flat=True)
+    )
+    if stale:
+        Product.objects.filter(pk__in=stale).update(stock_quantity=shard_total)
+    return stale
+
+
+def reshard(product, shards, stock=None):
+    """
+    Spread the sellable stock of ``product`` (or ``stock`` when given) over
+    ``shards`` counters; ``0`` moves it back into ``stock_quantity``.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product.pk)
+        if stock is None:
+            stock = StockShard.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+            if stock is None:
+                stock = product.stock_quantity
+        StockShard.objects.filter(product=product).delete()
+        if shards:
+            base, extra = divmod(stock, shards)
+            StockShard.objects.bulk_create([
+                StockShard(product=product, index=index, quantity=base + (1 if index < extra else 0))
+                for index in range(shards)
+            ])
+        Product.objects.filter(pk=product.pk).update(stock_quantity=stock, stock_shards=shards)
+    stock_changed([product.pk])
+    product.stock_quantity, product.stock_shards = stock, shards
+    return product
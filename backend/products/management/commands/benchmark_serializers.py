@@ -0,0 +1,99 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from cart.models import Cart, CartItem
+from cart.serializers import CartItemSerializer
+from orders.models import Order, OrderItem
+from orders.serializers import OrderSerializer
+from products.models import Category, Product
+from products.serializers import ProductCardSerializer, ProductListSerializer
+from store_backend.fastpath import FastSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF and fast-path serialization throughput on list pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 1000])
+        parser.add_argument('--seconds', type=float, default=1.0, help='Time spent per measurement')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        # Everything runs on throwaway rows inside a rolled back transaction
+        with transaction.atomic():
+            cases = self.create_fixtures(max(sizes))
+            self.stdout.write(f'{"case":<16}{"rows":>6}{"drf/s":>12}{"fast/s":>12}{"speedup":>10}  identical')
+            for name, serializer_class, queryset in cases:
+                for size in sizes:
+                    self.run_case(name, serializer_class, queryset, size, options['seconds'])
+            transaction.set_rollback(True)
+
+    def create_fixtures(self, count):
+        category = Category.objects.create(name='benchmark', slug='benchmark')
+        products = Product.objects.bulk_create([
+            Product(
+                title=f'محصول {i}', description='توضیحات محصول ' * 20, price=Decimal('129900.50') + i,
+                category=category, rating=Decimal('4.25'), rating_count=i, stock_quantity=i % 7,
+            )
+            for i in range(count)
+        ])
+        user = User.objects.create(username='benchmark', email='benchmark@example.com')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products])
+        orders = Order.objects.bulk_create([
+            Order(
+                user=user, order_number=f'BENCH-{i}', shipping_address='-', shipping_city='-',
+                shipping_postal_code='-', subtotal=Decimal('10.00'), total_amount=Decimal('20.90'),
+            )
+            for i in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders for product in products[:2]
+        ])
+
+        items = OrderItem.objects.select_related('product__category')
+        return [
+            ('product-list', ProductListSerializer,
+             Product.objects.filter(category=category).select_related('category')),
+            ('product-card', ProductCardSerializer, Product.objects.filter(category=category)),
+            ('cart-item', CartItemSerializer,
+             CartItem.objects.filter(cart=cart).select_related('product__category').order_by('id')),
+            ('order', OrderSerializer,
+             Order.objects.filter(user=user).prefetch_related(Prefetch('items', queryset=items))),
+        ]
+
+    def measure(self, func, seconds):
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            func()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                return runs / elapsed
+
+    def run_case(self, name, serializer_class, queryset, size, seconds):
+        page = queryset[:size]
+        fast_serializer = FastSerializer(serializer_class(many=True))
+
+        def drf():
+            return serializer_class(list(page.all()), many=True).data
+
+        def fast():
+            return fast_serializer.serialize(fast_serializer.values(page))
+
+        renderer = JSONRenderer()
+        identical = renderer.render(drf()) == renderer.render(fast())
+        drf_rate = self.measure(drf, seconds)
+        fast_rate = self.measure(fast, seconds)
+        self.stdout.write(
+            f'{name:<16}{size:>6}{drf_rate:>12.1f}{fast_rate:>12.1f}{fast_rate / drf_rate:>9.1f}x  '
+            f'{"yes" if identical else "NO"}'
+        )
@@ -0,0 +1,16 @@
+from products.exports import ProductExporter
+from store_backend.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Stream the active catalog as CSV or JSON Lines (a feed import_catalog can read back)'
+    exporter_class = ProductExporter
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--include-inactive', action='store_true', help='Export inactive products too')
+
+    def get_exporter(self, options):
+        exporter = super().get_exporter(options)
+        exporter.include_inactive = options['include_inactive']
+        return exporter
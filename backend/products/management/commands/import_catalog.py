@@ -0,0 +1,124 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from products.importer import CatalogImporter, CatalogImportError, FORMATS, detect_format
+from products.models import CatalogImport
+from products.upsert import DEFAULT_BATCH_SIZE
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSON Lines catalog file into the products table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV or JSON Lines file to import')
+        parser.add_argument('--format', choices=FORMATS, help='File format (detected from the extension by default)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint file')
+        parser.add_argument(
+            '--queued', action='store_true',
+            help='Process imports queued from the admin (pending ones, and failed ones with attempts left, are resumed)',
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+            help='With --queued, stop retrying an import that failed this many times',
+        )
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            self.run_queued(options['batch_size'], options['max_attempts'])
+        elif options['path']:
+            self.run_file(options)
+        else:
+            raise CommandError('Pass a file path or --queued')
+
+    def report(self, importer, counts):
+        self.stdout.write(
+            f"{counts['rows']} rows: {counts['created']} created, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged ({importer.rows_per_second:.0f} rows/s)"
+        )
+
+    def run_file(self, options):
+        path = options['path']
+        file_format = options['format'] or self.detect(path)
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+
+        offset, counts = 0, None
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            offset, counts = checkpoint['offset'], checkpoint['counts']
+            self.stdout.write(f'Resuming at byte {offset} after {counts["rows"]} rows')
+
+        def save_checkpoint(offset, counts):
+            with open(checkpoint_path, 'w') as checkpoint_file:
+                json.dump({'offset': offset, 'counts': counts}, checkpoint_file)
+            if options['verbosity'] > 1:
+                self.report(importer, counts)
+
+        with open(path, 'rb') as stream:
+            importer = CatalogImporter(
+                stream, file_format, batch_size=options['batch_size'], offset=offset, counts=counts,
+                on_checkpoint=save_checkpoint,
+            )
+            try:
+                counts = importer.run()
+            except CatalogImportError as e:
+                raise CommandError(f'{e} (rerun with --resume to continue from byte {importer.offset})')
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.report(importer, counts)
+
+    def run_queued(self, batch_size, max_attempts):
+        queued = CatalogImport.objects.filter(
+            Q(status='pending') | Q(status='failed', attempts__lt=max_attempts)
+        ).order_by('created_at')
+        for catalog_import in queued:
+            self.run_import(catalog_import, batch_size, max_attempts)
+
+    def run_import(self, catalog_import, batch_size, max_attempts):
+        # Claim the import so concurrent workers skip it
+        claimed = CatalogImport.objects.filter(
+            pk=catalog_import.pk, status=catalog_import.status, attempts=catalog_import.attempts
+        ).update(status='running', error='', attempts=F('attempts') + 1)
+        if not claimed:
+            return
+
+        def save_checkpoint(offset, counts):
+            CatalogImport.objects.filter(pk=catalog_import.pk).update(
+                offset=offset, rows_per_second=importer.rows_per_second, **counts
+            )
+
+        counts = {key: getattr(catalog_import, key) for key in ('rows', 'created', 'updated', 'unchanged')}
+        try:
+            file_format = catalog_import.file_format or detect_format(catalog_import.file.name)
+            with catalog_import.file.open('rb') as stream:
+                importer = CatalogImporter(
+                    stream, file_format, batch_size=batch_size, offset=catalog_import.offset, counts=counts,
+                    on_checkpoint=save_checkpoint,
+                )
+                counts = importer.run()
+        except Exception as e:
+            CatalogImport.objects.filter(pk=catalog_import.pk).update(status='failed', error=str(e))
+            self.stderr.write(f'{catalog_import}: {e}')
+            if catalog_import.attempts + 1 >= max_attempts:
+                self.stderr.write(f'{catalog_import}: giving up after {max_attempts} attempts')
+            return
+
+        CatalogImport.objects.filter(pk=catalog_import.pk).update(
+            status='completed', rows_per_second=importer.rows_per_second, **counts
+        )
+        self.stdout.write(f'{catalog_import.file.name}:')
+        self.report(importer, counts)
+
+    def detect(self, name):
+        try:
+            return detect_format(name)
+        except CatalogImportError as e:
+            raise CommandError(str(e))
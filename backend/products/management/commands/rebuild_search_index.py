@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from products.models import Product
+from products.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            self.stderr.write(f'No search backend for database vendor "{connection.vendor}"')
+            return
+
+        batch_size = options['batch_size']
+        total = 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                backend.drop_index(cursor)
+                backend.create_index(cursor)
+            batch = []
+            for product in Product.objects.only('id', 'title', 'description').iterator(chunk_size=batch_size):
+                batch.append(product)
+                if len(batch) == batch_size:
+                    backend.index_products(batch)
+                    total += len(batch)
+                    batch = []
+            backend.index_products(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} products'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import inventory
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Split the stock of hot products across several counters (0 shards merges them back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', type=int)
+        parser.add_argument('--shards', type=int, required=True)
+        parser.add_argument('--stock', type=int, help='Set the stock instead of keeping the current one')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 1000:
+            raise CommandError('--shards must be between 0 and 1000')
+        if options['stock'] is not None and options['stock'] < 0:
+            raise CommandError('--stock cannot be negative')
+        products = Product.objects.in_bulk(options['product_ids'])
+        missing = set(options['product_ids']) - set(products)
+        if missing:
+            raise CommandError(f'Unknown products: {", ".join(map(str, sorted(missing)))}')
+        for product in products.values():
+            product = inventory.reshard(product, options['shards'], options['stock'])
+            self.stdout.write(f'{product.title}: {product.stock_quantity} in {product.stock_shards} shards')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import inventory
+
+
+class Command(BaseCommand):
+    help = 'Return expired stock holds to stock and refresh the stock of sharded products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running and sweep every INTERVAL seconds instead of sweeping once',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            quantity, products = inventory.sweep()
+            if quantity or options['verbosity'] > 1:
+                self.stdout.write(f'Released {quantity} held items of {products} products')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
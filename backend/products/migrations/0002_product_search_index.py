@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from products.search import get_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.create_index(cursor)
+    Product = apps.get_model('products', 'Product')
+    products = Product.objects.only('id', 'title', 'description').iterator(chunk_size=1000)
+    batch = []
+    for product in products:
+        batch.append(product)
+        if len(batch) == 1000:
+            backend.index_products(batch)
+            batch = []
+    backend.index_products(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogimport',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
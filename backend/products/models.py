@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from accounts.models import User
 
 
 class Category(models.Model):
@@ -20,7 +21,7 @@ def __str__(self):
 
 class Product(models.Model):
     """Product model"""
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
@@ -33,16 +34,91 @@ class Product(models.Model):
     )
     rating_count = models.PositiveIntegerField(default=0)
     stock_quantity = models.PositiveIntegerField(default=0)
+    # Hot products keep their sellable stock in this many StockShard rows,
+    # stock_quantity then mirrors their sum (see products.inventory)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental exports (store_backend.exports)
+            models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
     @property
     def is_in_stock(self):
+        """Available to sell: held stock is already taken out, sharded stock is mirrored"""
         return self.stock_quantity > 0
+
+
+class StockShard(models.Model):
+    """One of the counters holding the sellable stock of a sharded product"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['product', 'index']
+    
+    def __str__(self):
+        return f"{self.product.title} #{self.index}: {self.quantity}"
+
+
+class StockHold(models.Model):
+    """Stock set aside for a user's checkout until ``expires_at``"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user', 'product']
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.title} for {self.user.email}"
+
+
+class CatalogImport(models.Model):
+    """Catalog file queued for import by the ``import_catalog`` command"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    file = models.FileField(upload_to='catalog_imports/')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Checkpoint: byte offset of the first row not yet committed
+    offset = models.PositiveBigIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Runs started by ``import_catalog --queued``, which stops retrying a failed import after a few
+    attempts = models.PositiveSmallIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Import {self.file.name} ({self.status})"
@@ -0,0 +1,227 @@
+"""
+Full-text product search.
+
+Products are indexed into a side table (an FTS5 virtual table on SQLite, a
+``tsvector`` column with a GIN index on PostgreSQL) holding Persian
+normalized text. Queries are normalized the same way, matched through the
+index and ranked, so lookups stay flat as the catalog grows instead of
+running ``icontains`` scans over ``title`` and ``description``.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter, OrderingFilter
+
+SEARCH_TABLE = 'products_product_search'
+
+# Title matches weigh more than description matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_CHARACTER_MAP = str.maketrans({
+    'ي': 'ی',  # Arabic yeh
+    'ى': 'ی',  # Alef maksura
+    'ك': 'ک',  # Arabic kaf
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ؤ': 'و',
+    '\u200c': ' ',  # ZWNJ separates the parts of a word, like a space ("لپ‌تاپ" is "لپ تاپ")
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # Persian digits
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic digits
+})
+
+# Tatweel, Arabic diacritics and the other zero-width characters (ZWJ, BOM...)
+_STRIPPED = re.compile('[\u0640\u064b-\u065f\u0670\u200b\u200d-\u200f\ufeff]')
+
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Normalize Persian/Arabic text for indexing and querying"""
+    if not text:
+        return ''
+    text = _STRIPPED.sub('', text.translate(_CHARACTER_MAP))
+    return ' '.join(_TOKEN.findall(text.lower()))
+
+
+def tokenize(text):
+    return normalize_text(text).split()
+
+
+class BaseSearchBackend:
+    """Keeps the product search index in sync and builds match/rank SQL"""
+    vendor = None
+
+    def create_index(self, cursor):
+        raise NotImplementedError
+
+    def drop_index(self, cursor):
+        raise NotImplementedError
+
+    def index_products(self, products):
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE {self.id_column} IN ({placeholders})',
+                list(product_ids),
+            )
+
+    def match_sql(self, tokens):
+        """SQL selecting matching product ids, as ``(sql, params)``"""
+        raise NotImplementedError
+
+    def rank_sql(self, tokens, id_column):
+        """Correlated SQL computing a relevance score (higher is better)"""
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    vendor = 'sqlite'
+    id_column = 'rowid'
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5(title, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index_products(self, products):
+        rows = [(p.pk, normalize_text(p.title), normalize_text(p.description)) for p in products]
+        if not rows:
+            return
+        self.remove_products([row[0] for row in rows])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+                rows,
+            )
+
+    def _query(self, tokens):
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def match_sql(self, tokens):
+        return f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [self._query(tokens)]
+
+    def rank_sql(self, tokens, id_column):
+        # bm25() is lower-is-better, negate it so callers can sort descending
+        return (
+            f'SELECT -bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {id_column}',
+            [self._query(tokens)],
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    vendor = 'postgresql'
+    id_column = 'product_id'
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            f'product_id bigint PRIMARY KEY REFERENCES products_product (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin '
+            f'ON {SEARCH_TABLE} USING gin (document)'
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index_products(self, products):
+        rows = [(p.pk, normalize_text(p.title), normalize_text(p.description)) for p in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+    def _query(self, tokens):
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def match_sql(self, tokens):
+        return (
+            f"SELECT product_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+            [self._query(tokens)],
+        )
+
+    def rank_sql(self, tokens, id_column):
+        weights = f"'{{0.1, 0.2, {DESCRIPTION_WEIGHT / TITLE_WEIGHT}, 1.0}}'"
+        return (
+            f"SELECT ts_rank({weights}, document, to_tsquery('simple', %s)) FROM {SEARCH_TABLE} "
+            f"WHERE product_id = {id_column}",
+            [self._query(tokens)],
+        )
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteSearchBackend(), PostgresSearchBackend())}
+
+
+def get_backend(using_connection=None):
+    """Return the search backend for the connection's vendor, or ``None``"""
+    return BACKENDS.get((using_connection or connection).vendor)
+
+
+def index_products(products):
+    backend = get_backend()
+    if backend is not None:
+        backend.index_products(products)
+
+
+def remove_products(product_ids):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove_products(product_ids)
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to indexed matches for ``query``, annotated with ``search_rank``"""
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    backend = get_backend()
+    table = queryset.model._meta.db_table
+    match_sql, match_params = backend.match_sql(tokens)
+    rank_sql, rank_params = backend.rank_sql(tokens, f'"{table}"."id"')
+    return queryset.filter(pk__in=RawSQL(match_sql, match_params)).annotate(
+        search_rank=RawSQL(rank_sql, rank_params)
+    )
+
+
+class ProductSearchFilter(SearchFilter):
+    """``?search=`` backed by the product search index"""
+
+    def filter_queryset(self, request, queryset, view):
+        if get_backend() is None:
+            return super().filter_queryset(request, queryset, view)
+        query = request.query_params.get(self.search_param, '')
+        return search_products(queryset, query)
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """Orders search results by relevance unless an explicit ordering is given"""
+
+    def get_default_ordering(self, view):
+        ordering = super().get_default_ordering(view)
+        query = view.request.query_params.get(SearchFilter.search_param, '')
+        if get_backend() is not None and tokenize(query):
+            return ['-search_rank'] + list(ordering or [])
+        return ordering
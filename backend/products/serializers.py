@@ -1,14 +1,41 @@
 from rest_framework import serializers
+from store_backend.exports import ExportParamsSerializer
+from store_backend.fastpath import register_property
+from store_backend.serializers import SparseFieldsMixin
 from .models import Product, Category
 
+CARD_VIEW = 'card'
 
-class CategorySerializer(serializers.ModelSerializer):
+# Columns needed to render a product card (plus the default ordering column)
+CARD_LOAD_FIELDS = ['id', 'title', 'price', 'image', 'rating', 'stock_quantity', 'category_id', 'created_at']
+
+
+def wants_card(context):
+    """Whether the request asked for the compact ``?view=card`` representation"""
+    request = context.get('request')
+    return request is not None and request.query_params.get('view') == CARD_VIEW
+
+
+register_property(Product, 'is_in_stock', ['stock_quantity'])
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'description']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductCardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Compact product representation for lists, carts and orders"""
+    is_in_stock = serializers.ReadOnlyField()
+    category_id = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'price', 'image', 'rating', 'is_in_stock', 'category_id']
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     is_in_stock = serializers.ReadOnlyField()
     
@@ -21,7 +48,7 @@ class Meta:
         ]
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     is_in_stock = serializers.ReadOnlyField()
     
@@ -32,3 +59,7 @@ class Meta:
             'image', 'rating', 'rating_count', 'stock_quantity',
             'is_in_stock', 'is_active', 'created_at', 'updated_at'
         ]
+
+
+class ProductExportParamsSerializer(ExportParamsSerializer):
+    include_inactive = serializers.BooleanField(required=False, default=False)
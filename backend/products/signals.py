@@ -0,0 +1,50 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from .cache import invalidate_product, invalidate_category
+from .models import Product, Category
+from .search import index_products, remove_products
+
+# Sent with ``product_ids`` after the price of existing products changed,
+# including bulk updates that bypass ``post_save``
+prices_changed = Signal()
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_values(sender, instance, **kwargs):
+    """Keep the old category and price so dependent data can be refreshed"""
+    instance._previous_category_id = instance._previous_price = None
+    if instance.pk:
+        previous = Product.objects.filter(pk=instance.pk).values_list('category_id', 'price').first()
+        if previous is not None:
+            instance._previous_category_id, instance._previous_price = previous
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    invalidate_product(instance.pk, {instance.category_id, previous_category_id})
+
+
+@receiver(post_save, sender=Product)
+def announce_price_change(sender, instance, created, **kwargs):
+    previous_price = getattr(instance, '_previous_price', None)
+    if not created and previous_price is not None and previous_price != instance.price:
+        prices_changed.send(sender=Product, product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate_category(instance.pk)
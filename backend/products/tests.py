@@ -0,0 +1,332 @@
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from store_backend.testing import QueryCountMixin, client_for, make_products, make_user, read_stream, test_settings
+from . import inventory
+from .importer import CatalogImporter, CatalogImportError, detect_format
+from .inventory import OutOfStock
+from .models import CatalogImport, Category, Product, StockHold, StockShard
+from .search import normalize_text
+from .upsert import upsert_products
+
+# Catalog sizes every endpoint is measured at; the larger one fills a page
+SIZES = (3, 25)
+
+
+@test_settings
+class ProductQueryBudgetTests(QueryCountMixin, TestCase):
+    """Catalog endpoints issue as many queries for a full page as for a short one"""
+    sizes = SIZES
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Phones', slug='phones')
+
+    def grow_catalog(self, size):
+        make_products(size - Product.objects.count(), category=self.category)
+
+    def measure_get(self, queries, path, params=None, paginated=False):
+        """``measure`` an anonymous ``GET`` of ``path`` at every catalog size"""
+        def prepare(size):
+            self.grow_catalog(size)
+            return lambda: client_for().get(path, params)
+
+        def check(response, size):
+            self.assertEqual(len(response.json()['results']), min(size, 20))
+        return self.measure(queries, prepare, check if paginated else None)
+
+    def test_product_list(self):
+        self.measure_get(1, '/api/products/', paginated=True)
+
+    def test_product_cards(self):
+        self.measure_get(1, '/api/products/', {'view': 'card'}, paginated=True)
+
+    def test_product_list_of_category(self):
+        self.measure_get(2, '/api/products/', {'category': self.category.pk}, paginated=True)
+
+    def test_product_search(self):
+        self.measure_get(1, '/api/products/', {'search': 'product'}, paginated=True)
+
+    def test_product_facets(self):
+        response = self.measure_get(3, '/api/products/facets/')
+        self.assertEqual(response.json()['total'], max(SIZES))
+
+    def test_facet_prices_are_decimal_strings(self):
+        make_products(2, category=self.category, price='1800000')
+        price = client_for().get('/api/products/facets/').json()['price']
+        self.assertEqual((price['min'], price['max']), ('1800000.00', '1800000.00'))
+        self.assertEqual(price['histogram'][0]['min'], '1800000.00')
+
+    def test_product_detail(self):
+        def prepare(size):
+            self.grow_catalog(size)
+            product = Product.objects.latest('pk')
+            return lambda: client_for().get(f'/api/products/{product.pk}/')
+        response = self.measure(1, prepare)
+        self.assertEqual(response.json()['category']['id'], self.category.pk)
+
+    def test_category_list(self):
+        def prepare(size):
+            Category.objects.bulk_create(
+                Category(name=f'Category {i}', slug=f'category-{i}')
+                for i in range(Category.objects.count(), size)
+            )
+            return lambda: client_for().get('/api/products/categories/')
+        self.measure(2, prepare)
+
+    def test_export(self):
+        admin = make_user('admin', is_staff=True)
+
+        def prepare(size):
+            self.grow_catalog(size)
+            return lambda: read_stream(client_for(admin).get('/api/products/export/'))
+        self.measure(2, prepare, lambda response, size: self.assertEqual(len(response.lines), size + 1))
+
+
+class CatalogImportTests(TestCase):
+    def test_json_documents_are_rejected(self):
+        self.assertEqual(detect_format('catalog.jsonl'), 'jsonl')
+        with self.assertRaises(CatalogImportError):
+            detect_format('catalog.json')
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_failed_import_is_retried_a_limited_number_of_times(self):
+        catalog_import = CatalogImport(file_format='jsonl')
+        catalog_import.file.save('broken.jsonl', ContentFile(b'{not json}\n'))
+        for _ in range(3):
+            call_command('import_catalog', queued=True, max_attempts=2, stdout=StringIO(), stderr=StringIO())
+        catalog_import.refresh_from_db()
+        self.assertEqual((catalog_import.status, catalog_import.attempts), ('failed', 2))
+
+
+@test_settings
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Laptops', slug='laptops')
+        self.laptop = Product.objects.create(
+            title='لپ\u200cتاپ ایسوس', description='-', price='1800000.00', category=category, stock_quantity=5
+        )
+        make_products(2, category=category)
+
+    def search(self, query):
+        return [product['id'] for product in client_for().get('/api/products/', {'search': query}).json()['results']]
+
+    def test_zwnj_and_space_forms_match(self):
+        self.assertEqual(normalize_text('لپ\u200cتاپ'), 'لپ تاپ')
+        self.assertEqual(self.search('لپ\u200cتاپ'), [self.laptop.pk])
+        self.assertEqual(self.search('لپ تاپ'), [self.laptop.pk])
+
+
+@test_settings
+class CategoryInvalidationTests(TestCase):
+    """Categories created in bulk by upserts and imports show up in the cached category list"""
+
+    def assertListedAfter(self, create, name):
+        response = client_for().get('/api/products/categories/')
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create()
+        response = client_for().get('/api/products/categories/')
+        self.assertIn(name, [category['name'] for category in response.json()['results']])
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(client_for().get('/api/products/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_upsert_creating_a_category(self):
+        self.assertListedAfter(
+            lambda: upsert_products([{'title': 'Phone', 'price': '10', 'category': 'Phones'}]), 'Phones'
+        )
+
+    def test_import_creating_a_category(self):
+        stream = BytesIO(b'{"title": "Phone", "price": "10", "category": "Phones"}\n')
+        self.assertListedAfter(lambda: CatalogImporter(stream, 'jsonl').run(), 'Phones')
+
+
+@test_settings
+class CatalogCacheTests(TestCase):
+    """Catalog responses are served from the cache until something they show changes"""
+
+    def setUp(self):
+        self.phones = Category.objects.create(name='Phones', slug='phones')
+        self.laptops = Category.objects.create(name='Laptops', slug='laptops')
+        self.phone = make_products(1, category=self.phones, prefix='phone')[0]
+        self.laptop = make_products(1, category=self.laptops, prefix='laptop')[0]
+
+    def get(self, path, params=None, queries=None):
+        if queries is None:
+            return client_for().get(path, params).json()
+        with self.assertNumQueries(queries):
+            return client_for().get(path, params).json()
+
+    def save(self, instance, **values):
+        for field, value in values.items():
+            setattr(instance, field, value)
+        # Versions are bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def test_product_detail_is_cached_until_the_product_changes(self):
+        path = f'/api/products/{self.phone.pk}/'
+        first = self.get(path)
+        self.assertEqual(self.get(path, queries=0), first)
+        self.save(self.phone, price='12.50')
+        self.assertEqual(self.get(path, queries=1)['price'], '12.50')
+
+    def test_other_product_change_refreshes_lists_only(self):
+        detail = f'/api/products/{self.phone.pk}/'
+        self.get(detail)
+        self.get('/api/products/')
+        self.get('/api/products/', {'category': self.phones.pk})
+        self.save(self.laptop, price='99.00')
+        self.get(detail, queries=0)
+        self.get('/api/products/', {'category': self.phones.pk}, queries=0)
+        prices = {row['id']: row['price'] for row in self.get('/api/products/', queries=1)['results']}
+        self.assertEqual(prices[self.laptop.pk], '99.00')
+
+    def test_category_rename_refreshes_products_showing_it(self):
+        path = f'/api/products/{self.phone.pk}/'
+        self.get(path)
+        self.save(self.phones, name='Smartphones')
+        self.assertEqual(self.get(path)['category']['name'], 'Smartphones')
+        names = [category['name'] for category in self.get('/api/products/categories/')['results']]
+        self.assertIn('Smartphones', names)
+
+
+@test_settings
+class ConditionalGetTests(TestCase):
+    """Catalog reads answer 304 while the client's ETag is current"""
+
+    def setUp(self):
+        self.product = make_products(1)[0]
+        self.path = f'/api/products/{self.product.pk}/'
+
+    def test_fresh_etag_gets_304(self):
+        etag = client_for().get(self.path)['ETag']
+        for tag in (etag, f'W/{etag}', f'"other", {etag}'):
+            with self.subTest(tag=tag):
+                response = client_for().get(self.path, HTTP_IF_NONE_MATCH=tag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual((response['ETag'], response.content), (etag, b''))
+
+    def test_change_makes_etag_stale(self):
+        etag = client_for().get(self.path)['ETag']
+        self.product.price = '11.00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = client_for().get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query(self):
+        first = client_for().get('/api/products/', {'ordering': 'price'})['ETag']
+        second = client_for().get('/api/products/', {'ordering': '-price'})['ETag']
+        self.assertNotEqual(first, second)
+        response = client_for().get('/api/products/', {'ordering': '-price'}, HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+
+
+class UpsertTests(TestCase):
+    ROWS = [
+        {'title': 'Phone', 'price': '10', 'category': 'Phones', 'stock_quantity': 5},
+        {'title': 'Laptop', 'price': '20', 'category': 'Laptops', 'stock_quantity': 3},
+    ]
+
+    def test_counts(self):
+        self.assertEqual(upsert_products(self.ROWS), {'created': 2, 'updated': 0, 'unchanged': 0})
+        updated_at = Product.objects.get(title='Laptop').updated_at
+        rows = [dict(self.ROWS[0], price='12.50'), self.ROWS[1], {'title': 'Tablet', 'category': 'Phones'}]
+        self.assertEqual(upsert_products(rows, batch_size=2), {'created': 1, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(str(Product.objects.get(title='Phone').price), '12.50')
+        # Unchanged rows are not written
+        self.assertEqual(Product.objects.get(title='Laptop').updated_at, updated_at)
+        self.assertEqual(Product.objects.filter(category__name='Phones').count(), 2)
+
+    def test_repeated_title_in_a_batch(self):
+        rows = [self.ROWS[0], dict(self.ROWS[0], price='11')]
+        self.assertEqual(upsert_products(rows), {'created': 1, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(str(Product.objects.get(title='Phone').price), '11.00')
+
+
+class ImportResumeTests(TestCase):
+    CSV = b'title,price,category\n' + b''.join(f'Product {i},{i}.00,Things\n'.encode() for i in range(5))
+
+    def test_resume_from_checkpoint(self):
+        checkpoints = []
+
+        def interrupt(offset, counts):
+            checkpoints.append((offset, counts))
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            CatalogImporter(BytesIO(self.CSV), 'csv', batch_size=2, on_checkpoint=interrupt).run()
+        offset, counts = checkpoints[0]
+        self.assertEqual((counts['rows'], Product.objects.count()), (2, 2))
+
+        counts = CatalogImporter(BytesIO(self.CSV), 'csv', batch_size=2, offset=offset, counts=counts).run()
+        self.assertEqual((counts['rows'], counts['created'], counts['unchanged']), (5, 5, 0))
+        self.assertEqual(sorted(Product.objects.values_list('title', flat=True)), [f'Product {i}' for i in range(5)])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_queued_import_resumes_at_its_offset(self):
+        checkpoints = []
+        CatalogImporter(
+            BytesIO(self.CSV), 'csv', batch_size=2, on_checkpoint=lambda *checkpoint: checkpoints.append(checkpoint)
+        ).run()
+        offset, counts = checkpoints[0]
+        # Left failed after its first batch, whose products were then removed
+        Product.objects.all().delete()
+        catalog_import = CatalogImport(status='failed', offset=offset, **counts)
+        catalog_import.file.save('catalog.csv', ContentFile(self.CSV))
+
+        call_command('import_catalog', queued=True, stdout=StringIO())
+        catalog_import.refresh_from_db()
+        self.assertEqual((catalog_import.status, catalog_import.rows, catalog_import.created), ('completed', 5, 5))
+        self.assertEqual(Product.objects.count(), 3)
+
+
+@test_settings
+class StockHoldTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.other = make_user('other')
+        self.product = make_products(1, stock=10)[0]
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_hold_sets_stock_aside(self):
+        inventory.hold(self.user, {self.product.pk: 7})
+        self.assertEqual(self.stock(), 3)
+        with self.assertRaises(OutOfStock):
+            inventory.hold(self.other, {self.product.pk: 4})
+        self.assertEqual(self.stock(), 3)
+        # Holding again replaces the previous hold
+        inventory.hold(self.user, {self.product.pk: 2})
+        self.assertEqual(self.stock(), 8)
+
+    def test_sweep_returns_expired_holds_only(self):
+        inventory.hold(self.user, {self.product.pk: 3}, ttl=-1)
+        inventory.hold(self.other, {self.product.pk: 2})
+        self.assertEqual(inventory.sweep(), (3, 1))
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(list(StockHold.objects.values_list('user', flat=True)), [self.other.pk])
+        self.assertEqual(inventory.sweep(), (0, 0))
+
+    def test_sweep_command_and_sharded_stock(self):
+        inventory.reshard(self.product, 4)
+        inventory.hold(self.user, {self.product.pk: 6}, ttl=-1)
+        self.assertEqual(StockShard.objects.aggregate(total=Sum('quantity'))['total'], 4)
+        call_command('sweep_stock_holds', stdout=StringIO())
+        self.assertEqual(StockShard.objects.aggregate(total=Sum('quantity'))['total'], 10)
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_settle_consumes_holds(self):
+        inventory.hold(self.user, {self.product.pk: 3})
+        inventory.settle(self.user, {self.product.pk: 2})
+        self.assertEqual(self.stock(), 8)
+        self.assertFalse(StockHold.objects.exists())
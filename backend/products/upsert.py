@@ -0,0 +1,172 @@
+"""
+Bulk catalog upsert.
+
+Incoming rows are matched to existing products by title (the natural key
+the sync endpoints have always used). Existing rows are fetched with one
+query per chunk, diffed field by field, and only rows that actually changed
+are written, with ``bulk_update``; new rows go through ``bulk_create``. The
+whole run happens in one transaction. Unchanged rows keep their
+``updated_at`` and cached responses stay valid.
+
+Titles are not a unique key, so inserts cannot rely on ``ON CONFLICT``:
+concurrent runs are serialized instead (a transaction-level advisory lock on
+PostgreSQL; SQLite allows a single writer), so a run only reads the existing
+titles once the previous run has committed its inserts.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import inventory
+from .cache import bump_versions, category_version_key, invalidate_catalog, product_version_key, CATALOG_VERSION_KEY
+from .models import Category, Product
+from .search import index_products
+from .signals import prices_changed
+
+PRODUCT_FIELDS = [
+    'description', 'price', 'category_id', 'image', 'rating', 'rating_count', 'stock_quantity', 'is_active',
+]
+SEARCH_FIELDS = {'description'}
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Advisory lock key of catalog upserts on PostgreSQL
+UPSERT_LOCK_ID = 0x75707372
+
+
+def category_slug(name):
+    return name.lower().replace(' ', '-')
+
+
+def _quantize(value, places):
+    return Decimal(str(value or 0)).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
+
+
+def resolve_categories(names, category_map=None):
+    """Return ``{name: category_id}``, creating missing categories in bulk"""
+    category_map = {} if category_map is None else category_map
+    missing = {name for name in names if name not in category_map}
+    if not missing:
+        return category_map
+    category_map.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+    to_create = [name for name in missing if name not in category_map]
+    if to_create:
+        Category.objects.bulk_create(
+            [Category(name=name, slug=category_slug(name)) for name in to_create],
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts does not return ids, read them back
+        category_map.update(Category.objects.filter(name__in=to_create).values_list('name', 'id'))
+        # bulk_create() sends no signals, the category list is cached too
+        invalidate_catalog()
+    return category_map
+
+
+def normalize_row(row, category_map):
+    """Map an incoming row onto ``Product`` column values"""
+    return {
+        'title': row['title'],
+        'description': row.get('description') or '',
+        'price': _quantize(row.get('price'), 2),
+        'category_id': category_map[row.get('category') or 'uncategorized'],
+        'image': row.get('image') or '',
+        'rating': _quantize(row.get('rating'), 2),
+        'rating_count': int(row.get('rating_count') or 0),
+        'stock_quantity': int(row.get('stock_quantity') or 0),
+        'is_active': bool(row.get('is_active', True)),
+    }
+
+
+def upsert_products(rows, batch_size=DEFAULT_BATCH_SIZE, category_map=None):
+    """
+    Create or update products from ``rows`` (dicts keyed like ``Product``
+    fields, with ``category`` holding the category name).
+
+    Returns ``{'created': n, 'updated': n, 'unchanged': n}``.
+    """
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    with transaction.atomic():
+        lock_upserts()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _upsert_batch(batch, batch_size, counts, category_map)
+                batch = []
+        if batch:
+            _upsert_batch(batch, batch_size, counts, category_map)
+    return counts
+
+
+def lock_upserts():
+    """Wait for concurrent upserts to commit; the lock is held until the current transaction ends"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [UPSERT_LOCK_ID])
+
+
+def _upsert_batch(rows, batch_size, counts, category_map):
+    category_map = resolve_categories(
+        {row.get('category') or 'uncategorized' for row in rows}, category_map
+    )
+    # Later rows win when a batch repeats a title
+    incoming = {}
+    for row in rows:
+        values = normalize_row(row, category_map)
+        incoming[values['title']] = values
+
+    existing = {}
+    for product in Product.objects.filter(title__in=list(incoming)).only('id', 'title', 'stock_shards', *PRODUCT_FIELDS).order_by('id'):
+        existing.setdefault(product.title, product)
+
+    now = timezone.now()
+    to_create, to_update, reindex, repriced, restocked = [], [], [], [], []
+    touched_categories = set()
+    changed_fields = set()
+    for title, values in incoming.items():
+        product = existing.get(title)
+        if product is None:
+            to_create.append(Product(**values))
+            touched_categories.add(values['category_id'])
+            continue
+        changes = [field for field in PRODUCT_FIELDS if getattr(product, field) != values[field]]
+        if not changes:
+            counts['unchanged'] += 1
+            continue
+        touched_categories.update({product.category_id, values['category_id']})
+        for field in changes:
+            setattr(product, field, values[field])
+        # bulk_update() does not apply auto_now
+        product.updated_at = now
+        changed_fields.update(changes)
+        to_update.append(product)
+        if SEARCH_FIELDS & set(changes):
+            reindex.append(product)
+        if 'price' in changes:
+            repriced.append(product.pk)
+        if 'stock_quantity' in changes and product.stock_shards:
+            restocked.append(product)
+
+    if to_create:
+        Product.objects.bulk_create(to_create, batch_size=batch_size)
+        reindex.extend(to_create)
+    if to_update:
+        Product.objects.bulk_update(to_update, [*sorted(changed_fields), 'updated_at'], batch_size=batch_size)
+    # Sharded stock lives in StockShard rows, spread the new stock over them
+    for product in restocked:
+        inventory.reshard(product, product.stock_shards, product.stock_quantity)
+    index_products(reindex)
+    if repriced:
+        prices_changed.send(sender=Product, product_ids=repriced)
+
+    counts['created'] += len(to_create)
+    counts['updated'] += len(to_update)
+
+    # Signals do not fire for bulk writes, invalidate cached responses here
+    if to_create or to_update:
+        bump_versions(
+            CATALOG_VERSION_KEY,
+            *[product_version_key(product.pk) for product in to_update],
+            *[category_version_key(category_id) for category_id in touched_categories],
+        )
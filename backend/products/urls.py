@@ -4,6 +4,8 @@
 urlpatterns = [
     path('', views.ProductListView.as_view(), name='product-list'),
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
+    path('facets/', views.ProductFacetsView.as_view(), name='product-facets'),
     path('sync/', views.sync_products, name='sync-products'),
+    path('export/', views.export_products, name='export-products'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
 ]
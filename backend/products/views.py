@@ -1,40 +1,135 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from django.core.cache import cache
 import requests
 from django.conf import settings
+from store_backend.conditional import ConditionalGetMixin
+from store_backend.fastpath import FastListMixin
+from store_backend.pagination import KeysetPagination
+from store_backend.query_budget import query_budget
+from .cache import (
+    CachedResponseMixin, CATALOG_VERSION_KEY, CATEGORIES_VERSION_KEY,
+    category_version_key, product_version_key,
+)
+from .exports import ProductExporter
 from .models import Product, Category
-from .serializers import ProductListSerializer, ProductDetailSerializer, CategorySerializer
+from .search import ProductSearchFilter, ProductOrderingFilter
+from .facets import DEFAULT_PRICE_BUCKETS, MAX_PRICE_BUCKETS, compute_facets
+from .upsert import resolve_categories, upsert_products
+from .serializers import (
+    CARD_LOAD_FIELDS, ProductCardSerializer, ProductListSerializer, ProductDetailSerializer,
+    CategorySerializer, ProductExportParamsSerializer, wants_card,
+)
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CachedResponseMixin, ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     """List all products with filtering and search"""
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_fields = ['category', 'is_active']
     search_fields = ['title', 'description']
     ordering_fields = ['price', 'rating', 'created_at']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    query_budget = 4
+    cache_kind = 'product-list'
 
+    def get_cache_version_keys(self):
+        # A list narrowed to one category only changes with that category
+        category = self.request.query_params.get('category', '').strip()
+        if category.isdigit():
+            return [category_version_key(category)]
+        return [CATALOG_VERSION_KEY]
 
-class ProductDetailView(generics.RetrieveAPIView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if wants_card({'request': self.request}):
+            # Cards never show descriptions or nested categories
+            queryset = queryset.select_related(None).only(*CARD_LOAD_FIELDS)
+        return queryset
+
+    def get_serializer_class(self):
+        if wants_card({'request': self.request}):
+            return ProductCardSerializer
+        return super().get_serializer_class()
+
+
+class ProductFacetsView(ProductListView):
+    """Facet counts (categories, price histogram, ratings, stock) for a product search"""
+    pagination_class = None
+    query_budget = 5
+    cache_kind = 'product-facets'
+    cache_ignored_params = ('ordering', 'cursor', 'page', 'fields', 'omit', 'view')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.facets, request)
+
+    def facets(self, request):
+        try:
+            buckets = int(request.query_params.get('price_buckets', DEFAULT_PRICE_BUCKETS))
+        except ValueError:
+            buckets = DEFAULT_PRICE_BUCKETS
+        buckets = min(max(buckets, 1), MAX_PRICE_BUCKETS)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(compute_facets(queryset, buckets))
+
+
+class ProductDetailView(CachedResponseMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     """Retrieve a single product"""
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductDetailSerializer
     permission_classes = [AllowAny]
+    query_budget = 2
+    cache_kind = 'product-detail'
+
+    def get_cache_version_keys(self):
+        return [product_version_key(self.kwargs['pk']), CATEGORIES_VERSION_KEY]
 
+    def get_cache_extra(self):
+        return self.kwargs['pk']
 
-class CategoryListView(generics.ListAPIView):
+
+class CategoryListView(CachedResponseMixin, ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     """List all categories"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    query_budget = 3
+    cache_kind = 'category-list'
+
+    def get_cache_version_keys(self):
+        return [CATEGORIES_VERSION_KEY]
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_products(request):
+    """Stream the active catalog (``include_inactive`` for all products) as CSV or JSON Lines"""
+    params = ProductExportParamsSerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    return ProductExporter(**params.validated_data).response()
+
+
+def fakestore_row(product_data):
+    """Convert a FakeStore product into a row for ``upsert_products``"""
+    rating = product_data.get('rating', {})
+    return {
+        'title': product_data['title'],
+        'description': product_data.get('description', ''),
+        'price': product_data.get('price', 0),
+        'category': product_data.get('category', 'uncategorized'),
+        'image': product_data.get('image', ''),
+        'rating': rating.get('rate', 0),
+        'rating_count': rating.get('count', 0),
+        'stock_quantity': 100,  # Default stock
+        'is_active': True,
+    }
 
 
 @api_view(['POST'])
@@ -54,56 +149,18 @@ def sync_products(request):
         categories_response.raise_for_status()
         categories_data = categories_response.json()
         
-        # Create categories
-        category_mapping = {}
-        for cat_name in categories_data:
-            category, created = Category.objects.get_or_create(
-                name=cat_name,
-                defaults={'slug': cat_name.lower().replace(' ', '-')}
-            )
-            category_mapping[cat_name] = category
-        
-        # Create or update products
-        created_count = 0
-        updated_count = 0
-        
-        for product_data in products_data:
-            category_name = product_data.get('category', 'uncategorized')
-            category = category_mapping.get(category_name)
-            
-            if not category:
-                category = Category.objects.create(
-                    name=category_name,
-                    slug=category_name.lower().replace(' ', '-')
-                )
-                category_mapping[category_name] = category
-            
-            product, created = Product.objects.update_or_create(
-                title=product_data['title'],
-                defaults={
-                    'description': product_data.get('description', ''),
-                    'price': product_data.get('price', 0),
-                    'category': category,
-                    'image': product_data.get('image', ''),
-                    'rating': product_data.get('rating', {}).get('rate', 0),
-                    'rating_count': product_data.get('rating', {}).get('count', 0),
-                    'stock_quantity': 100,  # Default stock
-                    'is_active': True
-                }
-            )
-            
-            if created:
-                created_count += 1
-            else:
-                updated_count += 1
-        
-        # Clear cache
-        cache.clear()
+        # Create categories and upsert products in bulk
+        category_mapping = resolve_categories(categories_data)
+        counts = upsert_products(
+            (fakestore_row(product_data) for product_data in products_data),
+            category_map=category_mapping,
+        )
         
         return Response({
             'message': 'Products synced successfully',
-            'created': created_count,
-            'updated': updated_count,
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
             'total': len(products_data)
         }, status=status.HTTP_200_OK)
         
@@ -176,53 +233,18 @@ def create_sample_products():
             }
         ]
         
-        # Create categories
-        category_mapping = {}
-        for cat_name in categories_data:
-            category, created = Category.objects.get_or_create(
-                name=cat_name,
-                defaults={'slug': cat_name.lower().replace(' ', '-')}
-            )
-            category_mapping[cat_name] = category
-        
-        # Create products
-        created_count = 0
-        updated_count = 0
-        
-        for product_data in products_data:
-            category_name = product_data.get('category', 'uncategorized')
-            category = category_mapping.get(category_name)
-            
-            if not category:
-                category = Category.objects.create(
-                    name=category_name,
-                    slug=category_name.lower().replace(' ', '-')
-                )
-                category_mapping[category_name] = category
-            
-            product, created = Product.objects.update_or_create(
-                title=product_data['title'],
-                defaults={
-                    'description': product_data.get('description', ''),
-                    'price': product_data.get('price', 0),
-                    'category': category,
-                    'image': product_data.get('image', ''),
-                    'rating': product_data.get('rating', {}).get('rate', 0),
-                    'rating_count': product_data.get('rating', {}).get('count', 0),
-                    'stock_quantity': 100,
-                    'is_active': True
-                }
-            )
-            
-            if created:
-                created_count += 1
-            else:
-                updated_count += 1
+        # Create categories and upsert products in bulk
+        category_mapping = resolve_categories(categories_data)
+        counts = upsert_products(
+            (fakestore_row(product_data) for product_data in products_data),
+            category_map=category_mapping,
+        )
         
         return Response({
             'message': 'Sample products created successfully',
-            'created': created_count,
-            'updated': updated_count,
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
             'total': len(products_data)
         }, status=status.HTTP_200_OK)
         
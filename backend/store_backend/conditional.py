@@ -0,0 +1,46 @@
+"""
+Conditional GET support (``ETag`` / ``If-None-Match`` / ``304``).
+"""
+import hashlib
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``GET`` with ``304 Not Modified`` when the client's copy is fresh.
+
+    Views implement ``get_etag_parts`` returning values that change whenever
+    the response body would (version counters, ``Max('updated_at')``, row
+    counts, ...). The ETag is derived from those parts and the query string,
+    so matching requests are answered without building or serializing the
+    body.
+    """
+
+    def get_etag_parts(self):
+        return None
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        if parts is None:
+            return None
+        params = sorted(self.request.query_params.lists())
+        source = '|'.join(str(part) for part in [*parts, params])
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is not None:
+            # Proxies may weaken our ETags (e.g. when compressing), compare weakly
+            if_none_match = {
+                tag[2:] if tag.startswith('W/') else tag
+                for tag in parse_etags(request.headers.get('If-None-Match', ''))
+            }
+            if etag in if_none_match or '*' in if_none_match:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = super().get(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
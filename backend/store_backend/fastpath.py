@@ -0,0 +1,284 @@
+"""
+Fast-path serialization for read-only list endpoints.
+
+``FastSerializer`` compiles a DRF serializer instance (after sparse fieldsets
+and representation switches have been applied) into a flat list of
+``.values()`` columns plus one precompiled accessor per output key. Rows are
+then turned into plain dicts without instantiating models or running DRF's
+per-field machinery, while producing exactly the same output: decimals are
+quantized and rendered like ``DecimalField``, datetimes are converted to the
+current timezone and rendered like ``DateTimeField``.
+
+Nested forward relations (``category``) are flattened into the same query;
+nested reverse relations (``items``) cost one extra query per level.
+Top-level fields may also read queryset annotations by name.
+Anything the compiler does not understand raises ``NotCompilable`` and the
+view falls back to the regular DRF path.
+"""
+import decimal
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import fields as drf_fields, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Model properties the fast path may evaluate, with the columns they read
+_PROPERTY_DEPENDENCIES = {}
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def register_property(model, name, columns):
+    """Allow serializers to expose ``model.name`` computed from ``columns``"""
+    _PROPERTY_DEPENDENCIES[(model, name)] = list(columns)
+
+
+def _decimal_formatter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or not coerce_to_string or field.localize:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    Decimal = decimal.Decimal
+
+    def format_decimal(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return format_decimal
+
+
+def _datetime_formatter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (output_format is None or output_format.lower() != drf_fields.ISO_8601
+            or hasattr(field, 'timezone') or not settings.USE_TZ):
+        return field.to_representation
+    # Compiled per request, so the active timezone can be resolved once
+    current_timezone = timezone.get_current_timezone()
+    fallback = field.to_representation
+
+    def format_datetime(value):
+        if not value or value.tzinfo is None:
+            return fallback(value)
+        value = value.astimezone(current_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return format_datetime
+
+
+def get_formatter(field):
+    """Return a callable rendering a non-null value exactly like ``field``"""
+    if isinstance(field, drf_fields.ReadOnlyField):
+        return None
+    if isinstance(field, drf_fields.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, drf_fields.DateTimeField):
+        return _datetime_formatter(field)
+    if isinstance(field, drf_fields.IntegerField):
+        return int
+    if isinstance(field, drf_fields.CharField):
+        return str
+    return field.to_representation
+
+
+def _namespace_builder(columns):
+    """Build ``obj.a.b`` style namespaces from ``a__b`` columns of a row"""
+    def build(row, prefix):
+        root = SimpleNamespace()
+        for column in columns:
+            node = root
+            parts = column.split('__')
+            for part in parts[:-1]:
+                if not hasattr(node, part):
+                    setattr(node, part, SimpleNamespace())
+                node = getattr(node, part)
+            setattr(node, parts[-1], row[prefix + column])
+        return root
+    return build
+
+
+def _plain_getter(column, formatter):
+    if formatter is None:
+        return lambda row, related: row[column]
+
+    def get(row, related):
+        value = row[column]
+        return None if value is None else formatter(value)
+    return get
+
+
+def _property_getter(fget, build_namespace, prefix, formatter):
+    def get(row, related):
+        value = fget(build_namespace(row, prefix))
+        if value is None or formatter is None:
+            return value
+        return formatter(value)
+    return get
+
+
+def _nested_getter(null_column, build):
+    def get(row, related):
+        if row[null_column] is None:
+            return None
+        return build(row, related)
+    return get
+
+
+def _children_getter(name, pk_column):
+    def get(row, related):
+        return related[name].get(row[pk_column], [])
+    return get
+
+
+class FastSerializer:
+    """Compiled, read-only equivalent of a (possibly nested) DRF serializer"""
+
+    def __init__(self, serializer, prefix='', annotations=()):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.annotations = set(annotations)
+        self.pk_column = prefix + self.model._meta.pk.attname
+        self.columns = [self.pk_column]
+        self.getters = []
+        self.children = []
+        self._compile(serializer)
+
+    def _compile(self, serializer):
+        opts = self.model._meta
+        prefix = self.prefix
+        for field in serializer._readable_fields:
+            name, source = field.field_name, field.source
+            if source == '*' or '.' in source:
+                raise NotCompilable(f'{name}: dotted sources are not supported')
+
+            if isinstance(field, serializers.ListSerializer):
+                relation = opts.get_field(source)
+                if not relation.one_to_many or not relation.auto_created:
+                    raise NotCompilable(f'{name}: only reverse foreign keys can be nested')
+                self.children.append((name, relation, FastSerializer(field.child)))
+                self.getters.append((name, _children_getter(name, self.pk_column)))
+                continue
+
+            if isinstance(field, serializers.BaseSerializer):
+                model_field = opts.get_field(source)
+                if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                    raise NotCompilable(f'{name}: only forward relations can be nested')
+                nested = FastSerializer(field, prefix=f'{prefix}{source}__')
+                if nested.children:
+                    raise NotCompilable(f'{name}: nested serializers cannot have children')
+                null_column = prefix + model_field.attname
+                self.columns += [null_column] + nested.columns
+                self.getters.append((name, _nested_getter(null_column, nested.build)))
+                continue
+
+            if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+                raise NotCompilable(f'{name}: related fields are not supported')
+            if isinstance(field, serializers.SerializerMethodField):
+                raise NotCompilable(f'{name}: method fields are not supported')
+
+            formatter = get_formatter(field)
+            dependencies = _PROPERTY_DEPENDENCIES.get((self.model, source))
+            if dependencies is not None:
+                fget = getattr(self.model, source).fget
+                self.columns += [prefix + column for column in dependencies]
+                getter = _property_getter(fget, _namespace_builder(dependencies), prefix, formatter)
+                self.getters.append((name, getter))
+                continue
+
+            if source in self.annotations:
+                self.columns.append(source)
+                self.getters.append((name, _plain_getter(source, formatter)))
+                continue
+
+            try:
+                model_field = opts.get_field(source)
+            except FieldDoesNotExist:
+                raise NotCompilable(f'{name}: unknown source "{source}"')
+            if not model_field.concrete or model_field.many_to_many:
+                raise NotCompilable(f'{name}: "{source}" is not a column')
+            column = prefix + (model_field.attname if source == model_field.attname else model_field.name)
+            self.columns.append(column)
+            self.getters.append((name, _plain_getter(column, formatter)))
+
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def build(self, row, related):
+        return {name: get(row, related) for name, get in self.getters}
+
+    def values(self, queryset, extra=()):
+        """``queryset.values()`` returning every column this serializer reads"""
+        return queryset.values(*dict.fromkeys([*self.columns, *extra]))
+
+    def load_children(self, rows):
+        related = {}
+        if not self.children:
+            return related
+        parent_ids = [row[self.pk_column] for row in rows]
+        for name, relation, child in self.children:
+            link = relation.field.attname
+            grouped = defaultdict(list)
+            if parent_ids:
+                queryset = relation.related_model._default_manager.filter(**{f'{link}__in': parent_ids})
+                if not queryset.ordered:
+                    queryset = queryset.order_by('pk')
+                child_rows = list(child.values(queryset, extra=[link]))
+                for row, data in zip(child_rows, child.serialize(child_rows)):
+                    grouped[row[link]].append(data)
+            related[name] = grouped
+        return related
+
+    def serialize(self, rows):
+        rows = list(rows)
+        related = self.load_children(rows)
+        build = self.build
+        return [build(row, related) for row in rows]
+
+
+class FastListMixin:
+    """
+    Serve ``list`` through ``FastSerializer`` when ``FAST_PATH_SERIALIZATION``
+    is enabled (or ``fast_path = True`` on the view) and the serializer can
+    be compiled; otherwise behave exactly like the regular DRF view.
+    """
+    fast_path = None
+
+    def use_fast_path(self):
+        if self.fast_path is not None:
+            return self.fast_path
+        return getattr(settings, 'FAST_PATH_SERIALIZATION', False)
+
+    def get_fast_serializer(self, annotations=()):
+        try:
+            return FastSerializer(self.get_serializer(many=True), annotations=annotations)
+        except NotCompilable:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        fast_serializer = self.get_fast_serializer(queryset.query.annotations)
+        if fast_serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        # Ordering columns and annotations are needed by keyset pagination
+        extra = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str) and name != '?']
+        extra += list(queryset.query.annotations)
+        rows = fast_serializer.values(queryset, extra=extra)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.serialize(page))
+        return Response(fast_serializer.serialize(rows))
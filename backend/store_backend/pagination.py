@@ -0,0 +1,142 @@
+"""
+Shared pagination classes for the API.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the queryset's ordering plus ``id``.
+
+    Each page is fetched with a ``WHERE (ordering fields) > (last row)``
+    condition instead of ``OFFSET``, and no ``COUNT(*)`` is ever issued, so
+    deep pages cost the same as the first one. The cursor is an opaque token
+    holding the ordering values of the boundary row.
+
+    Passing ``?page=`` switches to classic page-number pagination for
+    clients that need totals and random page access.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_number_query_param = 'page'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_number_paginator = None
+        if self.page_number_query_param in request.query_params:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+
+        ordering = self.get_ordering(queryset)
+        if ordering is None:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+
+        values, reverse = self.decode_cursor(request, len(ordering))
+        effective = [(field, descending != reverse) for field, descending in ordering]
+        queryset = queryset.order_by(*[('-' if descending else '') + field for field, descending in effective])
+        if values is not None:
+            queryset = queryset.filter(self.position_filter(effective, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.ordering = ordering
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_ordering(self, queryset):
+        """Return ``[(field, descending), ...]`` ending with the tie-breaker"""
+        order_by = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = []
+        for item in order_by:
+            if not isinstance(item, str) or '__' in item or item == '?':
+                return None
+            descending = item.startswith('-')
+            field = item.lstrip('-')
+            ordering.append(('id' if field == 'pk' else field, descending))
+        if not any(field == self.tie_breaker for field, _ in ordering):
+            descending = ordering[-1][1] if ordering else False
+            ordering.append((self.tie_breaker, descending))
+        return ordering
+
+    def position_filter(self, ordering, values):
+        """Rows strictly after ``values`` in the given ordering"""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(ordering, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def decode_cursor(self, request, length):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            values, reverse = payload['v'], bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != length:
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, row, reverse):
+        values = [self.encode_value(self.get_value(row, field)) for field, _ in self.ordering]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_number_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_value(self, row, field):
+        # Rows are model instances, or dicts on the fast serialization path
+        return row[field] if isinstance(row, dict) else getattr(row, field)
+
+    def encode_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
@@ -0,0 +1,92 @@
+"""
+Per-view database query budgets.
+
+Views declare the maximum number of queries a single request may issue,
+either with a ``query_budget`` class attribute (class-based views) or the
+``@query_budget(n)`` decorator (function views). ``QueryBudgetMiddleware``
+counts the queries actually executed and logs a warning when a request goes
+over budget; with ``QUERY_BUDGET_STRICT = True`` it raises instead, which
+is how tests and CI catch N+1 regressions.
+"""
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` hook that records executed SQL"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+def query_budget(limit):
+    """Declare the query budget of a function-based view"""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def get_view_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        budget = getattr(view_class, 'query_budget', None)
+    return budget
+
+
+def check_budget(label, counter, limit):
+    if counter.count <= limit:
+        return
+    message = f'{label} issued {counter.count} queries, budget is {limit}'
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message + '\n' + '\n'.join(counter.queries))
+    logger.warning(message)
+
+
+@contextmanager
+def assert_max_queries(limit, label='block'):
+    """Fail when the wrapped block issues more than ``limit`` queries"""
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+    if counter.count > limit:
+        raise QueryBudgetExceeded(
+            f'{label} issued {counter.count} queries, budget is {limit}\n' + '\n'.join(counter.queries)
+        )
+
+
+class QueryBudgetMiddleware:
+    """Count the queries of every budgeted view and enforce its budget"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None:
+            check_budget(f'{request.method} {request.path}', counter, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = get_view_budget(view_func)
@@ -0,0 +1,63 @@
+"""
+Shared serializer helpers for the API.
+"""
+
+
+def get_query_list(request, name):
+    """Split a comma separated query parameter into a set of names"""
+    if request is None:
+        return set()
+    return {
+        value.strip()
+        for raw in request.query_params.getlist(name)
+        for value in raw.split(',')
+        if value.strip()
+    }
+
+
+class SparseFieldsMixin:
+    """
+    Honour ``?fields=`` and ``?omit=`` on the request.
+
+    Both take comma separated field names; nested serializers are addressed
+    with dotted paths, e.g. ``?fields=id,items.quantity,items.product.title``
+    or ``?omit=items.product.description``. A nested serializer with no
+    paths selected below it keeps all of its fields.
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+
+    def get_field_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        requested = get_query_list(request, self.fields_param)
+        omitted = get_query_list(request, self.omit_param)
+        if not requested and not omitted:
+            return fields
+
+        path = self.get_field_path()
+        prefix = f'{path}.' if path else ''
+        if requested and path and path not in requested:
+            # Only restrict this level if something below it was selected
+            requested = {name for name in requested if name.startswith(prefix)}
+        elif requested and path in requested:
+            requested = set()
+
+        for name in list(fields):
+            qualified = prefix + name
+            if qualified in omitted:
+                fields.pop(name)
+            elif requested and not any(
+                selected == qualified or selected.startswith(qualified + '.') for selected in requested
+            ):
+                fields.pop(name)
+        return fields
@@ -33,6 +33,7 @@
     'products',
     'cart',
     'orders',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -44,8 +45,15 @@
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store_backend.query_budget.QueryBudgetMiddleware',
 ]
 
+# Serve read-only list endpoints through the compiled fast-path serializer
+FAST_PATH_SERIALIZATION = config('FAST_PATH_SERIALIZATION', default=False, cast=bool)
+
+# Raise instead of logging when a view exceeds its declared query budget
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+
 ROOT_URLCONF = 'store_backend.urls'
 
 TEMPLATES = [
@@ -71,6 +79,9 @@
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than shared memory, so the threads of the concurrency
+        # tests wait for the write lock instead of failing
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -170,6 +181,50 @@
     }
 }
 
+# Seconds a cached catalog response lives before it is recomputed
+CATALOG_CACHE_TIMEOUT = 300
+
+# Cart storage: 'db' reads and writes Cart/CartItem directly, 'redis' keeps
+# live carts in Redis and writes them back with `manage.py flush_carts`
+CART_STORAGE = config('CART_STORAGE', default='db')
+CART_REDIS_URL = config('CART_REDIS_URL', default='redis://127.0.0.1:6379/2')
+# Seconds an untouched hot cart stays in Redis (it is reloaded from the database)
+CART_HOT_TTL = 60 * 60 * 24 * 7
+
+# Anonymous visitors keep their cart in this signed cookie until they log in
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+GUEST_CART_MAX_ITEMS = 50
+
+# Seconds the stock of a cart stays held after checkout starts; expired holds
+# are returned to stock by `manage.py sweep_stock_holds`
+STOCK_HOLD_TTL = 60 * 15
+
+# Idempotency-Key handling of the unsafe order endpoints (orders.idempotency):
+# seconds a stored response is replayed, seconds after which an unfinished
+# request is presumed dead, and seconds a duplicate waits before a 409
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT = 5
+
+# Days a delivered or cancelled order stays in the hot orders tables before
+# `manage.py archive_orders` moves it to the archive (orders.archive)
+ORDER_RETENTION_DAYS = config('ORDER_RETENTION_DAYS', default=90, cast=int)
+
+# Payments (orders.payments): the gateway adapter and its keyword arguments
+# (the stub charges in process after a delay, declining or failing at the
+# given rates), seconds a worker leases outbox rows, and how many times a
+# failing gateway call is tried, PAYMENT_RETRY_DELAY seconds apart, doubling
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='orders.gateways.StubGateway')
+PAYMENT_GATEWAY_OPTIONS = {
+    'latency': config('PAYMENT_STUB_LATENCY', default=0.2, cast=float),
+    'decline_rate': config('PAYMENT_STUB_DECLINE_RATE', default=0.0, cast=float),
+    'error_rate': config('PAYMENT_STUB_ERROR_RATE', default=0.0, cast=float),
+}
+PAYMENT_LEASE_SECONDS = 60
+PAYMENT_MAX_TRIES = 5
+PAYMENT_RETRY_DELAY = 2
+
 # Celery settings
 CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
 CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
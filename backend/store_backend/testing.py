@@ -0,0 +1,108 @@
+"""
+Helpers shared by the app test modules.
+
+``test_settings`` runs a test class against a local-memory cache (the tests
+need no Redis) with the database carts and strict query budgets, so a view
+going over its declared budget fails the test that called it.
+``QueryCountMixin`` checks that an endpoint issues as many queries for large
+data as for small.
+"""
+import threading
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from products.models import Category, Product
+
+test_settings = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CART_STORAGE='db',
+    QUERY_BUDGET_STRICT=True,
+)
+
+
+class QueryCountMixin:
+    """Measure requests at every size of ``sizes`` (catalog, cart or order sizes)"""
+    sizes = ()
+
+    def measure(self, queries, prepare, check=None):
+        """
+        Send the request ``prepare(size)`` returns for every size, uncached,
+        with exactly ``queries`` queries (``COMMIT`` included, unlike
+        budgets), call ``check(response, size)`` and return the last response
+        """
+        for size in self.sizes:
+            send = prepare(size)
+            cache.clear()
+            with self.subTest(size=size):
+                with self.assertNumQueries(queries):
+                    response = send()
+                self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+                if check is not None:
+                    check(response, size)
+        return response
+
+
+def read_stream(response):
+    """Consume a streaming response, keeping its decoded lines as ``response.lines``"""
+    response.lines = b''.join(response.streaming_content).decode().splitlines()
+    return response
+
+
+def make_user(name='customer', **kwargs):
+    return User.objects.create_user(username=name, email=f'{name}@example.com', password='secret', **kwargs)
+
+
+def client_for(user=None):
+    """API client authenticated as ``user`` with a JWT (anonymous without one)"""
+    client = APIClient()
+    if user is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return client
+
+
+def make_products(count, category=None, price='10.00', stock=100, prefix='product'):
+    """Create ``count`` active products in ``category`` (one is created when missing)"""
+    if category is None:
+        category = Category.objects.get_or_create(name='Category', slug='category')[0]
+    # Saved one by one, so the search index and catalog versions follow
+    return [
+        Product.objects.create(
+            title=f'{prefix} {i}', description='-', price=Decimal(price), category=category,
+            stock_quantity=stock,
+        )
+        for i in range(count)
+    ]
+
+
+def run_concurrently(functions):
+    """
+    Call each of ``functions`` in its own thread, all released at once, and
+    return their results in order. Each thread closes its database connection.
+    """
+    barrier = threading.Barrier(len(functions))
+    results = [None] * len(functions)
+    errors = []
+
+    def run(index, function):
+        try:
+            barrier.wait()
+            results[index] = function()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index, function)) for index, function in enumerate(functions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
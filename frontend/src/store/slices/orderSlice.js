@@ -84,7 +84,8 @@ const orderSlice = createSlice({
         state.loading = false;
         state.orders = action.payload.results || action.payload;
         state.pagination = {
-          count: action.payload.count || action.payload.length,
+          // Cursor pages (the default) carry no total, count the loaded rows then
+          count: action.payload.count !== undefined ? action.payload.count : state.orders.length,
           next: action.payload.next,
           previous: action.payload.previous,
         };
@@ -100,7 +100,8 @@ const productSlice = createSlice({
         state.loading = false;
         state.products = action.payload.results || action.payload;
         state.pagination = {
-          count: action.payload.count || action.payload.length,
+          // Cursor pages (the default) carry no total, count the loaded rows then
+          count: action.payload.count !== undefined ? action.payload.count : state.products.length,
           next: action.payload.next,
           previous: action.payload.previous,
         };